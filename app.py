@@ -1,11 +1,81 @@
 """Flask Application for Hockey Squad Builder."""
-from flask import Flask, render_template, request
+import os
 
-from players import PlayerList
-from squads import getBalancedSquads
+from functools import partial, wraps
+
+from flask import Flask, g, jsonify, render_template, request, url_for
+
+import rosterstore
+import timing
+
+from balancing import SKILLS, getTotals
+from cache import RosterCache, SquadCache
+from jobs import JobQueue, QueueFullError
+from rosterclient import RosterClient
+from squads import GREEDY, assignSquads, getBalancedSquads
+from squads import getRatingsAndOrders
+
+# Maximum time in seconds spent refining squads by swapping players
+REFINETIMELIMIT = 0.5
+
+# Maximum time in seconds spent on multi-start or optimal balancing
+BALANCINGDEADLINE = 2.0
+
+# Maximum number of squad counts generated by a single API request
+MAXSQUADCOUNTS = 8
+
+# Maximum time in seconds a request may wait on a background job
+MAXJOBWAIT = 30.0
 
 app = Flask(__name__)
 
+# Roster shared by every request, reloaded only when the file changes. The
+# roster of a season in a roster store, or the roster served by a REST
+# endpoint, is used instead when one is given.
+if os.environ.get("SQUADROSTERURL"):
+    roster = RosterClient(os.environ["SQUADROSTERURL"])
+elif os.environ.get("SQUADROSTERDB"):
+    roster = RosterCache(os.environ["SQUADROSTERDB"], loader=partial(
+        rosterstore.loadPlayerList,
+        season=os.environ.get("SQUADSEASON", rosterstore.DEFAULTSEASON)))
+else:
+    roster = RosterCache()
+
+# Squads generated for recent requests, keyed by roster and options
+squadCache = SquadCache()
+
+# Background jobs generating squads for large rosters
+jobQueue = JobQueue()
+
+# Phases of each request are timed when this environment variable is set
+if os.environ.get("SQUADTIMING"):
+    timing.enable()
+
+
+@app.before_request
+def startTiming():
+    """Start collecting the timed phases of a request."""
+    if timing.isEnabled():
+        g.timingToken = timing.startRequest()
+
+
+@app.after_request
+def addServerTiming(response):
+    """Report the timed phases of a request in a Server-Timing header."""
+    if "timingToken" in g:
+        spans = timing.requestSpans()
+        if spans:
+            response.headers["Server-Timing"] = timing.serverTiming(spans)
+    return response
+
+
+@app.teardown_request
+def finishTiming(exc=None):
+    """Stop collecting the timed phases of a request."""
+    token = g.pop("timingToken", None)
+    if token is not None:
+        timing.finishRequest(token)
+
 
 @app.route("/")
 def main():
@@ -15,7 +85,7 @@ def main():
     Loads player data from a JSON file, and puts all players
     on a waiting list, which is displayed on the page.
     """
-    playerList = PlayerList.fromJSON()
+    playerList = roster.get()
 
     return render_template('index.html', waitingList=playerList.toHTML(),
                            numPlayers=len(playerList.players))
@@ -28,19 +98,225 @@ def generateSquads():
 
     Generate a number of balanced squads equivalent to the user's input from
     the given player data, and enable them to be displayed on the new page.
+
+    The balancing method is chosen by the user. If the refine option was
+    checked, the squads are balanced further by swapping players between
+    them, for at most REFINETIMELIMIT seconds.
+
+    Generated squads are kept in squadCache, so submitting the same options
+    again for an unchanged roster reuses them.
     """
     numSquads = int(request.form["numSquads"])
-    playerList = PlayerList.fromJSON()
+    refine = "refine" in request.form
+    method = request.form.get("method", GREEDY)
+    playerList, fingerprint = roster.load()
     numPlayers = len(playerList.players)
+
+    key = (fingerprint, numSquads, method, refine)
+    result = squadCache.get(key)
+    if result is None:
+        try:
+            squads = getBalancedSquads(numSquads, playerList, refine=refine,
+                                       timeLimit=REFINETIMELIMIT,
+                                       method=method,
+                                       deadline=BALANCINGDEADLINE)
+        except Exception as err:
+            return render_template('index.html',
+                                   waitingList=playerList.toHTML(),
+                                   numPlayers=numPlayers, errorPopup=err)
+
+        result = {"assignment": [[p._id for p in squad.players]
+                                 for squad in squads],
+                  "waitingList": playerList.toHTML(),
+                  "squads": [squad.toHTML() for squad in squads]}
+        squadCache.put(key, result)
+
+    return render_template('index.html', waitingList=result["waitingList"],
+                           numPlayers=numPlayers, squads=result["squads"])
+
+
+@app.route("/api/squads", methods=["POST"])
+def apiSquads():
+    """
+    Generate balanced squads for one or more numbers of squads as JSON.
+
+    The request body is a JSON object with the number of squads to generate,
+    either as a single number or a list of numbers, and optionally the
+    balancing method and whether to refine the squads:
+
+        {"numSquads": [2, 3, 4], "method": "greedy", "refine": false}
+
+    The roster is loaded and sorted once, and the same ratings and sort
+    orders are used for every number of squads. For each number of squads,
+    the result lists each squad's number, player ids and skill totals, and
+    the ids of the players left on the waiting list. A number of squads that
+    cannot be generated has an error message in its result instead. At
+    most MAXSQUADCOUNTS numbers of squads can be asked for at once.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "numSquads" not in data:
+        return jsonify(error="Expected a JSON object with numSquads"), 400
+    counts = data["numSquads"]
+    if not isinstance(counts, list):
+        counts = [counts]
+    if not all(isinstance(k, int) and not isinstance(k, bool)
+               for k in counts):
+        return jsonify(error="numSquads must be integers"), 400
+    if len(counts) > MAXSQUADCOUNTS:
+        return jsonify(error="At most %d numbers of squads can be "
+                             "generated at once" % MAXSQUADCOUNTS), 400
+    method = data.get("method", GREEDY)
+    refine = bool(data.get("refine", False))
+
+    playerList = roster.get()
+    ids = [p._id for p in playerList.players]
+    ratings, orders = getRatingsAndOrders(playerList)
+
+    results = []
+    for numSquads in counts:
+        try:
+            assignment = assignSquads(numSquads, ratings, orders,
+                                      refine=refine,
+                                      timeLimit=REFINETIMELIMIT,
+                                      method=method,
+                                      deadline=BALANCINGDEADLINE)
+        except ValueError as err:
+            results.append({"numSquads": numSquads, "error": str(err)})
+            continue
+
+        squads = []
+        assigned = set()
+        for squadIndex, members in assignment:
+            squad = {"squadNum": squadIndex + 1,
+                     "players": [ids[i] for i in members]}
+            for skill, total in zip(SKILLS, getTotals(members, ratings)):
+                squad[skill.name.lower()] = total
+            squads.append(squad)
+            assigned.update(members)
+        results.append({"numSquads": numSquads, "squads": squads,
+                        "waitingList": [ids[i] for i in range(len(ids))
+                                        if i not in assigned]})
+
+    return jsonify(numPlayers=len(ids), results=results)
+
+
+def runSquadJob(numSquads, playerList, method=GREEDY, refine=False):
+    """
+    Generate balanced squads in a background job.
+
+    Returns the squads in the same form as a result from the squad
+    generation API, with each squad's player ids and skill totals, and the
+    ids of the players left on the waiting list.
+    """
+    squads = getBalancedSquads(numSquads, playerList, refine=refine,
+                               timeLimit=REFINETIMELIMIT, method=method,
+                               deadline=BALANCINGDEADLINE)
+    result = []
+    for squad in squads:
+        squadData = {"squadNum": squad.squadNum,
+                     "players": [p._id for p in squad.players]}
+        for skill in SKILLS:
+            name = skill.name.lower()
+            squadData[name] = getattr(squad, name)
+        result.append(squadData)
+    return {"numSquads": numSquads, "squads": result,
+            "waitingList": [p._id for p in playerList.players]}
+
+
+def disableJobs():
+    """
+    Refuse background jobs from now on.
+
+    Jobs are kept in the memory of the process that runs them, so they
+    cannot be used when requests are shared between several processes.
+    """
+    global jobQueue
+    if jobQueue is not None:
+        jobQueue.shutdown(wait=False)
+    jobQueue = None
+
+
+def requireJobs(view):
+    """Respond to a job route with 503 while background jobs are disabled."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if jobQueue is None:
+            return jsonify(error="Background jobs are not available when "
+                                 "serving from several processes"), 503
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route("/api/jobs", methods=["POST"])
+@requireJobs
+def submitJob():
+    """
+    Submit a background job generating balanced squads.
+
+    The request body is a JSON object with the number of squads to generate,
+    and optionally the balancing method and whether to refine the squads:
+
+        {"numSquads": 3, "method": "greedy", "refine": false}
+
+    Responds straight away with the id and status of the queued job, and its
+    location. Responds with 503 if too many jobs are already pending.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "numSquads" not in data:
+        return jsonify(error="Expected a JSON object with numSquads"), 400
+    numSquads = data["numSquads"]
+    if not isinstance(numSquads, int) or isinstance(numSquads, bool):
+        return jsonify(error="numSquads must be an integer"), 400
+
     try:
-        squads = getBalancedSquads(numSquads, playerList)
-    except Exception as err:
-        return render_template('index.html', waitingList=playerList.toHTML(),
-                               numPlayers=numPlayers, errorPopup=err)
+        job = jobQueue.submit(runSquadJob, numSquads, roster.get(),
+                              method=data.get("method", GREEDY),
+                              refine=bool(data.get("refine", False)))
+    except QueueFullError as err:
+        return jsonify(error=str(err)), 503
 
-    return render_template('index.html', waitingList=playerList.toHTML(),
-                           numPlayers=numPlayers,
-                           squads=[squad.toHTML() for squad in squads])
+    return jsonify(job.toDict()), 202, {
+        "Location": url_for("jobStatus", jobId=job.id)}
+
+
+@app.route("/api/jobs/<jobId>", methods=["GET"])
+@requireJobs
+def jobStatus(jobId):
+    """
+    Get the status of a background job, with its result once it is done.
+
+    If the wait query parameter is given, the response is held for up to
+    that many seconds, at most MAXJOBWAIT, until the job finishes.
+    """
+    wait = min(max(request.args.get("wait", 0, type=float), 0), MAXJOBWAIT)
+    job = jobQueue.wait(jobId, wait) if wait else jobQueue.get(jobId)
+    if job is None:
+        return jsonify(error="No job %s" % jobId), 404
+    return jsonify(job.toDict())
+
+
+@app.route("/api/jobs/<jobId>", methods=["DELETE"])
+@requireJobs
+def cancelJob(jobId):
+    """Cancel a background job that has not finished."""
+    job = jobQueue.cancel(jobId)
+    if job is None:
+        return jsonify(error="No job %s" % jobId), 404
+    return jsonify(job.toDict())
+
+
+@app.route("/metrics")
+def metrics():
+    """
+    Report the timing metrics and cache statistics of the application.
+
+    Each timed phase has its number of runs, total time in seconds and a
+    histogram of its times. Phases are only timed while timing is enabled.
+    """
+    return jsonify(enabled=timing.isEnabled(),
+                   spans=timing.metrics.snapshot(),
+                   roster=roster.stats(), squadCache=squadCache.stats(),
+                   jobs=jobQueue.stats() if jobQueue is not None else None)
 
 
 if __name__ == "__main__":
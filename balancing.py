@@ -0,0 +1,520 @@
+"""Index-based balancing engines for Hockey Squads.
+
+The engines in this module work purely on player indices and tuples of
+skill ratings, so they can be shared between the different ways squads
+are built without needing to know about Squads or PlayerLists.
+
+Ratings are given as one tuple per player, ordered the same as the
+members of the Skill enum (Skating, Shooting, Checking).
+"""
+import time
+
+from heapq import heappop, heappush
+
+from players import Skill
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+SKILLS = list(Skill)
+
+# Number of squads from which the greedy picks are made with NumPy, when it
+# is installed, rather than with heaps
+VECTORIZEDSQUADS = 8
+
+# Most candidate swaps evaluated at once when refining squads with NumPy
+SWAPBLOCKSIZE = 1 << 16
+
+# Number of greedy picks made between checks of the end time, if given
+PICKSPERCHECK = 1024
+
+
+def getRatings(players):
+    """Get the tuple of skill ratings for each of a list of players."""
+    return [p.ratings for p in players]
+
+
+def getSortOrders(ratings):
+    """
+    Get the order of player indices when sorted by each skill.
+
+    Each order is ascending and stable, so that players with equal ratings
+    keep their original relative order, matching PlayerList.sortedPlayers.
+    """
+    indices = range(len(ratings))
+    return [sorted(indices, key=lambda i: ratings[i][s])
+            for s in range(len(SKILLS))]
+
+
+def greedyAssign(numSquads, squadSize, ratings, orders, endTime=None):
+    """
+    Assign players to squads using the lowest-total greedy algorithm.
+
+    A min-heap of squad totals is kept for each skill, so the squad and
+    skill with the lowest total can be found without re-summing every
+    squad. Outdated heap entries are discarded lazily when they reach the
+    top of a heap. Each skill also keeps a cursor into its sort order, and
+    drafted players are marked as taken so they are skipped when the cursor
+    passes over them.
+
+    Ties are broken the same way as getSquadWithLowestSkill: the lowest
+    numbered squad first, then skills in the order of the Skill enum.
+
+    When NumPy is installed and there are at least VECTORIZEDSQUADS squads,
+    the picks are made by _greedyAssignVectorized instead, which gives the
+    same squads.
+
+    If an end time is given, as a value of time.monotonic, a TimeoutError is
+    raised if the squads are not filled by then.
+
+    Returns a list of (squad index, player indices) pairs, in the order
+    that the squads were filled.
+    """
+    if numpy is not None and numSquads >= VECTORIZEDSQUADS:
+        return _greedyAssignVectorized(numSquads, squadSize, ratings, orders,
+                                       endTime)
+
+    numSkills = len(SKILLS)
+    totals = [[0] * numSkills for _ in range(numSquads)]
+    members = [[] for _ in range(numSquads)]
+    heaps = [[(0, i) for i in range(numSquads)] for _ in range(numSkills)]
+    cursors = [len(order) - 1 for order in orders]
+    taken = bytearray(len(ratings))
+    completed = []
+    picks = 0
+
+    while(len(completed) < numSquads):
+        picks += 1
+        if endTime is not None and picks % PICKSPERCHECK == 0:
+            _checkEndTime(endTime)
+        lowest = None
+        for skill, heap in enumerate(heaps):
+            total, squad = heap[0]
+            while(len(members[squad]) == squadSize or
+                  totals[squad][skill] != total):
+                heappop(heap)
+                total, squad = heap[0]
+            if lowest is None or total < lowest[0]:
+                lowest = (total, squad, skill)
+
+        _, squad, skill = lowest
+        order = orders[skill]
+        cursor = cursors[skill]
+        while(taken[order[cursor]]):
+            cursor -= 1
+        pick = order[cursor]
+        cursors[skill] = cursor - 1
+        taken[pick] = 1
+
+        members[squad].append(pick)
+        if(len(members[squad]) == squadSize):
+            completed.append((squad, members[squad]))
+        else:
+            squadTotals = totals[squad]
+            rating = ratings[pick]
+            for s in range(numSkills):
+                squadTotals[s] += rating[s]
+                heappush(heaps[s], (squadTotals[s], squad))
+
+    return completed
+
+
+def _checkEndTime(endTime):
+    """Raise a TimeoutError if the end time has passed."""
+    if time.monotonic() > endTime:
+        raise TimeoutError("Squads were not assigned in time")
+
+
+def _greedyAssignVectorized(numSquads, squadSize, ratings, orders,
+                            endTime=None):
+    """
+    Assign players to squads using the lowest-total greedy algorithm.
+
+    Same as greedyAssign, but with the squad totals kept in a NumPy matrix
+    with one row per skill and one column per squad, updated in place after
+    each pick. The lowest squad and skill is then found with a single
+    argmin over the matrix, which returns the first of any tied totals, so
+    ties are broken by skill and then by squad the same way as the heaps.
+    Squads are masked out once full by setting their totals higher than
+    any real total, rather than being removed.
+    """
+    numSkills = len(SKILLS)
+    rows = numpy.asarray(ratings, dtype=numpy.int64).reshape(-1, numSkills)
+    totals = numpy.zeros((numSkills, numSquads), dtype=numpy.int64)
+    lowest = totals.reshape(-1).argmin
+    full = numpy.iinfo(numpy.int64).max
+    members = [[] for _ in range(numSquads)]
+    cursors = [len(order) - 1 for order in orders]
+    taken = bytearray(len(ratings))
+    completed = []
+    picks = 0
+
+    while(len(completed) < numSquads):
+        picks += 1
+        if endTime is not None and picks % PICKSPERCHECK == 0:
+            _checkEndTime(endTime)
+        skill, squad = divmod(int(lowest()), numSquads)
+        order = orders[skill]
+        cursor = cursors[skill]
+        while(taken[order[cursor]]):
+            cursor -= 1
+        pick = order[cursor]
+        cursors[skill] = cursor - 1
+        taken[pick] = 1
+
+        squadMembers = members[squad]
+        squadMembers.append(pick)
+        if(len(squadMembers) == squadSize):
+            completed.append((squad, squadMembers))
+            totals[:, squad] = full
+        else:
+            totals[:, squad] += rows[pick]
+
+    return completed
+
+
+def differencingAssign(numSquads, squadSize, ratings):
+    """
+    Assign players to squads using the largest differencing method.
+
+    This is the multiway Karmarkar-Karp method, extended to several skills
+    and to squads of equal size. The numSquads*squadSize players with the
+    highest total ratings are assigned, and the rest are left over for the
+    waiting list. Starting from the best, each run of numSquads players is
+    made into a partial partition with one player in each of its squads.
+
+    A heap holds the partial partitions by their spread of skill totals.
+    The two with the largest spreads are repeatedly merged into one by
+    joining their squads in pairs, so that their differences cancel out,
+    until the last partition left holds the final squads. See
+    _mergePartitions for how squads are paired.
+
+    Each merge takes time quadratic in the number of squads, so squads are
+    assigned in O(n log n + n * numSquads) time for n players.
+
+    Returns a list of (squad index, player indices) pairs, in order of
+    squad index, with each squad's players from the highest total rating
+    to the lowest.
+    """
+    strength = [sum(rating) for rating in ratings]
+    byStrength = sorted(range(len(ratings)), key=lambda i: -strength[i])
+    picked = byStrength[:numSquads*squadSize]
+
+    heap = []
+    for start in range(0, len(picked), numSquads):
+        partition = [(ratings[i], [i]) for i in picked[start:start+numSquads]]
+        heappush(heap, (-_partitionSpread(partition), len(heap), partition))
+
+    count = len(heap)
+    while(len(heap) > 1):
+        first = heappop(heap)[2]
+        second = heappop(heap)[2]
+        partition = _mergePartitions(first, second)
+        heappush(heap, (-_partitionSpread(partition), count, partition))
+        count += 1
+
+    return [(squad, sorted(members, key=lambda i: (-strength[i], i)))
+            for squad, (_, members) in enumerate(heap[0][2])]
+
+
+def _partitionSpread(partition):
+    """Get the spread of the skill totals of a partial partition."""
+    return sum([max(skillTotals) - min(skillTotals)
+                for skillTotals in zip(*[totals for totals, _ in partition])])
+
+
+def _centeredTotals(partition):
+    """Get how far each squad's totals are from the partition's average."""
+    averages = [sum(skillTotals)/len(partition)
+                for skillTotals in zip(*[totals for totals, _ in partition])]
+    return [[t - a for t, a in zip(totals, averages)]
+            for totals, _ in partition]
+
+
+def _mergePartitions(first, second):
+    """
+    Merge two partial partitions by joining their squads in pairs.
+
+    Squads are compared by how far their totals are from the average of
+    their partition, in every skill at once. Starting with the squads of
+    the first partition furthest from its average, each is joined with
+    the remaining squad of the second whose offset points the most in the
+    opposite direction, that is with the lowest dot product, so that
+    strong skills are matched with weak ones.
+
+    Both partitions are used up, as their lists of members are reused.
+    """
+    offsetsA = _centeredTotals(first)
+    offsetsB = _centeredTotals(second)
+    if numpy is not None:
+        pairs = _pairSquadsVectorized(offsetsA, offsetsB)
+    else:
+        pairs = _pairSquads(offsetsA, offsetsB)
+
+    merged = []
+    for a, b in pairs:
+        (totalsA, membersA), (totalsB, membersB) = first[a], second[b]
+        # Extend the longer list of members so merging stays cheap
+        if len(membersA) < len(membersB):
+            membersA, membersB = membersB, membersA
+        membersA.extend(membersB)
+        merged.append((tuple([x + y for x, y in zip(totalsA, totalsB)]),
+                       membersA))
+    return merged
+
+
+def _pairSquads(offsetsA, offsetsB):
+    """
+    Pair the squads of two partitions by the offsets of their totals.
+
+    Returns a list of (first squad, second squad) index pairs.
+    """
+    orderA = sorted(range(len(offsetsA)),
+                    key=lambda i: -sum([o * o for o in offsetsA[i]]))
+    remaining = list(range(len(offsetsB)))
+    pairs = []
+    for a in orderA:
+        offset = offsetsA[a]
+        b = min(remaining, key=lambda j: sum([x * y for x, y
+                                              in zip(offset, offsetsB[j])]))
+        remaining.remove(b)
+        pairs.append((a, b))
+    return pairs
+
+
+def _pairSquadsVectorized(offsetsA, offsetsB):
+    """
+    Pair the squads of two partitions by the offsets of their totals.
+
+    Same as _pairSquads, but with every dot product found at once as a
+    NumPy matrix, and squads already paired masked out of it.
+    """
+    offsetsA = numpy.array(offsetsA, dtype=float)
+    dots = offsetsA @ numpy.array(offsetsB, dtype=float).T
+    orderA = numpy.argsort(-(offsetsA * offsetsA).sum(axis=1), kind="stable")
+    pairs = []
+    for a in orderA.tolist():
+        b = int(dots[a].argmin())
+        dots[:, b] = numpy.inf
+        pairs.append((a, b))
+    return pairs
+
+
+def getTotals(members, ratings):
+    """Get the total of each skill for a list of player indices."""
+    totals = [0] * len(SKILLS)
+    for i in members:
+        for s, rating in enumerate(ratings[i]):
+            totals[s] += rating
+    return totals
+
+
+def getSpread(assigned, ratings):
+    """
+    Get the spread of the skill totals of assigned squads.
+
+    The spread is the sum over each skill of the difference between the
+    highest and lowest squad totals, so perfectly balanced squads have a
+    spread of zero.
+    """
+    totals = [getTotals(members, ratings) for _, members in assigned]
+    return sum([max(skillTotals) - min(skillTotals)
+                for skillTotals in zip(*totals)])
+
+
+def refineAssign(assigned, ratings, maxSwaps=None, timeLimit=None):
+    """
+    Improve the balance of assigned squads by swapping players between them.
+
+    The imbalance of the squads is measured as the sum over each skill of
+    the squared squad totals. Since the sum of all totals is unchanged by a
+    swap, lowering this brings every squad closer to the average. Swapping
+    player p from squad a with player q from squad b changes it by
+
+        2 * sum((q - p) * (a - b + q - p))
+
+    over each skill, which only needs the two squad totals, so candidate
+    swaps are evaluated without re-summing either squad.
+
+    Each pair of squads is searched for its best swap, which is made if it
+    lowers the imbalance. Searching stops when a full pass over every pair
+    finds no improving swap, after maxSwaps swaps have been made, or once
+    timeLimit seconds have passed. The time limit is also checked while a
+    pair of squads is searched, so large squads cannot overrun it.
+
+    When NumPy is installed, the swaps between two squads are evaluated
+    together as blocks of a matrix rather than one at a time.
+
+    The player lists in assigned are changed in place, with the swapped
+    players taking each other's positions. Returns the number of swaps made.
+    """
+    squads = [members for _, members in assigned]
+    totals = [getTotals(members, ratings) for members in squads]
+    findSwap, swapRatings = _swapSearch(ratings)
+    deadline = None if timeLimit is None else time.monotonic() + timeLimit
+    swaps = 0
+
+    improved = True
+    while(improved):
+        improved = False
+        for a in range(len(squads)):
+            for b in range(a + 1, len(squads)):
+                if maxSwaps is not None and swaps >= maxSwaps:
+                    return swaps
+                if deadline is not None and time.monotonic() > deadline:
+                    return swaps
+
+                swap = findSwap(squads[a], squads[b],
+                                totals[a], totals[b], swapRatings, deadline)
+                if swap is None:
+                    continue
+
+                _makeSwap(squads, totals, ratings, a, b, *swap)
+                swaps += 1
+                improved = True
+
+    return swaps
+
+
+def repairAssign(assigned, ratings, involving, targetSpread, maxSwaps=None):
+    """
+    Restore the balance of assigned squads after some of them changed.
+
+    Players are swapped between one of the squads at the positions in
+    involving and any other squad, until the spread of the squads is no
+    more than targetSpread, such as the spread before they changed. Each
+    swap made is the one that most lowers the imbalance of refineAssign out
+    of the best swaps between each such pair of squads, so that as few
+    players as possible are moved. Stops early if no swap lowers the
+    imbalance, or after maxSwaps swaps.
+
+    The player lists in assigned are changed in place, with the swapped
+    players taking each other's positions. Returns the number of swaps made.
+    """
+    squads = [members for _, members in assigned]
+    totals = [getTotals(members, ratings) for members in squads]
+    findSwap, swapRatings = _swapSearch(ratings)
+    involving = sorted(set(involving))
+    swaps = 0
+
+    while(maxSwaps is None or swaps < maxSwaps):
+        spread = sum([max(skillTotals) - min(skillTotals)
+                      for skillTotals in zip(*totals)])
+        if spread <= targetSpread:
+            break
+
+        best = None
+        for a in involving:
+            for b in range(len(squads)):
+                # Pairs of two involved squads are only searched once
+                if b == a or (b < a and b in involving):
+                    continue
+                swap = findSwap(squads[a], squads[b], totals[a], totals[b],
+                                swapRatings)
+                if swap is None:
+                    continue
+                i, j = swap
+                delta = sum([(q - p) * (ta - tb + q - p) for p, q, ta, tb
+                             in zip(ratings[squads[a][i]],
+                                    ratings[squads[b][j]],
+                                    totals[a], totals[b])])
+                if best is None or delta < best[0]:
+                    best = (delta, a, b, i, j)
+        if best is None:
+            break
+
+        _makeSwap(squads, totals, ratings, *best[1:])
+        swaps += 1
+
+    return swaps
+
+
+def _swapSearch(ratings):
+    """
+    Get the function used to find the best swap between two squads.
+
+    Returns the function along with the ratings in the form it takes them.
+    """
+    if numpy is not None:
+        # Floats let the swaps be evaluated with a BLAS matrix product, and
+        # hold sums of integer ratings exactly
+        return _bestSwapVectorized, numpy.asarray(ratings,
+                                                  dtype=numpy.float64)
+    return _bestSwap, ratings
+
+
+def _makeSwap(squads, totals, ratings, a, b, i, j):
+    """Swap the players at positions i of squad a and j of squad b."""
+    p, q = squads[a][i], squads[b][j]
+    squads[a][i], squads[b][j] = q, p
+    for s, (pRating, qRating) in enumerate(zip(ratings[p], ratings[q])):
+        totals[a][s] += qRating - pRating
+        totals[b][s] -= qRating - pRating
+
+
+def _bestSwap(squadA, squadB, totalsA, totalsB, ratings, deadline=None):
+    """
+    Find the swap between two squads that most lowers their imbalance.
+
+    Returns the positions of the players to swap in each squad, or None if
+    no swap lowers the imbalance. If the deadline passes before every swap
+    has been tried, the best swap found so far is returned.
+    """
+    diff0, diff1, diff2 = [a - b for a, b in zip(totalsA, totalsB)]
+    bestDelta = 0
+    best = None
+    ratingsB = [ratings[q] for q in squadB]
+    for i, p in enumerate(squadA):
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        p0, p1, p2 = ratings[p]
+        for j, (q0, q1, q2) in enumerate(ratingsB):
+            d0, d1, d2 = q0 - p0, q1 - p1, q2 - p2
+            delta = d0*(diff0 + d0) + d1*(diff1 + d1) + d2*(diff2 + d2)
+            if delta < bestDelta:
+                bestDelta = delta
+                best = (i, j)
+    return best
+
+
+def _bestSwapVectorized(squadA, squadB, totalsA, totalsB, ratings,
+                        deadline=None):
+    """
+    Find the swap between two squads that most lowers their imbalance.
+
+    Same as _bestSwap, but with ratings given as a NumPy matrix. Writing
+    d = q - p, the change in imbalance of each swap expands to
+
+        |p|^2 - p.diff + |q|^2 + q.diff - 2 p.q
+
+    where diff is totalsA - totalsB, so the swaps are evaluated with one
+    product of the two squads' ratings. The players of squadA are taken a
+    block at a time, so at most SWAPBLOCKSIZE swaps are evaluated at once
+    and the deadline is checked between blocks.
+    """
+    diff = numpy.subtract(totalsA, totalsB)
+    ratingsA = ratings[squadA]
+    ratingsB = ratings[squadB]
+    rowTerms = (ratingsA * (ratingsA - diff)).sum(axis=1)
+    colTerms = (ratingsB * (ratingsB + diff)).sum(axis=1)
+    ratingsB2 = 2 * ratingsB.T
+    blockRows = max(1, SWAPBLOCKSIZE // max(1, len(squadB)))
+
+    bestDelta = 0
+    best = None
+    for start in range(0, len(squadA), blockRows):
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        stop = start + blockRows
+        deltas = ratingsA[start:stop] @ ratingsB2
+        numpy.subtract(colTerms, deltas, out=deltas)
+        deltas += rowTerms[start:stop, None]
+        block = deltas.argmin()
+        if deltas.flat[block] < bestDelta:
+            bestDelta = deltas.flat[block]
+            i, j = divmod(int(block), len(squadB))
+            best = (start + i, j)
+    return best
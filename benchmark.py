@@ -0,0 +1,220 @@
+"""Benchmarks for Hockey Squad Builder.
+
+Generates deterministic synthetic rosters in the players.json format, and
+times loading, sorting, balancing and rendering them, as well as the two
+routes of the web application. Results are printed, and can be written as
+JSON so that runs from different versions can be compared.
+
+Usage:
+    python3 benchmark.py --sizes 40,1000,10000 --output results.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from unittest.mock import patch
+
+import app
+
+from cache import RosterCache, SquadCache
+from players import Player, PlayerList, Skill
+from squads import getBalancedSquads
+
+FIRSTNAMES = ["Alex", "Bob", "Cristina", "Jill", "Jennifer", "Roy", "Wayne",
+              "Connor", "Sidney", "Hayley", "Marie", "Ben"]
+LASTNAMES = ["Carney", "Smith", "Moses", "White", "Wu", "Talbot", "Gretzky",
+             "McDavid", "Crosby", "Wickenheiser", "Poulin", "Schreiber"]
+
+# Default roster sizes, squad counts and number of timed runs
+SIZES = [40, 1000, 10000, 100000]
+SQUADCOUNTS = [2, 6, 20]
+REPEAT = 3
+
+
+def generatePlayerData(numPlayers, seed=0):
+    """
+    Generate deterministic player data in the players.json format.
+
+    Mirrors the template in playerGenerator.txt, with ratings between
+    20 and 100 for each skill.
+    """
+    rand = random.Random(seed)
+    data = []
+    for i in range(numPlayers):
+        data.append({
+            "_id": "%024x" % rand.getrandbits(96),
+            "firstName": rand.choice(FIRSTNAMES),
+            "lastName": rand.choice(LASTNAMES),
+            "skills": [{"type": "Shooting", "rating": rand.randint(20, 100)},
+                       {"type": "Skating", "rating": rand.randint(20, 100)},
+                       {"type": "Checking", "rating": rand.randint(20, 100)}]
+        })
+    return {"players": data}
+
+
+def writeRoster(numPlayers, fn, seed=0):
+    """Write a generated roster of players to a JSON file."""
+    with open(fn, "w") as f:
+        json.dump(generatePlayerData(numPlayers, seed), f)
+
+
+def measurePlayerMemory(numPlayers=10000, seed=0):
+    """
+    Measure the memory allocated for each Player created from JSON data.
+
+    The JSON data is generated before tracing starts, so only the Player
+    objects and what they hold are counted.
+    """
+    data = generatePlayerData(numPlayers, seed)["players"]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    players = [Player.fromJSON(p) for p in data]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # The list holding the players is not part of a player's own cost
+    listSize = sys.getsizeof(players)
+    return (after - before - listSize)/numPlayers
+
+
+def timeCall(func, repeat=REPEAT, setup=None):
+    """
+    Time a function, returning the fastest of several runs in seconds.
+
+    If a setup function is given, it is called before each run and its
+    result is passed to the function, without being timed.
+    """
+    best = None
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmarkRoster(fn, numPlayers, squadCounts, repeat=REPEAT):
+    """
+    Time each operation on a roster file, returning a list of results.
+
+    Each result is a dict with the name of the benchmark, the number of
+    players and squads, and the fastest time in seconds.
+    """
+    results = []
+
+    def record(name, seconds, numSquads=None):
+        results.append({"benchmark": name, "players": numPlayers,
+                        "squads": numSquads, "seconds": seconds})
+
+    record("PlayerList.fromJSON",
+           timeCall(lambda: PlayerList.fromJSON(fn), repeat))
+
+    playerList = PlayerList.fromJSON(fn)
+
+    def uncachedCopy():
+        # Copies share the kept sort orders, which would otherwise be timed
+        # being looked up rather than worked out after the first run
+        copy = playerList.copy()
+        copy.invalidate()
+        return copy
+
+    for skill in list(Skill) + [None]:
+        name = skill.name if skill else "Name"
+        record("PlayerList.sortedPlayers(%s)" % name,
+               timeCall(lambda pl: pl.sortedPlayers(skill), repeat,
+                        setup=uncachedCopy))
+
+    for numSquads in squadCounts:
+        if numSquads > numPlayers:
+            continue
+        record("getBalancedSquads",
+               timeCall(lambda pl: getBalancedSquads(numSquads, pl), repeat,
+                        setup=uncachedCopy),
+               numSquads)
+
+        squads = getBalancedSquads(numSquads, playerList.copy())
+        record("Squad.toHTML",
+               timeCall(lambda: [s.toHTML() for s in squads], repeat),
+               numSquads)
+
+    # The roster is cached as it would be between requests, but squads are
+    # generated again for every request.
+    client = app.app.test_client()
+    with patch.object(app, "roster", RosterCache(fn)):
+        record("GET /", timeCall(lambda: client.get("/"), repeat))
+        for numSquads in squadCounts:
+            if numSquads > numPlayers:
+                continue
+            form = {"numSquads": str(numSquads)}
+            with patch.object(app, "squadCache", SquadCache(maxSize=0)):
+                record("POST /squads",
+                       timeCall(lambda: client.post("/squads", data=form),
+                                repeat),
+                       numSquads)
+
+    return results
+
+
+def runBenchmarks(sizes=SIZES, squadCounts=SQUADCOUNTS, repeat=REPEAT,
+                  seed=0):
+    """Run the benchmarks for each roster size, returning the results."""
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for numPlayers in sizes:
+            fn = os.path.join(directory, "players%d.json" % numPlayers)
+            writeRoster(numPlayers, fn, seed)
+            results.extend(benchmarkRoster(fn, numPlayers, squadCounts,
+                                           repeat))
+            os.remove(fn)
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def main(argv=None):
+    """Run the benchmarks and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma separated roster sizes")
+    parser.add_argument("--squads", default=",".join(map(str, SQUADCOUNTS)),
+                        help="comma separated numbers of squads")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="number of timed runs for each benchmark")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for generating rosters")
+    parser.add_argument("--output", help="file to write JSON results to")
+    args = parser.parse_args(argv)
+
+    sizes = [int(n) for n in args.sizes.split(",")]
+    squadCounts = [int(n) for n in args.squads.split(",")]
+    results = runBenchmarks(sizes, squadCounts, args.repeat, args.seed)
+    memory = measurePlayerMemory()
+
+    for r in results:
+        squads = "" if r["squads"] is None else "%d squads" % r["squads"]
+        print("%-36s %8d players %-10s %10.6f s"
+              % (r["benchmark"], r["players"], squads, r["seconds"]))
+    print("Memory per player: %.1f bytes" % memory)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(),
+                       "seed": args.seed,
+                       "repeat": args.repeat,
+                       "memoryPerPlayer": memory,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Compact binary roster format for Hockey Players.
+
+A binary roster holds the same data as the players.json format in fixed
+width sections, so it can be memory-mapped and read without parsing. The
+file is laid out as:
+
+    Header:     magic (4 bytes), version (u16), number of skills (u16),
+                number of players (u32), reserved (u32)
+    Entries:    for each player, the offset and length in bytes of their id
+                and of their name in the string table (4 x u32)
+    Ratings:    for each player, their rating for each skill in the order of
+                the Skill enum (i32 each)
+    Strings:    the UTF-8 encoded ids and names of every player
+
+All values are little-endian. Since the file is mapped rather than read,
+processes loading the same roster share its pages in the page cache.
+
+Usage:
+    python3 binroster.py players.json players.bin
+"""
+import mmap
+import os
+import struct
+import sys
+
+from collections.abc import Sequence
+
+from players import JSONFILE, Player, PlayerArray, PlayerList, Skill
+from players import iterPlayersJSON, numpy
+
+MAGIC = b"SQDR"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHII")
+ENTRY = struct.Struct("<IIII")
+RATING = struct.Struct("<i")
+
+
+class BinaryRoster(Sequence):
+    """
+    Read-only sequence of the Players in a memory-mapped binary roster.
+
+    Players are only created when they are accessed, from the entry, ratings
+    and strings stored for them in the file.
+    """
+
+    def __init__(self, fn):
+        """Map a binary roster file and check its header."""
+        with open(fn, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < HEADER.size:
+            raise ValueError("%s is too short to be a binary roster" % fn)
+        magic, version, numSkills, numPlayers, _ = HEADER.unpack_from(
+            self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d binary roster"
+                             % (fn, VERSION))
+        if numSkills != len(Skill):
+            raise ValueError("%s has %d skills, expected %d"
+                             % (fn, numSkills, len(Skill)))
+
+        self._count = numPlayers
+        self._ratingsStart = HEADER.size + ENTRY.size * numPlayers
+        self._ratingSize = RATING.size * numSkills
+        self._stringsStart = self._ratingsStart + self._ratingSize*numPlayers
+        self._ratings = struct.Struct("<%di" % numSkills)
+        if len(self._map) < self._stringsStart:
+            raise ValueError("%s is truncated" % fn)
+
+    def __len__(self):
+        """Get the number of players in the roster."""
+        return self._count
+
+    def __getitem__(self, index):
+        """Get the Player at an index, or a list of Players for a slice."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        index = self._index(index)
+        return Player(self._string(index, 0), self._string(index, 2),
+                      self.ratings(index))
+
+    def _index(self, index):
+        """Check an index into the roster, allowing negative indices."""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("roster index out of range")
+        return index
+
+    def _string(self, index, field):
+        """Decode the id (field 0) or name (field 2) of a player."""
+        entry = ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size*index)
+        start = self._stringsStart + entry[field]
+        return self._map[start:start + entry[field + 1]].decode("utf-8")
+
+    def ratings(self, index):
+        """Get the tuple of skill ratings of the player at an index."""
+        index = self._index(index)
+        return self._ratings.unpack_from(
+            self._map, self._ratingsStart + self._ratingSize*index)
+
+    @property
+    def ids(self):
+        """Get a sequence of the ids of every player, decoded on access."""
+        return _StringColumn(self, 0)
+
+    @property
+    def names(self):
+        """Get a sequence of the names of every player, decoded on access."""
+        return _StringColumn(self, 2)
+
+    def ratingsMatrix(self):
+        """
+        Get the ratings of every player as a NumPy matrix.
+
+        The matrix is a view of the mapped file, so no ratings are copied.
+        """
+        return numpy.frombuffer(self._map, dtype="<i4",
+                                count=self._count * len(Skill),
+                                offset=self._ratingsStart).reshape(
+                                    self._count, len(Skill))
+
+    def copy(self):
+        """Get a copy of the roster, which is itself as it is read-only."""
+        return self
+
+
+class _StringColumn(Sequence):
+    """Sequence of the ids or names in a BinaryRoster."""
+
+    def __init__(self, roster, field):
+        """Create a column for one string field of a roster."""
+        self._roster = roster
+        self._field = field
+
+    def __len__(self):
+        """Get the number of players in the roster."""
+        return len(self._roster)
+
+    def __getitem__(self, index):
+        """Get the string for the player at an index."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._roster._string(self._roster._index(index), self._field)
+
+
+def writeBinary(players, fn):
+    """
+    Write a list of Players to a binary roster file.
+
+    The file is written under a temporary name and then moved into place,
+    so processes that still have the old file mapped are not affected.
+    """
+    entries = []
+    strings = bytearray()
+    for p in players:
+        playerId = str(p._id).encode("utf-8")
+        name = p.name.encode("utf-8")
+        entries.append(ENTRY.pack(len(strings), len(playerId),
+                                  len(strings) + len(playerId), len(name)))
+        strings += playerId + name
+
+    ratings = struct.Struct("<%di" % len(Skill))
+    tmpFn = "%s.tmp%d" % (fn, os.getpid())
+    with open(tmpFn, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(Skill), len(entries), 0))
+        f.write(b"".join(entries))
+        f.write(b"".join([ratings.pack(*p.ratings) for p in players]))
+        f.write(strings)
+    os.replace(tmpFn, fn)
+
+
+def convertJSON(jsonFn=JSONFILE, binFn="players.bin"):
+    """Convert a roster in the players.json format to a binary roster."""
+    writeBinary(list(iterPlayersJSON(jsonFn)), binFn)
+
+
+def loadPlayerList(fn):
+    """
+    Create a PlayerList from a binary roster file.
+
+    The players of the list are the lazily loaded BinaryRoster. When NumPy
+    is installed, a PlayerArray whose ratings are a view of the file is
+    attached too, so squads can be balanced without creating every Player.
+    """
+    roster = BinaryRoster(fn)
+    array = None
+    if numpy is not None:
+        array = PlayerArray(roster.ids, roster.names, roster.ratingsMatrix())
+    return PlayerList(roster, array=array)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python3 binroster.py ROSTER.json ROSTER.bin")
+    convertJSON(sys.argv[1], sys.argv[2])
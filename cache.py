@@ -0,0 +1,145 @@
+"""Caches for the Hockey Squad Builder application."""
+import hashlib
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+from players import JSONFILE, PlayerList
+
+# Default maximum number of entries and lifetime in seconds of squad results
+SQUADCACHESIZE = 128
+SQUADCACHETTL = 600
+
+
+def rosterFingerprint(players):
+    """
+    Get a hash of the contents of a roster.
+
+    The hash covers the id, name and skill ratings of every player, in
+    order, so two rosters have the same fingerprint only if they would be
+    balanced and displayed the same way.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for p in players:
+        digest.update(repr((p._id, p.name, p.ratings)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RosterCache:
+    """
+    Process-level cache of a roster loaded from a file.
+
+    The roster is only loaded again when the modification time or size of
+    the file changes. Each caller gets its own copy of the cached
+    PlayerList, since balancing squads removes players from the list.
+
+    The fingerprint of the roster is calculated once each time it is loaded.
+    """
+
+    def __init__(self, fn=JSONFILE, loader=PlayerList.fromJSON):
+        """Create a RosterCache for a file, loaded with the given loader."""
+        self.fn = fn
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self._key = None
+        self._roster = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Get a copy of the roster, loading it if the file has changed."""
+        return self.load()[0]
+
+    def load(self):
+        """
+        Get a copy of the roster along with its fingerprint.
+
+        The roster is loaded if the file has changed since it was last
+        loaded. Both are taken from the same load of the file.
+        """
+        stat = os.stat(self.fn)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key != self._key:
+                self._roster = self.loader(self.fn)
+                self._fingerprint = rosterFingerprint(self._roster.players)
+                self._key = key
+                self.misses += 1
+            else:
+                self.hits += 1
+            roster, fingerprint = self._roster, self._fingerprint
+        return roster.copy(), fingerprint
+
+    def clear(self):
+        """Forget the cached roster, so it is loaded on the next get."""
+        with self._lock:
+            self._key = None
+            self._roster = None
+            self._fingerprint = None
+
+    def stats(self):
+        """Get the number of cache hits and misses."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class SquadCache:
+    """
+    Bounded least-recently-used cache of generated squads.
+
+    Entries are removed once the cache holds more than maxSize of them,
+    starting with the least recently used, or once they are older than ttl
+    seconds. Keys should include the fingerprint of the roster the squads
+    were generated from, along with every option used to generate them.
+    """
+
+    def __init__(self, maxSize=SQUADCACHESIZE, ttl=SQUADCACHETTL):
+        """Create an empty SquadCache."""
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the value stored for a key, or None if there is none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or
+                                      time.monotonic() < entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a value for a key, evicting old entries if needed."""
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while(len(self._entries) > self.maxSize):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        """Get the number of entries in the cache."""
+        return len(self._entries)
+
+    def stats(self):
+        """Get the number of hits, misses and evictions, and the size."""
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._entries)}
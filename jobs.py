@@ -0,0 +1,198 @@
+"""Background jobs for Hockey Squad Builder.
+
+Generating squads for a large roster can take seconds, which would hold up
+the request that asked for them. A JobQueue instead runs each job on a
+bounded pool of worker threads, and gives back a job id straight away that
+can be used to check on the job, wait for its result, or cancel it.
+"""
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of jobs run at the same time
+JOBWORKERS = 2
+
+# Maximum number of jobs waiting or running before new jobs are refused
+MAXPENDINGJOBS = 16
+
+# Time in seconds finished jobs are kept for their results to be collected
+JOBTTL = 600
+
+# States of a job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a queue with no room left."""
+
+
+class Job:
+    """
+    Representation of a job submitted to a JobQueue.
+
+    A job is queued until a worker starts it, then either done with a result,
+    failed with an error message, or cancelled.
+    """
+
+    def __init__(self, jobId):
+        """Create a queued job with the given id."""
+        self.id = jobId
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.future = None
+        self.finishedAt = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        """Check whether the job is done, failed or cancelled."""
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Wait at most timeout seconds for the job to finish."""
+        return self._finished.wait(timeout)
+
+    def toDict(self):
+        """Get the status of the job, with its result or error, as a dict."""
+        data = {"jobId": self.id, "status": self.status}
+        if self.status == DONE:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    Bounded pool of worker threads running submitted jobs.
+
+    At most maxPending jobs may be queued or running at once, so that a few
+    heavy requests cannot build up an unbounded backlog. Finished jobs are
+    kept for ttl seconds so their results can be collected.
+    """
+
+    def __init__(self, workers=JOBWORKERS, maxPending=MAXPENDINGJOBS,
+                 ttl=JOBTTL):
+        """Create a queue running jobs on the given number of workers."""
+        self.maxPending = maxPending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="squadjob")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Submit a job calling a function with the given arguments.
+
+        Returns the queued Job. Raises a QueueFullError if maxPending jobs
+        are already waiting or running.
+        """
+        with self._lock:
+            self._prune()
+            if(self._pending >= self.maxPending):
+                raise QueueFullError("Too many jobs pending, %d allowed"
+                                     % self.maxPending)
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            self._pending += 1
+            job.future = self._executor.submit(self._run, job, func, args,
+                                               kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        """Run a job in a worker, unless it was cancelled while queued."""
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception as err:
+            self._finish(job, FAILED, error=str(err))
+        else:
+            self._finish(job, DONE, result=result)
+
+    def _finish(self, job, status, result=None, error=None):
+        """Record the outcome of a job that has stopped running."""
+        with self._lock:
+            self._pending -= 1
+            if job.status == CANCELLED:
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finishedAt = time.monotonic()
+            job._finished.set()
+
+    def _prune(self):
+        """Forget jobs that finished more than ttl seconds ago."""
+        expired = time.monotonic() - self.ttl
+        for jobId in [jobId for jobId, job in self._jobs.items()
+                      if job.finished and job.finishedAt <= expired]:
+            del self._jobs[jobId]
+
+    def get(self, jobId):
+        """Get the Job with an id, or None if there is no such job."""
+        with self._lock:
+            self._prune()
+            return self._jobs.get(jobId)
+
+    def wait(self, jobId, timeout=None):
+        """
+        Wait at most timeout seconds for the job with an id to finish.
+
+        Returns the Job whether or not it finished, or None if there is no
+        such job.
+        """
+        job = self.get(jobId)
+        if job is not None:
+            job.wait(timeout)
+        return job
+
+    def cancel(self, jobId):
+        """
+        Cancel the job with an id, if it has not finished.
+
+        A queued job never runs. A running job cannot be interrupted, but its
+        result is discarded when it finishes, and it still counts towards
+        maxPending until then. Returns the Job, or None if there is no such
+        job.
+        """
+        with self._lock:
+            job = self._jobs.get(jobId)
+            if job is None or job.finished:
+                return job
+            self._cancel(job)
+            return job
+
+    def _cancel(self, job):
+        """Mark a job as cancelled, stopping it from running if queued."""
+        if job.status == QUEUED:
+            job.future.cancel()
+            self._pending -= 1
+        job.status = CANCELLED
+        job.finishedAt = time.monotonic()
+        job._finished.set()
+
+    def stats(self):
+        """Get the number of pending jobs and of jobs kept in the queue."""
+        with self._lock:
+            return {"pending": self._pending, "jobs": len(self._jobs)}
+
+    def shutdown(self, wait=True):
+        """Stop the workers, cancelling jobs that have not started."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == QUEUED:
+                    self._cancel(job)
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,161 @@
+"""Parallel multi-start balancing for Hockey Squads.
+
+The greedy algorithm always makes the same choices for the same players,
+so it settles on a single assignment. Multi-start balancing runs many
+randomized variants of it across a pool of processes, and keeps the one
+whose squads have the smallest spread of skill totals.
+
+The pool of processes is kept between calls, and only started again when
+the roster's ratings or the number of workers change, so that a process is
+not started for every request. Starts still running when the deadline
+passes stop by themselves, rather than using the pool's processes after
+their result is no longer wanted.
+"""
+import os
+import random
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from balancing import getSortOrders, getSpread, greedyAssign
+
+
+# Default spread of the random noise added to ratings when sorting players
+PERTURBATION = 5
+
+# Ratings of the roster, set once in each worker process
+_ratings = None
+
+# Pool of worker processes kept between calls, with the ratings and number
+# of workers it was started with. Only one call uses it at a time.
+_pool = None
+_poolRatings = None
+_poolWorkers = None
+_poolLock = threading.Lock()
+
+
+def _initWorker(ratings):
+    """Store the ratings of the roster in a worker process."""
+    global _ratings
+    _ratings = ratings
+
+
+def _runStart(numSquads, squadSize, seed, perturbation, endTime):
+    """
+    Run a single randomized start using the worker's ratings.
+
+    Returns None if the end time passes before the start finishes.
+    """
+    try:
+        assigned = randomizedAssign(numSquads, squadSize, _ratings, seed,
+                                    perturbation, endTime)
+    except TimeoutError:
+        return None
+    return getSpread(assigned, _ratings), seed, assigned
+
+
+def randomizedAssign(numSquads, squadSize, ratings, seed,
+                     perturbation=PERTURBATION, endTime=None):
+    """
+    Assign players to squads with a randomized variant of the greedy.
+
+    Players are sorted by each skill after adding random noise of up to
+    perturbation to their ratings, so players with close ratings may be
+    picked in a different order. The greedy itself is run on the true
+    ratings, so squad totals are compared without the noise.
+
+    If an end time is given, as a value of time.monotonic, a TimeoutError is
+    raised if the squads are not assigned by then.
+    """
+    rand = random.Random(seed)
+    noisy = [tuple(r + rand.uniform(0, perturbation) for r in rating)
+             for rating in ratings]
+    if endTime is not None and time.monotonic() > endTime:
+        raise TimeoutError("Squads were not assigned in time")
+    return greedyAssign(numSquads, squadSize, ratings, getSortOrders(noisy),
+                        endTime)
+
+
+def _getPool(ratings, workers):
+    """
+    Get the pool of worker processes for a roster's ratings.
+
+    The kept pool is used if it was started with the same ratings and
+    number of workers, and is otherwise replaced. Called with the pool lock
+    held.
+    """
+    global _pool, _poolRatings, _poolWorkers
+    if _pool is not None and (_poolWorkers != workers or
+                              _poolRatings != ratings):
+        closePool()
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers,
+                                    initializer=_initWorker,
+                                    initargs=(ratings,))
+        _poolRatings = ratings
+        _poolWorkers = workers
+    return _pool
+
+
+def closePool():
+    """Stop the kept pool of worker processes, if there is one."""
+    global _pool, _poolRatings, _poolWorkers
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _poolRatings = None
+    _poolWorkers = None
+
+
+def multiStartAssign(numSquads, squadSize, ratings, orders, starts,
+                     workers=None, deadline=None, perturbation=PERTURBATION):
+    """
+    Assign players to squads using the best of several randomized starts.
+
+    The plain greedy assignment is always computed first using the given
+    sort orders, and the other starts - 1 randomized starts are run in the
+    kept pool of worker processes. The ratings are sent to each worker once
+    when it starts, rather than with every task. If deadline seconds pass
+    before every start finishes, the remaining starts are cancelled, those
+    already running stop at the deadline, and the best result so far is
+    used.
+
+    Returns the assignment with the lowest spread, in the same form as
+    greedyAssign. Ties are won by the earliest start.
+    """
+    endTime = None if deadline is None else time.monotonic() + deadline
+    greedy = greedyAssign(numSquads, squadSize, ratings, orders)
+    best = (getSpread(greedy, ratings), 0, greedy)
+    if starts <= 1:
+        return greedy
+
+    workers = workers or os.cpu_count() or 1
+    with _poolLock:
+        executor = _getPool(ratings, workers)
+        pending = set()
+        try:
+            pending = {executor.submit(_runStart, numSquads, squadSize, seed,
+                                       perturbation, endTime)
+                       for seed in range(1, starts)}
+            while(pending):
+                timeout = None
+                if endTime is not None:
+                    timeout = max(endTime - time.monotonic(), 0)
+                done, pending = wait(pending, timeout=timeout,
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    result = future.result()
+                    if result is not None:
+                        best = min(best, result, key=lambda r: r[:2])
+        except BaseException:
+            # A pool whose processes died cannot be used again
+            closePool()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    return best[2]
@@ -0,0 +1,184 @@
+"""Exact branch-and-bound balancing for Hockey Squads.
+
+The greedy algorithm gives no guarantee of how well balanced its squads
+are. For small and medium rosters, a branch-and-bound search can instead
+find the assignment with the lowest possible spread of skill totals, by
+trying every way of placing the players while cutting off any branch that
+cannot beat the best assignment found so far.
+
+Like the other engines, the search works on player indices and tuples of
+skill ratings.
+"""
+import time
+
+from balancing import SKILLS, getSpread, greedyAssign
+
+# Default maximum time in seconds spent searching for the optimal squads
+OPTIMALTIMELIMIT = 5.0
+
+# Number of search nodes visited between checks of the time limit
+CHECKINTERVAL = 1024
+
+
+def optimalAssign(numSquads, squadSize, ratings, orders,
+                  timeLimit=OPTIMALTIMELIMIT):
+    """
+    Assign players to squads with the lowest possible spread.
+
+    The squads of the greedy algorithm are found first using the given sort
+    orders, and the search only looks for squads better than them. If the
+    search has not finished after timeLimit seconds, the best squads found
+    so far are used, so the result is never worse than the greedy.
+
+    Returns a list of (squad index, player indices) pairs, in order of
+    squad index.
+    """
+    return branchAndBound(numSquads, squadSize, ratings, orders,
+                          timeLimit)[1]
+
+
+def branchAndBound(numSquads, squadSize, ratings, orders,
+                   timeLimit=OPTIMALTIMELIMIT):
+    """
+    Search for the assignment of players to squads with the lowest spread.
+
+    Players are placed one at a time, from the highest total rating to the
+    lowest, either in a squad with room left or on the waiting list, which
+    takes the players left over once every squad is full. Squads are tried
+    from the lowest total rating up, so good assignments are found early.
+
+    Branches are cut off in two ways:
+      - Squads holding the same number of players with the same totals are
+        interchangeable, so a player is only placed in the first of them.
+        In particular, a player is only tried in one of the empty squads.
+      - The spread of each skill can be no lower than the difference
+        between the highest squad total so far, and the most the lowest
+        squad could reach if its remaining places were filled with the best
+        remaining rating. When every player is placed in a squad, the
+        highest and lowest totals must also be on either side of the
+        average. Branches whose bound is no better than the best spread
+        found so far are skipped.
+
+    A timeLimit of None lets the search run until it finishes.
+
+    Returns a tuple of the spread, the assignment in the same form as
+    optimalAssign, and whether the search finished, proving the assignment
+    is optimal.
+    """
+    numPlayers = len(ratings)
+    numSkills = len(SKILLS)
+    waitCapacity = numPlayers - numSquads*squadSize
+    deadline = None if timeLimit is None else time.monotonic() + timeLimit
+
+    # The greedy squads are the ones to beat
+    greedy = greedyAssign(numSquads, squadSize, ratings, orders)
+    bestSpread = getSpread(greedy, ratings)
+    best = sorted(greedy)
+
+    order = sorted(range(numPlayers), key=lambda i: -sum(ratings[i]))
+
+    # Highest rating of each skill among the players from each position on
+    suffixMax = [[0] * numSkills for _ in range(numPlayers + 1)]
+    for d in range(numPlayers - 1, -1, -1):
+        rating = ratings[order[d]]
+        suffixMax[d] = [max(m, r) for m, r in zip(suffixMax[d + 1], rating)]
+
+    # With no waiting list, the final totals of each skill are known
+    if waitCapacity == 0:
+        averages = [(sum([r[s] for r in ratings]) // numSquads,
+                     -(-sum([r[s] for r in ratings]) // numSquads))
+                    for s in range(numSkills)]
+    else:
+        averages = None
+
+    totals = [[0] * numSkills for _ in range(numSquads)]
+    counts = [0] * numSquads
+    waiting = [0]
+    placed = [None] * numPlayers
+
+    def lowerBound(d):
+        """Get a lower bound on the spread once every player is placed."""
+        bound = 0
+        remaining = suffixMax[d]
+        for s in range(numSkills):
+            highest = max([t[s] for t in totals])
+            lowest = min([t[s] + (squadSize - c) * remaining[s]
+                          for t, c in zip(totals, counts)])
+            if averages is not None:
+                lowest = min(lowest, averages[s][0])
+                highest = max(highest, averages[s][1])
+            if highest > lowest:
+                bound += highest - lowest
+        return bound
+
+    def candidates(d):
+        """Get where the player at a position may be placed, in order."""
+        seen = set()
+        squads = []
+        for j in range(numSquads):
+            if counts[j] < squadSize:
+                key = (counts[j], tuple(totals[j]))
+                if key not in seen:
+                    seen.add(key)
+                    squads.append((sum(totals[j]), j))
+        squads.sort()
+        bins = [j for _, j in squads]
+        if waiting[0] < waitCapacity:
+            bins.append(numSquads)
+        return bins
+
+    def move(d, target, sign):
+        """Place the player at a position in a squad, or take them out."""
+        if target == numSquads:
+            waiting[0] += sign
+            return
+        counts[target] += sign
+        squadTotals = totals[target]
+        for s, r in enumerate(ratings[order[d]]):
+            squadTotals[s] += sign * r
+
+    rootBound = lowerBound(0)
+    nodes = 0
+    finished = True
+    d = 0
+    bins = [None] * numPlayers
+    positions = [0] * numPlayers
+    bins[0] = candidates(0)
+
+    while(d >= 0 and bestSpread > rootBound):
+        if positions[d] > 0:
+            move(d, placed[d], -1)
+        if positions[d] == len(bins[d]):
+            d -= 1
+            continue
+
+        target = bins[d][positions[d]]
+        positions[d] += 1
+        placed[d] = target
+        move(d, target, 1)
+
+        nodes += 1
+        if(deadline is not None and nodes % CHECKINTERVAL == 0 and
+           time.monotonic() > deadline):
+            finished = False
+            break
+
+        if d == numPlayers - 1:
+            spread = sum([max(t[s] for t in totals) -
+                          min(t[s] for t in totals)
+                          for s in range(numSkills)])
+            if spread < bestSpread:
+                bestSpread = spread
+                best = [(j, [order[i] for i in range(numPlayers)
+                             if placed[i] == j])
+                        for j in range(numSquads)]
+            continue
+
+        if lowerBound(d + 1) >= bestSpread:
+            continue
+
+        d += 1
+        bins[d] = candidates(d)
+        positions[d] = 0
+
+    return bestSpread, best, finished
@@ -1,12 +1,30 @@
 """Classes and Functions for Hockey Players."""
 import json
+import re
 from enum import Enum
 
 from flask_table import Table, Col
 
+from render import iterTable, renderTable
+from timing import span
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Default JSON Data file
 JSONFILE = "players.json"
 
+# Number of characters read at a time when streaming players from JSON
+STREAMCHUNKSIZE = 64 * 1024
+
+# Message shown in place of an empty list of players
+EMPTYMESSAGE = "No Players on Waiting List"
+
+PLAYERSKEY = re.compile(r'"players"\s*:\s*\[')
+WHITESPACE = re.compile(r'[\s,]*')
+
 
 class Skill(Enum):
     """Enum for the currently available skills."""
@@ -16,6 +34,10 @@ class Skill(Enum):
     Checking = 3
 
 
+# Names of the columns in tables of players
+COLUMNS = tuple(["Name"] + [skill.name for skill in Skill])
+
+
 def getSkillRatings(data):
     """Get a player's three skill ratings from their JSON data."""
     mySkills = {}
@@ -24,6 +46,58 @@ def getSkillRatings(data):
     return mySkills
 
 
+def iterPlayerData(f, chunkSize=STREAMCHUNKSIZE):
+    """
+    Yield the JSON data of each player in a stream, one player at a time.
+
+    The stream is read in chunks of chunkSize characters, and each element
+    of the "players" array is decoded as soon as it has been read in full.
+    Only the current chunk and the player being decoded are held in memory,
+    rather than the whole parsed file. The "players" key is assumed not to
+    appear earlier in the file as part of any other value.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    while(True):
+        chunk = f.read(chunkSize)
+        buf += chunk
+        match = PLAYERSKEY.search(buf)
+        if match:
+            pos = match.end()
+            break
+        elif not chunk:
+            raise ValueError('No "players" array found in JSON data')
+        # Keep enough of the end of the buffer to match a split key
+        keep = buf.rfind('"players"')
+        buf = buf[keep:] if keep >= 0 else buf[-len('"players"'):]
+
+    eof = False
+    while(True):
+        pos = WHITESPACE.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            if pos == len(buf):
+                raise json.JSONDecodeError("Incomplete data", buf, pos)
+            data, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunkSize)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield data
+
+
+def iterPlayersJSON(fn=JSONFILE, chunkSize=STREAMCHUNKSIZE):
+    """Yield each Player in a JSON file, reading it incrementally."""
+    with open(fn) as f:
+        for data in iterPlayerData(f, chunkSize):
+            yield Player.fromJSON(data)
+
+
 class Player:
     """
     Representation of a Hockey Player.
@@ -31,39 +105,66 @@ class Player:
     A Player contains a unique identifier, a name, and a series
     of skill ratings that correspond to the skill types at the
     head of the file.
+
+    The ratings are stored in a tuple in the order of the Skill enum,
+    so the rating for a skill is at the position skill.value - 1. Slots
+    are used so that large rosters do not need a dict for every player.
     """
 
+    __slots__ = ("_id", "name", "ratings")
+
     def __init__(self, id, name, skills):
-        """Create a Player."""
+        """
+        Create a Player.
+
+        The skills can be given as a dict of ratings keyed by Skill, or as a
+        sequence of ratings in the order of the Skill enum.
+        """
         self._id = id
         self.name = name
-        self.skills = skills
+        if isinstance(skills, dict):
+            self.ratings = tuple([skills[skill] for skill in Skill])
+        else:
+            self.ratings = tuple(skills)
+
+    @property
+    def skills(self):
+        """Return a dict of the player's ratings, keyed by Skill."""
+        return dict(zip(Skill, self.ratings))
+
+    def rating(self, skill):
+        """Return the player's rating for the given skill."""
+        return self.ratings[skill.value - 1]
 
     @property
     def skating(self):
         """Return the player's Skating rating."""
-        return self.skills[Skill.Skating]
+        return self.ratings[0]
 
     @property
     def shooting(self):
         """Return the player's Shooting rating."""
-        return self.skills[Skill.Shooting]
+        return self.ratings[1]
 
     @property
     def checking(self):
         """Return the player's Checking rating."""
-        return self.skills[Skill.Checking]
+        return self.ratings[2]
 
     def __eq__(self, other):
         """
         Override the equality operator for Players.
 
         Two players are considered equal if all of their attributes are equal.
+        A player is always equal to itself, which is checked first so that
+        searching a list for a player it holds does not compare attributes.
         """
+        if self is other:
+            return True
         try:
             return (self._id == other._id and
                     self.name == other.name and
-                    self.skills == other.skills)
+                    self.ratings == other.ratings)
         except AttributeError:
             return False
 
@@ -81,12 +182,139 @@ class PlayerList:
 
     Allows players to be grouped together, and for them to
     be output in an HTML table for webpage viewing.
+
+    A PlayerList can optionally carry a PlayerArray holding the same
+    players in columnar form, which is then used for sorting.
+
+    The order of the players by each skill, and by name, is worked out the
+    first time it is needed and kept until the players change. Replacing
+    the list of players discards the kept orders, but a list changed in
+    place must be followed by a call to invalidate.
+
+    Players can be removed by id in constant time with removePlayer, which
+    only marks their position as removed. The marked players are dropped
+    from the list together the next time it is used, keeping the order of
+    the rest. Player ids are expected to be unique within the list.
     """
 
-    def __init__(self, players):
-        """Create a PlayerList and generate a HTML table for itself."""
+    def __init__(self, players, array=None):
+        """Create a PlayerList."""
         self.players = players
-        self.updateTable()
+        self.array = array
+
+    @property
+    def players(self):
+        """Get the list of players, dropping any removed players first."""
+        if self._removed is not None:
+            self._compact()
+        return self._players
+
+    @players.setter
+    def players(self, players):
+        """
+        Set the list of players, discarding the kept sort orders.
+
+        The PlayerArray is discarded too, as it holds the old players.
+        """
+        self._players = players
+        self._array = None
+        self._orders = {}
+        self._positions = None
+        self._removed = None
+
+    @property
+    def array(self):
+        """Get the PlayerArray, dropping any removed players first."""
+        if self._removed is not None:
+            self._compact()
+        return self._array
+
+    @array.setter
+    def array(self, array):
+        """Set the PlayerArray holding the same players as the list."""
+        self._array = array
+
+    def invalidate(self):
+        """Discard the kept sort orders after the players change in place."""
+        self._orders = {}
+        self._positions = None
+
+    def _positionIndex(self):
+        """Get a dict from the id of each player to their position."""
+        if self._positions is None:
+            self._positions = {p._id: i for i, p in enumerate(self._players)}
+            if self._removed is not None:
+                for i, removed in enumerate(self._removed):
+                    if removed:
+                        del self._positions[self._players[i]._id]
+        return self._positions
+
+    def __contains__(self, player):
+        """Check whether a player with the same id is in the list."""
+        return player._id in self._positionIndex()
+
+    def removePlayer(self, player):
+        """
+        Remove the player with the same id as a player from the list.
+
+        The player's position is only marked as removed, so removing takes
+        constant time. Errors if there is no such player in the list.
+        """
+        try:
+            position = self._positionIndex().pop(player._id)
+        except KeyError:
+            raise ValueError("Player %s is not in the list" % player._id)
+        if self._removed is None:
+            self._removed = bytearray(len(self._players))
+        self._removed[position] = 1
+
+    def _compact(self):
+        """Drop the players marked as removed from the list."""
+        removed = self._removed
+        self._removed = None
+        self.keepPlayers([i for i in range(len(removed)) if not removed[i]])
+
+    def sortOrder(self, sortSkill=None):
+        """
+        Get the positions of the players in ascending order.
+
+        An optional skill can be passed, in which case the players are
+        ordered by this skill. If no skill is passed, they are ordered by
+        name. Players that tie keep their order in the list.
+
+        The order is kept for later calls, and must not be changed. A kept
+        order for a different number of players than the list now holds is
+        a sign the list was changed in place, so every kept order is
+        discarded in that case.
+        """
+        order = self._orders.get(sortSkill)
+        if order is not None and len(order) != len(self.players):
+            self.invalidate()
+            order = None
+        if order is None:
+            if sortSkill and self.array is not None:
+                order = self.array.sortOrder(sortSkill).tolist()
+            elif sortSkill:
+                key = [p.rating(sortSkill) for p in self.players]
+                order = sorted(range(len(key)), key=key.__getitem__)
+            else:
+                key = [p.name for p in self.players]
+                order = sorted(range(len(key)), key=key.__getitem__)
+            self._orders[sortSkill] = order
+        return order
+
+    def keepSortOrder(self, order, sortSkill=None):
+        """
+        Keep a sort order of the players worked out elsewhere.
+
+        The order must be the same as sortOrder would give for the skill,
+        or by name if no skill is given, such as one read from a database
+        index. It is then used instead of sorting the players.
+        """
+        if len(order) != len(self.players):
+            raise ValueError("Sort order has %d positions for %d players"
+                             % (len(order), len(self.players)))
+        self._orders[sortSkill] = order
 
     def sortedPlayers(self, sortSkill=None):
         """
@@ -96,26 +324,69 @@ class PlayerList:
         players are sorted by this skill. If no skill is passed,
         they are sorted by name.
         """
-        if sortSkill:
-            return sorted(self.players,
-                          key=lambda x: x.skills[sortSkill])
-        else:
-            return sorted(self.players, key=lambda x: x.name)
-
-    def updateTable(self):
-        """Update the table of players."""
-        emptyMsg = "No Players on Waiting List"
-        tableClasses = ["playerList"]
-        tableHTMLAttrs = {"align": "center"}
-        self.table = PlayerTable(self.players,
-                                 classes=tableClasses,
-                                 no_items=emptyMsg,
-                                 html_attrs=tableHTMLAttrs)
+        players = self.players
+        return [players[i] for i in self.sortOrder(sortSkill)]
+
+    def copy(self):
+        """
+        Get a copy of the PlayerList.
+
+        The list of players is copied, so players can be removed from the
+        copy without changing the original. The Players themselves and the
+        PlayerArray are shared, as neither is changed after creation.
+
+        The kept sort orders are shared too, until either list changes, so
+        orders worked out for a copy are kept for the original and its
+        other copies as well.
+        """
+        copy = PlayerList(self.players.copy(), array=self.array)
+        copy._orders = self._orders
+        return copy
+
+    def keepPlayers(self, indices):
+        """
+        Keep only the players at the given positions in the list.
+
+        The columnar array is reduced to the same players, if there is one.
+        When the positions are in ascending order, the kept sort orders are
+        reduced to the same players too, rather than sorted again.
+        """
+        indices = list(indices)
+        orders = self._orders
+        array = self.array
+        newPositions = [-1] * len(self.players)
+        self.players = [self.players[i] for i in indices]
+        if array is not None:
+            self.array = array.take(indices)
+
+        if orders and all([a < b for a, b in zip(indices, indices[1:])]):
+            for new, old in enumerate(indices):
+                newPositions[old] = new
+            self._orders = {key: [i for i in map(newPositions.__getitem__,
+                                                 order) if i >= 0]
+                            for key, order in orders.items()}
+
+    @property
+    def table(self):
+        """
+        Get a Flask-Table of the players.
+
+        The HTML of the player list is rendered directly by toHTML, and
+        this table is only built when asked for.
+        """
+        return PlayerTable(self.players,
+                           classes=["playerList"],
+                           no_items=EMPTYMESSAGE,
+                           html_attrs={"align": "center"})
+
+    def iterHTML(self):
+        """Yield the HTML table of the list of players in fragments."""
+        return iterTable(self.players, COLUMNS, EMPTYMESSAGE)
 
     def toHTML(self):
-        """Update and return the HTML table for to the list of players."""
-        self.updateTable()
-        return self.table.__html__()
+        """Return the HTML table for the list of players."""
+        with span("toHTML"):
+            return renderTable(self.players, COLUMNS, EMPTYMESSAGE)
 
     def __eq__(self, other):
         """
@@ -129,22 +400,136 @@ class PlayerList:
             return False
 
     @classmethod
-    def fromJSON(cls, fn=JSONFILE):
+    def fromJSON(cls, fn=JSONFILE, columnar=False):
         """
         Read data from a JSON file, and create a PlayerList from it.
 
         Defaults to the provided example file, players.json.
 
-        TODO: Recieve JSON data from REST API rather than reading from
-        a file.
+        If columnar is set, a PlayerArray is also built from the data and
+        attached to the PlayerList. This requires NumPy. Rosters served by
+        a REST API are fetched with rosterclient.RosterClient instead.
         """
-        players = []
-        with open(fn) as f:
-            data = json.load(f)
+        with span("fromJSON"):
+            with open(fn) as f:
+                data = json.load(f)
+            if columnar:
+                array = PlayerArray.fromJSON(data)
+                return cls(array.toPlayers(), array=array)
+
+            players = []
+            for player in data["players"]:
+                p = Player.fromJSON(player)
+                players.append(p)
+            return cls(players)
+
+    @classmethod
+    def fromJSONStream(cls, fn=JSONFILE, chunkSize=STREAMCHUNKSIZE):
+        """
+        Read a JSON file incrementally, and create a PlayerList from it.
+
+        Unlike fromJSON, the file is never parsed as a whole, so only the
+        Players themselves are kept in memory. This allows very large
+        rosters to be loaded.
+        """
+        return cls(list(iterPlayersJSON(fn, chunkSize)))
+
+
+class PlayerArray:
+    """
+    Columnar representation of a set of players, backed by NumPy.
+
+    The ids and names of the players are stored as sequences, and the skill
+    ratings in an integer matrix with one row per player and one column
+    per skill, in the order of the Skill enum. Sorting and summing skills
+    is then done with vectorized operations rather than per-player
+    attribute lookups.
+
+    An integer matrix of ratings is used as given rather than copied, so a
+    PlayerArray can be a view over ratings held elsewhere.
+    """
+
+    def __init__(self, ids, names, ratings):
+        """Create a PlayerArray from ids, names and a matrix of ratings."""
+        if numpy is None:
+            raise ImportError("PlayerArray requires NumPy to be installed")
+        self.ids = ids
+        self.names = names
+        self.ratings = numpy.asarray(ratings)
+        if self.ratings.dtype.kind not in "iu":
+            self.ratings = self.ratings.astype(numpy.int64)
+        self.ratings = self.ratings.reshape(len(self.ids), len(Skill))
+        self._sortOrders = {}
+
+    def __len__(self):
+        """Get the number of players in the array."""
+        return len(self.ids)
+
+    def column(self, skill):
+        """Get a view of the ratings of every player for one skill."""
+        return self.ratings[:, skill.value - 1]
+
+    def sortOrder(self, skill):
+        """
+        Get the indices of the players when sorted by a skill.
+
+        The sort is ascending and stable, matching PlayerList.sortedPlayers.
+        Orders are cached, since the array is not modified once created.
+        """
+        if skill not in self._sortOrders:
+            self._sortOrders[skill] = numpy.argsort(self.column(skill),
+                                                    kind="stable")
+        return self._sortOrders[skill]
+
+    def squadTotals(self, squads):
+        """
+        Get the total of each skill for groups of players.
+
+        Each squad is given as an array of player indices, and the result
+        is a matrix with one row of skill totals per squad.
+        """
+        totals = numpy.zeros((len(squads), len(Skill)), dtype=numpy.int64)
+        for i, indices in enumerate(squads):
+            totals[i] = self.ratings[numpy.asarray(indices,
+                                                   dtype=numpy.intp)].sum(0)
+        return totals
+
+    def take(self, indices):
+        """Get a new PlayerArray containing only the given players."""
+        indices = numpy.asarray(indices, dtype=numpy.intp)
+        return PlayerArray([self.ids[i] for i in indices.tolist()],
+                           [self.names[i] for i in indices.tolist()],
+                           self.ratings[indices])
+
+    def player(self, index):
+        """Get the Player at the given index."""
+        return Player(self.ids[index], self.names[index],
+                      self.ratings[index].tolist())
+
+    def toPlayers(self):
+        """Get a list of Players for every player in the array."""
+        rows = self.ratings.tolist()
+        return [Player(id, name, row)
+                for id, name, row in zip(self.ids, self.names, rows)]
+
+    @classmethod
+    def fromPlayers(cls, players):
+        """Create a PlayerArray from a list of Players."""
+        return cls([p._id for p in players],
+                   [p.name for p in players],
+                   [p.ratings for p in players])
+
+    @classmethod
+    def fromJSON(cls, data):
+        """Create a PlayerArray from JSON data containing a list of players."""
+        ids, names, ratings = [], [], []
         for player in data["players"]:
-            p = Player.fromJSON(player)
-            players.append(p)
-        return cls(players)
+            skills = getSkillRatings(player)
+            ids.append(player["_id"])
+            names.append(' '.join([player["firstName"],
+                                   player["lastName"]]))
+            ratings.append([skills[skill] for skill in Skill])
+        return cls(ids, names, ratings)
 
 
 class PlayerTable(Table):
@@ -0,0 +1,285 @@
+"""Pre-fork production server for Hockey Squad Builder.
+
+Flask's development server runs in a single process, so every request
+shares one interpreter. The pre-fork server instead loads and parses the
+roster once in a parent process, then forks several worker processes that
+each serve requests from the same listening socket. The workers inherit
+the parsed roster, its sort orders and any rating arrays from the parent,
+and share their memory copy-on-write, so the roster is neither parsed nor
+held again by each worker.
+
+The parent checks the roster for changes, and when it changes, parses it
+once more and forks a new set of workers before asking the old ones to
+finish the requests they are serving and exit. Sending the parent SIGHUP
+reloads the workers straight away, and SIGTERM or SIGINT shuts the server
+down.
+
+Background jobs are refused when the application is served this way, since
+a job is only known to the worker that runs it.
+
+Usage:
+    python3 prefork.py [--host HOST] [--port PORT] [--workers WORKERS]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+from players import Skill
+
+# Default address the server listens on
+HOST = "0.0.0.0"
+PORT = 5000
+
+# Default number of worker processes
+WORKERS = os.cpu_count() or 1
+
+# Time in seconds between checks of the roster for changes
+ROSTERCHECKINTERVAL = 2.0
+
+# Time in seconds old workers are given to finish their requests on reload
+GRACEFULTIMEOUT = 30.0
+
+# Signals handled by the parent process
+PARENTSIGNALS = (signal.SIGCHLD, signal.SIGHUP, signal.SIGINT, signal.SIGTERM)
+
+
+class PreforkServer:
+    """
+    Parent process of a set of forked workers serving a Flask application.
+
+    The roster is any object with the interface of cache.RosterCache. Each
+    worker starts with the roster as loaded by the parent, and is replaced
+    by the parent soon after the roster changes.
+    """
+
+    def __init__(self, app, roster, host=HOST, port=PORT, workers=WORKERS,
+                 checkInterval=ROSTERCHECKINTERVAL,
+                 gracefulTimeout=GRACEFULTIMEOUT):
+        """Create a server for an application, sharing a roster."""
+        self.app = app
+        self.roster = roster
+        self.host = host
+        self.port = port
+        self.numWorkers = workers
+        self.checkInterval = checkInterval
+        self.gracefulTimeout = gracefulTimeout
+        self.socket = None
+        self.fingerprint = None
+        self.generation = 0
+        self.workers = {}
+        self._retiring = {}
+
+    def bind(self):
+        """Open the listening socket shared by the workers."""
+        self.socket = socket.create_server((self.host, self.port),
+                                           backlog=128)
+        self.host, self.port = self.socket.getsockname()[:2]
+        return self.host, self.port
+
+    def preload(self):
+        """
+        Load the roster in the parent, ready to be shared by the workers.
+
+        The sort orders of the roster by each skill and by name are worked
+        out here, since every copy of the roster shares them. The loaded
+        objects are then moved out of reach of the garbage collector, whose
+        passes would otherwise write to every object and unshare the pages
+        holding them. Returns the fingerprint of the roster.
+        """
+        playerList, self.fingerprint = self.roster.load()
+        for sortSkill in list(Skill) + [None]:
+            playerList.sortOrder(sortSkill)
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        return self.fingerprint
+
+    def rosterChanged(self):
+        """Check whether the roster differs from the one last preloaded."""
+        return self.roster.load()[1] != self.fingerprint
+
+    def spawn(self):
+        """Fork a worker of the current generation, returning its pid."""
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                self._runWorker()
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        self.workers[pid] = self.generation
+        return pid
+
+    def _runWorker(self):
+        """Serve requests in a worker until asked to stop by SIGTERM."""
+        # Connections kept open by the parent's roster are not shared
+        close = getattr(self.roster, "close", None)
+        if close is not None:
+            close()
+
+        server = make_server(self.host, self.port, self.app, threaded=True,
+                             fd=self.socket.fileno())
+        # Requests being served are finished before the worker exits
+        server.daemon_threads = False
+
+        def stop(signum, frame):
+            threading.Thread(target=server.shutdown).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, PARENTSIGNALS)
+        server.serve_forever()
+        server.server_close()
+
+    def reap(self):
+        """
+        Collect workers that have exited.
+
+        Returns the number of workers of the current generation that exited,
+        which need to be replaced.
+        """
+        lost = 0
+        while(self.workers or self._retiring):
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self._retiring.pop(pid, None)
+            if self.workers.pop(pid, None) == self.generation:
+                lost += 1
+        return lost
+
+    def reload(self):
+        """
+        Replace every worker with one sharing a freshly loaded roster.
+
+        The new workers are started before the old ones are stopped, so
+        requests keep being served throughout. The old workers finish the
+        requests they are serving, and are killed if they take more than
+        gracefulTimeout seconds.
+        """
+        old = list(self.workers)
+        self.preload()
+        self.generation += 1
+        for _ in range(self.numWorkers):
+            self.spawn()
+        deadline = time.monotonic() + self.gracefulTimeout
+        for pid in old:
+            self._retiring[pid] = deadline
+            self._signal(pid, signal.SIGTERM)
+
+    def _killOverdue(self):
+        """Kill old workers that have not finished by their deadline."""
+        now = time.monotonic()
+        for pid, deadline in list(self._retiring.items()):
+            if now > deadline:
+                self._signal(pid, signal.SIGKILL)
+                # Killed workers are kept until reaped, but not killed again
+                self._retiring[pid] = float("inf")
+
+    def _signal(self, pid, signum):
+        """Send a signal to a worker, if it has not already exited."""
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def serve(self):
+        """
+        Run the server until it receives SIGTERM or SIGINT.
+
+        The parent handles signals synchronously, so they are blocked while
+        it runs, and unblocked again in each worker.
+        """
+        if self.socket is None:
+            self.bind()
+        self.preload()
+        signal.pthread_sigmask(signal.SIG_BLOCK, PARENTSIGNALS)
+        try:
+            for _ in range(self.numWorkers):
+                self.spawn()
+            print("Listening on http://%s:%d with %d workers"
+                  % (self.host, self.port, self.numWorkers),
+                  file=sys.stderr, flush=True)
+            nextCheck = time.monotonic() + self.checkInterval
+
+            while(True):
+                timeout = max(0, nextCheck - time.monotonic())
+                info = signal.sigtimedwait(PARENTSIGNALS, timeout)
+                signum = info.si_signo if info is not None else None
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    break
+
+                for _ in range(self.reap()):
+                    self.spawn()
+                self._killOverdue()
+
+                if signum == signal.SIGHUP:
+                    print("Reloading workers", file=sys.stderr, flush=True)
+                    self.reload()
+                elif time.monotonic() >= nextCheck:
+                    nextCheck = time.monotonic() + self.checkInterval
+                    try:
+                        changed = self.rosterChanged()
+                    except (OSError, ValueError) as err:
+                        # A roster being replaced may not be readable yet
+                        print("Roster check failed: %s" % err,
+                              file=sys.stderr, flush=True)
+                        continue
+                    if changed:
+                        print("Roster changed, reloading workers",
+                              file=sys.stderr, flush=True)
+                        self.reload()
+        finally:
+            self.stop()
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, PARENTSIGNALS)
+
+    def stop(self):
+        """Stop every worker gracefully, then close the listening socket."""
+        deadline = time.monotonic() + self.gracefulTimeout
+        for pid in list(self.workers) + list(self._retiring):
+            self._retiring[pid] = deadline
+            self._signal(pid, signal.SIGTERM)
+        self.workers = {}
+        while(self._retiring):
+            self.reap()
+            self._killOverdue()
+            time.sleep(0.05)
+        self.socket.close()
+        self.socket = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST,
+                        help="address to listen on")
+    parser.add_argument("--port", type=int, default=PORT,
+                        help="port to listen on")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="number of worker processes")
+    parser.add_argument("--check-interval", type=float,
+                        default=ROSTERCHECKINTERVAL,
+                        help="seconds between checks of the roster")
+    args = parser.parse_args()
+
+    import app
+    # Jobs are kept by the worker that runs them, where requests from other
+    # workers cannot find them, and are lost when workers are replaced
+    app.disableJobs()
+    PreforkServer(app.app, app.roster, args.host, args.port, args.workers,
+                  args.check_interval).serve()
@@ -0,0 +1,77 @@
+"""Direct HTML rendering of tables of players.
+
+Produces the same markup as the Flask-Table based PlayerTable and SquadTable,
+but writes each row directly from the player's name and ratings instead of
+dispatching through a Table and its columns for every cell.
+"""
+from functools import lru_cache
+
+from markupsafe import escape
+
+# Maximum number of escaped names kept for reuse between renders
+NAMECACHESIZE = 65536
+
+TABLESTART = '<table align="center" class="playerList">\n'
+TABLEEND = '\n</table>'
+
+
+@lru_cache(maxsize=NAMECACHESIZE)
+def nameCell(name):
+    """Get the escaped table cell for a player's name."""
+    return '<td>%s</td>' % escape(name)
+
+
+@lru_cache(maxsize=1024)
+def ratingCell(rating):
+    """Get the escaped table cell for a skill rating."""
+    return '<td>%s</td>' % escape('' if rating is None else rating)
+
+
+@lru_cache(maxsize=16)
+def tableHead(columns):
+    """Get the table head for a tuple of column names."""
+    return '<thead><tr>%s</tr></thead>\n' % ''.join(
+        ['<th>%s</th>' % escape(column) for column in columns])
+
+
+def row(player, rowClass):
+    """Get the table row for a player."""
+    return '<tr class="%s">%s%s</tr>' % (
+        rowClass, nameCell(player.name),
+        ''.join([ratingCell(r) for r in player.ratings]))
+
+
+def iterTable(players, columns, emptyMsg, averagePlayer=None):
+    """
+    Yield the HTML of a table of players in fragments.
+
+    The columns are the names shown at the head of the table, starting with
+    the name column and followed by the skills in the order of the players'
+    ratings. If an averagePlayer is given, it is shown as a row of its own
+    below the players. A table with no rows is shown as the empty message.
+    """
+    rows = iter(players)
+    first = next(rows, None)
+    if first is None and averagePlayer is None:
+        yield '<p>%s</p>' % escape(emptyMsg)
+        return
+
+    yield TABLESTART
+    yield tableHead(tuple(columns))
+    yield '<tbody>\n'
+    if first is not None:
+        yield row(first, "playerRow")
+        for player in rows:
+            yield '\n'
+            yield row(player, "playerRow")
+        if averagePlayer is not None:
+            yield '\n'
+    if averagePlayer is not None:
+        yield row(averagePlayer, "avgRow")
+    yield '\n</tbody>'
+    yield TABLEEND
+
+
+def renderTable(players, columns, emptyMsg, averagePlayer=None):
+    """Get the HTML of a table of players as a single string."""
+    return ''.join(iterTable(players, columns, emptyMsg, averagePlayer))
@@ -0,0 +1,331 @@
+"""REST roster client for Hockey Players.
+
+Fetches a roster from an HTTP endpoint rather than reading it from a file.
+The endpoint serves the roster in pages in the players.json format, taking
+the page number (starting at 1) and page size as the page and pageSize
+query parameters, and giving the total number of pages in the
+X-Total-Pages header of each response.
+
+Each page is decoded into Players as it is read, using the same streaming
+decoder as PlayerList.fromJSONStream. The first page is fetched on its own
+to find the number of pages, and the rest are fetched concurrently, over a
+pool of keep-alive connections. The ETag of every page is kept, so that a
+roster is revalidated with If-None-Match rather than downloaded again, and
+pages the server reports as unchanged are reused.
+"""
+import http.client
+import io
+import queue
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from cache import rosterFingerprint
+from players import Player, PlayerList, iterPlayerData
+
+# Default number of players asked for in each page
+PAGESIZE = 1000
+
+# Default number of pages fetched at once, and of connections kept open
+PAGEWORKERS = 4
+
+# Default time in seconds to wait on the server
+TIMEOUT = 10.0
+
+# Default time in seconds a fetched roster is used before revalidating it
+MAXAGE = 5.0
+
+# Header giving the total number of pages of the roster
+PAGESHEADER = "X-Total-Pages"
+
+# Errors from reusing a connection the server has since closed
+STALEERRORS = (http.client.RemoteDisconnected, ConnectionResetError,
+               BrokenPipeError)
+
+
+class RosterFetchError(IOError):
+    """Raised when the roster endpoint gives an unexpected response."""
+
+
+class ConnectionPool:
+    """
+    Pool of keep-alive HTTP connections to a single host.
+
+    Idle connections are reused, most recently used first. At most maxSize
+    idle connections are kept, and any more are closed when released.
+    """
+
+    def __init__(self, scheme, host, port=None, maxSize=PAGEWORKERS,
+                 timeout=TIMEOUT):
+        """Create an empty pool of connections to a host."""
+        if scheme == "https":
+            self._connectionClass = http.client.HTTPSConnection
+        elif scheme == "http":
+            self._connectionClass = http.client.HTTPConnection
+        else:
+            raise ValueError("Unsupported URL scheme %r" % scheme)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.created = 0
+        self._idle = queue.LifoQueue(maxsize=maxSize)
+
+    def acquire(self):
+        """Get an idle connection, or open a new one if none are idle."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            self.created += 1
+            return self._connectionClass(self.host, self.port,
+                                         timeout=self.timeout)
+
+    def release(self, connection):
+        """Return a connection whose last response was read in full."""
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        """Close every idle connection."""
+        while(True):
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RosterClient:
+    """
+    Roster fetched from a paginated REST endpoint.
+
+    Has the same interface as cache.RosterCache, so it can be used by the
+    application in place of a roster file. A fetched roster is used for
+    maxAge seconds, and then revalidated with the server the next time it
+    is asked for. The roster, and its fingerprint, are only rebuilt when a
+    page has changed.
+
+    Only one thread revalidates the roster at a time, while the others keep
+    getting the roster already fetched. If revalidating fails, the roster
+    already fetched keeps being used until it is next revalidated, so a
+    slow or failing server does not hold up or fail every request.
+    """
+
+    def __init__(self, url, pageSize=PAGESIZE, workers=PAGEWORKERS,
+                 timeout=TIMEOUT, maxAge=MAXAGE):
+        """Create a client for the roster at a URL."""
+        parts = urlsplit(url)
+        self.url = url
+        self.path = parts.path or "/"
+        self.pageSize = pageSize
+        self.workers = workers
+        self.maxAge = maxAge
+        self.pool = ConnectionPool(parts.scheme, parts.hostname, parts.port,
+                                   workers, timeout)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.errors = 0
+        self._pages = {}
+        self._roster = None
+        self._fingerprint = None
+        self._checked = None
+        self._lock = threading.Lock()
+        self._refreshLock = threading.Lock()
+
+    def _request(self, page, etag=None):
+        """
+        Fetch a page of the roster over a pooled connection.
+
+        Returns the ETag and number of pages given by the server, and the
+        decoded Players of the page, which are None if the server reports
+        the page is unchanged since the given ETag.
+        """
+        query = urlencode({"page": page, "pageSize": self.pageSize})
+        headers = {"Accept": "application/json"}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+
+        # A kept connection may have been closed by the server since it was
+        # last used, in which case the request is sent once more on a new
+        # connection.
+        for attempt in range(2):
+            connection = self.pool.acquire()
+            try:
+                connection.request("GET", "%s?%s" % (self.path, query),
+                                   headers=headers)
+                response = connection.getresponse()
+                result = self._readResponse(page, response)
+            except STALEERRORS:
+                connection.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.pool.release(connection)
+            return result
+
+    def _readResponse(self, page, response):
+        """Read a response for a page in full, decoding its players."""
+        etag = response.getheader("ETag")
+        numPages = response.getheader(PAGESHEADER)
+        numPages = int(numPages) if numPages is not None else None
+        if response.status == 304:
+            response.read()
+            return etag, numPages, None
+        if response.status != 200:
+            response.read()
+            raise RosterFetchError("Page %d of %s gave HTTP status %d"
+                                   % (page, self.url, response.status))
+
+        text = io.TextIOWrapper(response, encoding="utf-8")
+        players = [Player.fromJSON(data) for data in iterPlayerData(text)]
+        # The rest of the body is read so the connection can be reused
+        text.read()
+        text.detach()
+        return etag, numPages, players
+
+    def _fetchPage(self, page, fetched):
+        """
+        Fetch a page, revalidating any copy of it already fetched.
+
+        The page is added to the fetched dict, rather than kept straight
+        away, so it only replaces the kept page once every page of the
+        roster has been fetched. Returns the number of pages, the page's
+        Players, and whether the page changed.
+        """
+        kept = self._pages.get(page)
+        etag, numPages, players = self._request(page, kept and kept[0])
+        if players is None and kept is not None:
+            numPages = numPages or kept[1]
+            fetched[page] = (etag or kept[0], numPages, kept[2])
+            return numPages, kept[2], False
+        if players is None:
+            raise RosterFetchError("Page %d of %s was unchanged, but was "
+                                   "never fetched" % (page, self.url))
+        fetched[page] = (etag, numPages or 1, players)
+        return numPages or 1, players, True
+
+    def fetchPlayers(self):
+        """
+        Fetch every page of the roster.
+
+        Returns the Players of the roster, in order, and whether any page
+        changed since the roster was last fetched. The fetched pages are
+        only kept if every page is fetched, so a failed fetch leaves the
+        changed pages to be downloaded again next time.
+        """
+        fetched = {}
+        numPages, firstPlayers, changed = self._fetchPage(1, fetched)
+        # The kept players of the first page are not changed
+        players = list(firstPlayers)
+        pages = range(2, numPages + 1)
+        if numPages > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for _, pagePlayers, pageChanged in executor.map(
+                        self._fetchPage, pages, [fetched] * len(pages)):
+                    players.extend(pagePlayers)
+                    changed = changed or pageChanged
+
+        # Pages beyond the end of a roster that has shrunk are forgotten
+        changed = changed or any(page > numPages for page in self._pages)
+        self._pages = fetched
+        return players, changed
+
+    def get(self):
+        """Get a copy of the roster, fetching it if it may have changed."""
+        return self.load()[0]
+
+    def load(self):
+        """
+        Get a copy of the roster along with its fingerprint.
+
+        The roster is revalidated with the server if it was fetched more
+        than maxAge seconds ago, and rebuilt only if it changed. While
+        another thread is revalidating it, the roster already fetched is
+        used, and only a thread with no roster to use waits for it.
+        """
+        if self._expired():
+            if self._roster is None:
+                with self._refreshLock:
+                    if self._expired():
+                        self._refresh()
+            elif self._refreshLock.acquire(blocking=False):
+                try:
+                    if self._expired():
+                        self._refresh()
+                finally:
+                    self._refreshLock.release()
+            else:
+                self._countHit()
+        else:
+            self._countHit()
+
+        with self._lock:
+            roster, fingerprint = self._roster, self._fingerprint
+        return roster.copy(), fingerprint
+
+    def _expired(self):
+        """Check whether the roster is due to be revalidated."""
+        with self._lock:
+            return (self._checked is None or
+                    time.monotonic() - self._checked >= self.maxAge)
+
+    def _countHit(self):
+        """Count a roster used without revalidating it."""
+        with self._lock:
+            self.hits += 1
+
+    def _refresh(self):
+        """
+        Revalidate the roster with the server, rebuilding it if it changed.
+
+        Called with the refresh lock held. If the server cannot be reached
+        or gives a bad response, the roster already fetched is kept, and
+        the error is only raised if there is no roster yet.
+        """
+        try:
+            players, changed = self.fetchPlayers()
+        except (OSError, ValueError, http.client.HTTPException):
+            with self._lock:
+                self.errors += 1
+                if self._roster is None:
+                    raise
+                self._checked = time.monotonic()
+            return
+
+        if changed or self._roster is None:
+            roster = PlayerList(players)
+            fingerprint = rosterFingerprint(players)
+        with self._lock:
+            self._checked = time.monotonic()
+            if changed or self._roster is None:
+                self._roster = roster
+                self._fingerprint = fingerprint
+                self.misses += 1
+            else:
+                self.revalidations += 1
+
+    def clear(self):
+        """Forget the fetched roster, so it is downloaded on the next get."""
+        with self._refreshLock, self._lock:
+            self._pages = {}
+            self._roster = None
+            self._fingerprint = None
+            self._checked = None
+
+    def stats(self):
+        """Get the number of cache hits, misses, revalidations and errors."""
+        return {"hits": self.hits, "misses": self.misses,
+                "revalidations": self.revalidations, "errors": self.errors}
+
+    def close(self):
+        """Close the pooled connections."""
+        self.pool.close()
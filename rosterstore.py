@@ -0,0 +1,188 @@
+"""SQLite roster store for Hockey Players.
+
+A roster store keeps the rosters of several seasons in a single SQLite
+database file, in a players table with an index on each skill rating. Each
+player also keeps their position in the roster they were imported from, so
+players are loaded in the same order, and players with equal ratings are
+ordered the same way as PlayerList.sortOrder would order them.
+
+Since the database returns the players already ordered by each skill, a
+PlayerList loaded from the store does not need to sort its players before
+balancing squads or showing the waiting list.
+
+Usage:
+    python3 rosterstore.py players.json roster.db [season]
+"""
+import sqlite3
+import sys
+import threading
+
+from players import JSONFILE, Player, PlayerList, Skill, iterPlayersJSON
+
+# Default database file and season
+STOREFILE = "roster.db"
+DEFAULTSEASON = "default"
+
+# Column holding the rating of each skill
+SKILLCOLUMNS = {skill: skill.name.lower() for skill in Skill}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    season TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    skating INTEGER NOT NULL,
+    shooting INTEGER NOT NULL,
+    checking INTEGER NOT NULL,
+    PRIMARY KEY (season, id),
+    UNIQUE (season, position)
+);
+CREATE INDEX IF NOT EXISTS players_name ON players (season, name, position);
+CREATE INDEX IF NOT EXISTS players_skating
+    ON players (season, skating, position);
+CREATE INDEX IF NOT EXISTS players_shooting
+    ON players (season, shooting, position);
+CREATE INDEX IF NOT EXISTS players_checking
+    ON players (season, checking, position);
+"""
+
+
+class RosterStore:
+    """
+    Rosters of players for several seasons, stored in a SQLite database.
+
+    Each thread uses its own connection to the database, which is opened
+    the first time the thread uses the store.
+    """
+
+    def __init__(self, fn=STOREFILE):
+        """Open a roster store, creating its database if needed."""
+        self.fn = fn
+        self._local = threading.local()
+        with self._connection() as db:
+            db.executescript(SCHEMA)
+
+    def _connection(self):
+        """Get the current thread's connection to the database."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.fn)
+        return db
+
+    def close(self):
+        """Close the current thread's connection to the database."""
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    def importPlayers(self, players, season=DEFAULTSEASON):
+        """
+        Replace the roster of a season with a list of Players.
+
+        The players are stored in order, in a single transaction, so the
+        season's roster is never seen half imported. Returns the number of
+        players stored.
+        """
+        columns = ", ".join(["season", "position", "id", "name"] +
+                            list(SKILLCOLUMNS.values()))
+        placeholders = ", ".join(["?"] * (4 + len(SKILLCOLUMNS)))
+        rows = ((season, position, str(p._id), p.name) + tuple(p.ratings)
+                for position, p in enumerate(players))
+        with self._connection() as db:
+            db.execute("DELETE FROM players WHERE season = ?", (season,))
+            cursor = db.executemany("INSERT INTO players (%s) VALUES (%s)"
+                                    % (columns, placeholders), rows)
+        return cursor.rowcount
+
+    def importJSON(self, fn=JSONFILE, season=DEFAULTSEASON):
+        """
+        Replace the roster of a season with the players in a JSON file.
+
+        The file is read incrementally, so large rosters can be imported.
+        Returns the number of players stored.
+        """
+        return self.importPlayers(iterPlayersJSON(fn), season)
+
+    def deleteSeason(self, season):
+        """Remove the roster of a season."""
+        with self._connection() as db:
+            db.execute("DELETE FROM players WHERE season = ?", (season,))
+
+    def seasons(self):
+        """Get the seasons with a roster, in order."""
+        rows = self._connection().execute(
+            "SELECT DISTINCT season FROM players ORDER BY season")
+        return [season for season, in rows]
+
+    def players(self, season=DEFAULTSEASON):
+        """Get the Players of a season, in the order they were imported."""
+        rows = self._connection().execute(
+            "SELECT id, name, %s FROM players WHERE season = ? "
+            "ORDER BY position" % ", ".join(SKILLCOLUMNS.values()), (season,))
+        return [Player(row[0], row[1], row[2:]) for row in rows]
+
+    def sortOrder(self, sortSkill=None, season=DEFAULTSEASON):
+        """
+        Get the positions of a season's players in ascending order.
+
+        The players are ordered by a skill if one is given, or by name
+        otherwise, using the index on that column. Players that tie are in
+        the order they were imported.
+        """
+        column = SKILLCOLUMNS[sortSkill] if sortSkill else "name"
+        rows = self._connection().execute(
+            "SELECT position FROM players WHERE season = ? "
+            "ORDER BY %s, position" % column, (season,))
+        return [position for position, in rows]
+
+    def sortedPlayers(self, sortSkill=None, season=DEFAULTSEASON):
+        """
+        Get the Players of a season sorted in ascending order.
+
+        Same as PlayerList.sortedPlayers, with the sorting done by the
+        database.
+        """
+        column = SKILLCOLUMNS[sortSkill] if sortSkill else "name"
+        rows = self._connection().execute(
+            "SELECT id, name, %s FROM players WHERE season = ? "
+            "ORDER BY %s, position"
+            % (", ".join(SKILLCOLUMNS.values()), column), (season,))
+        return [Player(row[0], row[1], row[2:]) for row in rows]
+
+    def loadPlayerList(self, season=DEFAULTSEASON):
+        """
+        Create a PlayerList of a season's players.
+
+        The order of the players by each skill and by name is taken from
+        the database, and kept by the PlayerList so it never sorts them.
+        """
+        playerList = PlayerList(self.players(season))
+        for sortSkill in list(Skill) + [None]:
+            playerList.keepSortOrder(self.sortOrder(sortSkill, season),
+                                     sortSkill)
+        return playerList
+
+
+def loadPlayerList(fn=STOREFILE, season=DEFAULTSEASON):
+    """
+    Create a PlayerList of a season's players from a roster store file.
+
+    Can be used as the loader of a cache.RosterCache, which then reloads
+    the roster whenever the database file changes.
+    """
+    store = RosterStore(fn)
+    try:
+        return store.loadPlayerList(season)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        sys.exit("Usage: python3 rosterstore.py ROSTER.json ROSTER.db "
+                 "[SEASON]")
+    store = RosterStore(sys.argv[2])
+    count = store.importJSON(sys.argv[1], *sys.argv[3:])
+    print("Imported %d players" % count)
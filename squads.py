@@ -1,16 +1,41 @@
 """Classes and Functions for Hockey Squads."""
-from players import Player, PlayerList, PlayerTable, Skill
+from balancing import (SKILLS, differencingAssign, getRatings,
+                       getSortOrders, greedyAssign, refineAssign,
+                       repairAssign)
+from multistart import multiStartAssign
+from partition import OPTIMALTIMELIMIT, optimalAssign
+from players import COLUMNS, Player, PlayerList, PlayerTable, Skill
+from render import iterTable
+from timing import span
 
 
 AVERAGEID = '__AVERAGE__'
 AVERAGENAME = 'Average'
 
+# Available methods for balancing squads
+GREEDY = 'greedy'
+MULTISTART = 'multistart'
+OPTIMAL = 'optimal'
+DIFFERENCING = 'differencing'
+METHODS = [GREEDY, MULTISTART, OPTIMAL, DIFFERENCING]
+
+# Default number of starts when using the multi-start method
+MULTISTARTS = 8
+
+# Default most swaps made by rebalanceSquads to restore the balance of squads
+REBALANCESWAPS = 4
+
 
 class Squad(PlayerList):
     """Representation of a Squad.
 
     A squad is a group of players, with an identifying number.
 
+    Running totals of each skill are kept as players are added and removed,
+    so the totals and averages do not need to be summed on every access.
+    Players should be added and removed through addPlayer and removePlayer
+    rather than by changing the list of players directly.
+
     When printing out to HTML, the last entry in the squad contains
     the average values for each of the skills across the team.
     """
@@ -19,40 +44,71 @@ class Squad(PlayerList):
         """Create a Squad from a list of players."""
         self.squadNum = squadNum
         self.players = players
-        self.updateTable()
+        self.array = None
+
+    @property
+    def players(self):
+        """Get the list of players on the squad."""
+        return self._players
+
+    @players.setter
+    def players(self, players):
+        """
+        Set the list of players on the squad.
+
+        The running totals of each skill are recalculated from the new list,
+        so that they stay consistent when the players are reassigned.
+        """
+        self._players = players
+        self._orders = {}
+        self._positions = None
+        self._removed = None
+        self._totals = {skill: sum([p.rating(skill) for p in players])
+                        for skill in Skill}
+
+    def addPlayer(self, player):
+        """Add a player to the squad, updating the skill totals."""
+        self._players.append(player)
+        self.invalidate()
+        for skill in Skill:
+            self._totals[skill] += player.rating(skill)
+
+    def removePlayer(self, player):
+        """Remove a player from the squad, updating the skill totals."""
+        self._players.remove(player)
+        self.invalidate()
+        for skill in Skill:
+            self._totals[skill] -= player.rating(skill)
 
     @property
     def skating(self):
         """Get the total skating rating for the squad."""
-        return sum([p.skating for p in self.players])
+        return self._totals[Skill.Skating]
 
     @property
     def shooting(self):
         """Get the total shooting rating for the squad."""
-        return sum([p.shooting for p in self.players])
+        return self._totals[Skill.Shooting]
 
     @property
     def checking(self):
         """Get the total checking rating for the squad."""
-        return sum([p.checking for p in self.players])
+        return self._totals[Skill.Checking]
 
     @property
     def averageSkating(self):
         """Get the average Skating rating for the squad."""
-        pLen = len(self.players)
-        return sum([p.skating for p in self.players])//max([pLen, 1])
+        return self.skating//max([len(self._players), 1])
 
     @property
     def averageShooting(self):
         """Get the average Shooting rating for the squad."""
-        pLen = len(self.players)
-        return sum([p.shooting for p in self.players])//max([pLen, 1])
+        return self.shooting//max([len(self._players), 1])
 
     @property
     def averageChecking(self):
         """Get the average Checking rating for the squad."""
-        pLen = len(self.players)
-        return sum([p.checking for p in self.players])//max([pLen, 1])
+        return self.checking//max([len(self._players), 1])
 
     @property
     def averagePlayer(self):
@@ -62,9 +118,10 @@ class Squad(PlayerList):
                      Skill.Checking: self.averageChecking}
         return Player(AVERAGEID, AVERAGENAME, avgSkills)
 
-    def updateTable(self):
+    @property
+    def table(self):
         """
-        Update the table for the squad.
+        Get a Flask-Table of the squad.
 
         The average of the entire team is added as a separate
         table body below the body of the generated table.
@@ -74,15 +131,26 @@ class Squad(PlayerList):
         tableHTMLAttrs = {"align": "center"}
 
         tableList = self.players + [self.averagePlayer]
-        self.table = SquadTable(tableList,
-                                classes=tableClasses,
-                                no_items=emptyMsg,
-                                html_attrs=tableHTMLAttrs)
+        return SquadTable(tableList,
+                          classes=tableClasses,
+                          no_items=emptyMsg,
+                          html_attrs=tableHTMLAttrs)
+
+    def iterHTML(self):
+        """Yield the squad as a table in HTML format, in fragments."""
+        emptyMsg = "No Players on Squad %d" % self.squadNum
+        return iterTable(self.players, COLUMNS, emptyMsg,
+                         averagePlayer=self.averagePlayer)
 
     def toHTML(self):
-        """Output the squad as a table in HTML format."""
-        self.updateTable()
-        return self.table.__html__()
+        """
+        Output the squad as a table in HTML format.
+
+        The average of the entire team is added as a separate
+        row below the players in the table.
+        """
+        with span("toHTML"):
+            return ''.join(self.iterHTML())
 
 
 class SquadTable(PlayerTable):
@@ -101,7 +169,9 @@ class SquadTable(PlayerTable):
             return {"class": "playerRow"}
 
 
-def getBalancedSquads(numSquads, playerList):
+def getBalancedSquads(numSquads, playerList, refine=False, maxSwaps=None,
+                      timeLimit=None, method=GREEDY, starts=MULTISTARTS,
+                      workers=None, deadline=None):
     """
     Dynamically generate closely-balanced squads of players from a given list.
 
@@ -112,6 +182,12 @@ def getBalancedSquads(numSquads, playerList):
     a squad has the maximum number of players needed to get the desired number
     of squads from the player list, then no more players can be added.
 
+    The assignment itself is done by assignSquads using balancing.greedyAssign,
+    which keeps a heap of squad totals per skill so each pick takes logarithmic
+    time. The sort orders kept by the player list are used, so players are
+    only sorted again once the list has changed, and the waiting list left
+    behind keeps the orders of its remaining players.
+
     Errors if the number of desired squads is greater than the number of
     available players, or if number of desired squads is less than one.
 
@@ -123,11 +199,88 @@ def getBalancedSquads(numSquads, playerList):
                             of desired squads, each player is placed onto their
                             own squad, bypassing the need for calculations
 
-    FUTURE OPTIMIZATION: Once a roughly balanced team is generated, go through
-    and attempt to balance further by swapping players between teams
+    Methods:
+        greedy:     The algorithm described above.
+
+        multistart: The greedy algorithm is run from a number of randomized
+                    starts in parallel worker processes, and the squads with
+                    the lowest spread of skill totals are kept. The number
+                    of starts and workers can be set with starts and
+                    workers, and deadline limits the time (in seconds) spent
+                    waiting for them, using multistart.multiStartAssign.
+
+        optimal:    The squads with the lowest possible spread of skill
+                    totals are searched for with partition.optimalAssign,
+                    which may also leave different players on the waiting
+                    list. The search starts from the greedy squads, and
+                    deadline limits the time (in seconds) spent searching,
+                    defaulting to OPTIMALTIMELIMIT, after which the best
+                    squads found so far are used.
+
+        differencing:   The largest differencing (Karmarkar-Karp) method,
+                        which repeatedly merges the partial squads with the
+                        largest spreads of skill totals so that their
+                        differences cancel out, using
+                        balancing.differencingAssign. It leaves the players
+                        with the lowest total ratings on the waiting list.
+
+    Refinement:
+        When refine is set, the squads are balanced further after they are
+        generated by swapping players between squads, using
+        balancing.refineAssign. The number of swaps and the time spent
+        swapping can be limited with maxSwaps and timeLimit (in seconds).
     """
+    ratings, orders = getRatingsAndOrders(playerList)
+    assignment = assignSquads(numSquads, ratings, orders, refine, maxSwaps,
+                              timeLimit, method, starts, workers, deadline)
+
     squads = []
-    numPlayers = len(playerList.players)
+    assigned = set()
+    for squadIndex, members in assignment:
+        squadPlayers = [playerList.players[i] for i in members]
+        squads.append(Squad(squadIndex+1, squadPlayers))
+        assigned.update(members)
+
+    playerList.keepPlayers([i for i in range(len(ratings))
+                            if i not in assigned])
+    return squads
+
+
+def getRatingsAndOrders(playerList):
+    """
+    Get the ratings of a list of players, and their sort orders.
+
+    The sort orders are the ones kept by the player list, which uses the
+    vectorized sorts of its PlayerArray if it carries one. The ratings are
+    taken from the PlayerArray too in that case.
+    """
+    if playerList.array is not None:
+        # The pick loop runs in Python, where lists are faster to index
+        # than arrays, so the vectorized sorts are converted only once.
+        ratings = playerList.array.ratings.tolist()
+    else:
+        ratings = getRatings(playerList.players)
+    with span("sort"):
+        orders = [playerList.sortOrder(skill) for skill in SKILLS]
+    return ratings, orders
+
+
+def assignSquads(numSquads, ratings, orders=None, refine=False,
+                 maxSwaps=None, timeLimit=None, method=GREEDY,
+                 starts=MULTISTARTS, workers=None, deadline=None):
+    """
+    Assign players to balanced squads by their index.
+
+    Takes the same options as getBalancedSquads, but works on the ratings
+    and sort orders of the players rather than a PlayerList, so that the
+    same ratings and orders can be reused to assign different numbers of
+    squads. The sort orders are calculated if they are not given and the
+    method needs them.
+
+    Returns a list of (squad index, player indices) pairs, in the order
+    that getBalancedSquads returns the squads.
+    """
+    numPlayers = len(ratings)
     if(numSquads > numPlayers):
         raise ValueError(("Number of Squads cannot be greater then number of "
                           "players. %d squads attempted, %d players available."
@@ -135,38 +288,195 @@ def getBalancedSquads(numSquads, playerList):
     elif(numSquads < 1):
         raise ValueError(("Number of Squads must be greater than one,"
                           "%d given" % numSquads))
+    elif(method not in METHODS):
+        raise ValueError("Unknown balancing method %r, expected one of %s"
+                         % (method, ', '.join(METHODS)))
     elif(numSquads == 1):
-        newSquad = Squad(1, playerList.players)
-        squads.append(newSquad)
-        playerList.players = []
+        return [(0, list(range(numPlayers)))]
     elif(numSquads == numPlayers):
-        for i in range(numPlayers):
-            newSquad = Squad(i+1, [playerList.players.pop()])
-            squads.append(newSquad)
+        return [(i, [numPlayers-i-1]) for i in range(numPlayers)]
+
+    squadSize = numPlayers//numSquads
+    if orders is None and method != DIFFERENCING:
+        with span("sort"):
+            orders = getSortOrders(ratings)
+
+    with span("pick"):
+        if(method == MULTISTART):
+            assignment = multiStartAssign(numSquads, squadSize, ratings,
+                                          orders, starts, workers, deadline)
+        elif(method == OPTIMAL):
+            if deadline is None:
+                deadline = OPTIMALTIMELIMIT
+            assignment = optimalAssign(numSquads, squadSize, ratings, orders,
+                                       deadline)
+        elif(method == DIFFERENCING):
+            assignment = differencingAssign(numSquads, squadSize, ratings)
+        else:
+            assignment = greedyAssign(numSquads, squadSize, ratings, orders)
+    if refine:
+        with span("refine"):
+            refineAssign(assignment, ratings, maxSwaps, timeLimit)
+    return assignment
+
+
+def rebalanceSquads(squads, waitingList, added=(), removed=(),
+                    maxSwaps=REBALANCESWAPS):
+    """
+    Repair existing squads after players join or leave them.
+
+    The removed players are taken off their squads or the waiting list,
+    and the added players join the waiting list. Removed players that are
+    on neither are ignored. To keep squads stable, squad sizes may then
+    differ by one: each squad holds the number of players a full rebuild
+    would give it, or one more. Only squads outside that range change:
+
+        Squads with more players move their extra players to the waiting
+        list.
+
+        Squads with fewer players are filled from the waiting list or, once
+        it is empty, from the squads holding one player more.
+
+        Every other squad is left as it is.
+
+    Each player moved is the one that brings the squad's running skill
+    totals closest to the totals expected for its new number of players,
+    based on the average ratings of the players on the squads.
+
+    If the spread of the squads' skill totals is then wider than before,
+    balance is restored by swapping players between a squad that lost or
+    gained players and any other squad, with balancing.repairAssign. At
+    most maxSwaps swaps are made, each the one that most improves the
+    balance, stopping once the spread is no wider than it was.
+
+    The squads and the waiting list PlayerList are changed in place. When
+    players join the waiting list or move on or off it, any PlayerArray it
+    carries is dropped.
+
+    Errors if there are no squads, or fewer players are left than there
+    are squads.
+
+    Returns a list of the moves made as (player, from, to) tuples of squad
+    numbers, where None stands for the waiting list.
+    """
+    if not squads:
+        raise ValueError("Number of Squads must be at least one, none given")
+    targetSpread = _squadSpread(squads)
+    affected = set()
+
+    removedIds = set([p._id for p in removed])
+    for index, squad in enumerate(squads):
+        for player in [p for p in squad.players if p._id in removedIds]:
+            squad.removePlayer(player)
+            affected.add(index)
+    for player in removed:
+        if player in waitingList:
+            waitingList.removePlayer(player)
+    waiting = list(waitingList.players) + list(added)
+
+    numSquads = len(squads)
+    onSquads = sum([len(squad.players) for squad in squads])
+    numPlayers = onSquads + len(waiting)
+    if(numSquads > numPlayers):
+        raise ValueError(("Number of Squads cannot be greater then number of "
+                          "players. %d squads attempted, %d players available."
+                          % (numSquads, numPlayers)))
+    squadSize = numPlayers//numSquads
+
+    if onSquads:
+        average = [sum([squad._totals[skill] for squad in squads])/onSquads
+                   for skill in SKILLS]
     else:
-        squadSize = numPlayers//numSquads
-        workingSquads = [Squad(i+1, []) for i in range(numSquads)]
-
-        sortedBySkating = playerList.sortedPlayers(Skill.Skating)
-        sortedByShooting = playerList.sortedPlayers(Skill.Shooting)
-        sortedByChecking = playerList.sortedPlayers(Skill.Checking)
-        sortedPlayers = {Skill.Skating: sortedBySkating,
-                         Skill.Shooting: sortedByShooting,
-                         Skill.Checking: sortedByChecking}
-
-        while(workingSquads):
-            curIndex, curSkill, _ = getSquadWithLowestSkill(workingSquads)
-            pick = sortedPlayers[curSkill].pop()
-            for sortedList in sortedPlayers.values():
-                if pick in sortedList:
-                    sortedList.remove(pick)
-
-            playerList.players.remove(pick)
-            workingSquads[curIndex].players.append(pick)
-            if(len(workingSquads[curIndex].players) == squadSize):
-                squads.append(workingSquads.pop(curIndex))
+        average = [sum([p.rating(skill) for p in waiting])/len(waiting)
+                   for skill in SKILLS]
+
+    def bestFit(squad, candidates, sign):
+        """Find the player whose move leaves the squad closest to average."""
+        size = len(squad.players) + sign
+        totals = [squad._totals[skill] for skill in SKILLS]
+        return min(candidates, key=lambda p: sum(
+            [(t + sign*r - a*size) ** 2
+             for t, r, a in zip(totals, p.ratings, average)]))
+
+    moves = []
+    for squad in squads:
+        while(len(squad.players) > squadSize + 1):
+            player = bestFit(squad, squad.players, -1)
+            squad.removePlayer(player)
+            waiting.append(player)
+            moves.append((player, squad.squadNum, None))
+
+    for squad in squads:
+        while(len(squad.players) < squadSize):
+            if waiting:
+                player = bestFit(squad, waiting, 1)
+                waiting.remove(player)
+                source = None
+            else:
+                # With nobody waiting, some squads hold one player more
+                donors = [donor for donor in squads
+                          if len(donor.players) > squadSize]
+                player = bestFit(squad, [p for donor in donors
+                                         for p in donor.players], 1)
+                donor = next(d for d in donors if player in d.players)
+                donor.removePlayer(player)
+                source = donor.squadNum
+            squad.addPlayer(player)
+            moves.append((player, source, squad.squadNum))
+
+    positions = {squad.squadNum: index for index, squad in enumerate(squads)}
+    for _, source, target in moves:
+        affected.update([positions.get(source), positions.get(target)])
+    affected.discard(None)
+    if affected and maxSwaps and _squadSpread(squads) > targetSpread:
+        moves.extend(_repairBalance(squads, affected, targetSpread,
+                                    maxSwaps))
+
+    if added or moves:
+        waitingList.players = waiting
+    return moves
+
+
+def _squadSpread(squads):
+    """Get the spread of the skill totals of a list of squads."""
+    return sum([max([squad._totals[skill] for squad in squads]) -
+                min([squad._totals[skill] for squad in squads])
+                for skill in SKILLS])
+
+
+def _repairBalance(squads, affected, targetSpread, maxSwaps):
+    """
+    Swap players between squads to restore their balance.
 
-    return squads
+    Swaps are found by balancing.repairAssign, involving the squads at the
+    affected positions, and are made on the squads. Returns the resulting
+    moves as (player, from, to) tuples of squad numbers.
+    """
+    players = []
+    assigned = []
+    for index, squad in enumerate(squads):
+        start = len(players)
+        players.extend(squad.players)
+        assigned.append((index, list(range(start, len(players)))))
+    before = [set(members) for _, members in assigned]
+    if not repairAssign(assigned, getRatings(players), affected, targetSpread,
+                        maxSwaps):
+        return []
+
+    origin = {i: index for index, members in enumerate(before)
+              for i in members}
+    arriving = [(index, [i for i in members if i not in before[index]])
+                for index, members in assigned]
+    for index, joining in arriving:
+        for i in joining:
+            squads[origin[i]].removePlayer(players[i])
+    moves = []
+    for index, joining in arriving:
+        for i in joining:
+            squads[index].addPlayer(players[i])
+            moves.append((players[i], squads[origin[i]].squadNum,
+                          squads[index].squadNum))
+    return moves
 
 
 def getSquadWithLowestSkill(squads):
@@ -0,0 +1,94 @@
+"""Balanced squads for a range of squad counts for Hockey Squads.
+
+Planners comparing different numbers of squads would otherwise balance
+the roster once for each count, sorting the players every time. A sweep
+computes the ratings and sort orders of the roster once, and reuses them
+for every count, running the counts in parallel worker processes.
+"""
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from balancing import getSpread
+from squads import Squad, assignSquads, getRatingsAndOrders
+
+# Ratings and sort orders of the roster, set once in each worker process
+_ratings = None
+_orders = None
+
+
+def _initWorker(ratings, orders):
+    """Store the ratings and sort orders of the roster in a worker."""
+    global _ratings, _orders
+    _ratings = ratings
+    _orders = orders
+
+
+def _runCount(numSquads, options):
+    """Assign squads for one count using the worker's roster."""
+    return _assignCount(numSquads, _ratings, _orders, options)
+
+
+def _assignCount(numSquads, ratings, orders, options):
+    """Assign squads for one count, and measure their spread."""
+    assignment = assignSquads(numSquads, ratings, orders, **options)
+    return assignment, getSpread(assignment, ratings)
+
+
+def sweepAssign(ratings, orders, counts, workers=None, **options):
+    """
+    Assign players to squads for each of several numbers of squads.
+
+    The options are passed on to squads.assignSquads. When more than one
+    worker is allowed, the counts are spread across a pool of processes,
+    each of which is sent the ratings and sort orders once when it starts.
+
+    Returns a dict from each number of squads to a pair of its assignment
+    and the spread of its skill totals.
+    """
+    counts = list(counts)
+    workers = min(workers or os.cpu_count() or 1, len(counts))
+    if workers <= 1:
+        return {k: _assignCount(k, ratings, orders, options) for k in counts}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                             initargs=(ratings, orders)) as executor:
+        results = executor.map(_runCount, counts, [options] * len(counts))
+        return dict(zip(counts, results))
+
+
+def sweepSquads(playerList, maxSquads, minSquads=2, workers=None,
+                **options):
+    """
+    Generate balanced squads for every number of squads in a range.
+
+    Squads are generated for each count from minSquads to maxSquads,
+    inclusive, taking the same options as squads.getBalancedSquads. The
+    player list is not changed.
+
+    Returns a list with a result for each count, in order. Each result is a
+    dict holding the number of squads, the list of Squads, the list of
+    Players left on the waiting list, and the spread of the squads' skill
+    totals, where a lower spread means better balanced squads.
+    """
+    numPlayers = len(playerList.players)
+    if not 1 <= minSquads <= maxSquads <= numPlayers:
+        raise ValueError("Cannot sweep from %d to %d squads with %d players"
+                         % (minSquads, maxSquads, numPlayers))
+
+    ratings, orders = getRatingsAndOrders(playerList)
+    counts = range(minSquads, maxSquads + 1)
+    assignments = sweepAssign(ratings, orders, counts, workers, **options)
+
+    results = []
+    for numSquads in counts:
+        assignment, spread = assignments[numSquads]
+        squads = [Squad(squadIndex+1,
+                        [playerList.players[i] for i in members])
+                  for squadIndex, members in assignment]
+        assigned = set(i for _, members in assignment for i in members)
+        waitingList = [p for i, p in enumerate(playerList.players)
+                       if i not in assigned]
+        results.append({"numSquads": numSquads, "squads": squads,
+                        "waitingList": waitingList, "spread": spread})
+    return results
@@ -0,0 +1,235 @@
+"""Unittests for the Flask application."""
+import app
+import os
+import threading
+import timing
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from cache import RosterCache, SquadCache
+from jobs import JobQueue
+from squads import getBalancedSquads
+
+EXAMPLEJSON = os.path.join(os.path.dirname(__file__), "..", "players.json")
+
+
+class TestApp(TestCase):
+    """Tests for the application routes."""
+
+    def setUp(self):
+        """Use fresh caches of the example roster for each test."""
+        patchers = [patch.object(app, "roster", RosterCache(EXAMPLEJSON)),
+                    patch.object(app, "squadCache", SquadCache())]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def testMain(self):
+        """Test that every player is shown on the waiting list."""
+        response = self.client.get("/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'class="playerRow"'), 40)
+
+    def testGenerateSquads(self):
+        """Test generating squads from the form."""
+        response = self.client.post("/squads", data={"numSquads": "3"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'class="avgRow"'), 3)
+        self.assertEqual(response.data.count(b'class="playerRow"'), 40)
+
+    def testGenerateSquadsCached(self):
+        """Test that repeated submissions reuse the generated squads."""
+        first = self.client.post("/squads", data={"numSquads": "3"})
+        second = self.client.post("/squads", data={"numSquads": "3"})
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(app.squadCache.hits, 1)
+        self.assertEqual(app.roster.misses, 1)
+
+    def testGenerateSquadsError(self):
+        """Test that an invalid number of squads shows an error."""
+        response = self.client.post("/squads", data={"numSquads": "41"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"errorText", response.data)
+        self.assertEqual(len(app.squadCache), 0)
+
+    def testServerTimingDisabled(self):
+        """Test that no Server-Timing header is sent by default."""
+        response = self.client.post("/squads", data={"numSquads": "3"})
+
+        self.assertNotIn("Server-Timing", response.headers)
+
+    def testServerTiming(self):
+        """Test that the timed phases of a request are sent when enabled."""
+        timing.enable()
+        self.addCleanup(timing.disable)
+        response = self.client.post("/squads", data={"numSquads": "3"})
+
+        phases = [entry.split(";")[0] for entry
+                  in response.headers["Server-Timing"].split(", ")]
+        self.assertEqual(phases, ["fromJSON", "sort", "pick", "toHTML"])
+
+    def testMetrics(self):
+        """Test that the metrics report the cache statistics."""
+        self.client.get("/")
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["roster"],
+                         {"hits": 0, "misses": 1})
+        self.assertIn("spans", response.get_json())
+
+
+class TestApiSquads(TestCase):
+    """Tests for the squad generation API."""
+
+    def setUp(self):
+        """Use a fresh cache of the example roster for each test."""
+        patcher = patch.object(app, "roster", RosterCache(EXAMPLEJSON))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def testApiSquads(self):
+        """Test generating squads for several numbers of squads."""
+        response = self.client.post("/api/squads",
+                                    json={"numSquads": [2, 3]})
+        data = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["numPlayers"], 40)
+        self.assertEqual([r["numSquads"] for r in data["results"]], [2, 3])
+        three = data["results"][1]
+        self.assertEqual(len(three["squads"]), 3)
+        self.assertEqual(len(three["waitingList"]), 1)
+        self.assertEqual(set(three["squads"][0]),
+                         {"squadNum", "players", "skating", "shooting",
+                          "checking"})
+
+    def testApiSquadsMatchesGetBalancedSquads(self):
+        """Test that the API returns the same squads as the web page."""
+        response = self.client.post("/api/squads", json={"numSquads": 3})
+        result = response.get_json()["results"][0]
+
+        expected = getBalancedSquads(3, RosterCache(EXAMPLEJSON).get())
+        self.assertEqual([s["players"] for s in result["squads"]],
+                         [[p._id for p in s.players] for s in expected])
+        self.assertEqual([s["skating"] for s in result["squads"]],
+                         [s.skating for s in expected])
+
+    def testApiSquadsInvalidCount(self):
+        """Test that an invalid number of squads gives an error result."""
+        response = self.client.post("/api/squads",
+                                    json={"numSquads": [2, 41]})
+        results = response.get_json()["results"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("squads", results[0])
+        self.assertIn("error", results[1])
+
+    def testApiSquadsBadRequest(self):
+        """Test that a request without numSquads is rejected."""
+        for body in [{}, {"numSquads": "three"}, [2]]:
+            response = self.client.post("/api/squads", json=body)
+            self.assertEqual(response.status_code, 400)
+
+    def testApiSquadsTooManyCounts(self):
+        """Test that a request for too many numbers of squads is rejected."""
+        counts = list(range(2, app.MAXSQUADCOUNTS + 3))
+        response = self.client.post("/api/squads", json={"numSquads": counts})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.get_json())
+
+
+class TestApiJobs(TestCase):
+    """Tests for the background job API."""
+
+    def setUp(self):
+        """Use a fresh roster cache and job queue for each test."""
+        queue = JobQueue(workers=1, maxPending=1)
+        patchers = [patch.object(app, "roster", RosterCache(EXAMPLEJSON)),
+                    patch.object(app, "jobQueue", queue)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(queue.shutdown)
+        self.client = app.app.test_client()
+
+    def testSubmitJob(self):
+        """Test that a job's result matches the squad generation API."""
+        response = self.client.post("/api/jobs", json={"numSquads": 3})
+        self.assertEqual(response.status_code, 202)
+        location = response.headers["Location"]
+
+        status = self.client.get(location + "?wait=5").get_json()
+        expected = self.client.post("/api/squads", json={"numSquads": 3})
+
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["result"],
+                         expected.get_json()["results"][0])
+
+    def testJobsDisabled(self):
+        """Test that every job route responds 503 once jobs are disabled."""
+        app.disableJobs()
+        jobId = "0" * 32
+
+        responses = [self.client.post("/api/jobs", json={"numSquads": 3}),
+                     self.client.get("/api/jobs/%s" % jobId),
+                     self.client.delete("/api/jobs/%s" % jobId)]
+
+        self.assertEqual([r.status_code for r in responses], [503] * 3)
+        self.assertIsNone(self.client.get("/metrics").get_json()["jobs"])
+
+    def testSubmitJobFailed(self):
+        """Test that an invalid number of squads fails the job."""
+        response = self.client.post("/api/jobs", json={"numSquads": 41})
+        jobId = response.get_json()["jobId"]
+        status = self.client.get("/api/jobs/%s?wait=5" % jobId).get_json()
+
+        self.assertEqual(status["status"], "failed")
+        self.assertIn("41 squads attempted", status["error"])
+
+    def testSubmitJobQueueFull(self):
+        """Test that jobs are refused while the queue is full."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        app.jobQueue.submit(release.wait, 5)
+
+        response = self.client.post("/api/jobs", json={"numSquads": 3})
+        self.assertEqual(response.status_code, 503)
+
+    def testSubmitJobBadRequest(self):
+        """Test that a request without an integer numSquads is rejected."""
+        for body in [{}, {"numSquads": [2, 3]}, {"numSquads": True}]:
+            response = self.client.post("/api/jobs", json=body)
+            self.assertEqual(response.status_code, 400)
+
+    def testCancelJob(self):
+        """Test cancelling a job waiting behind another."""
+        queue = JobQueue(workers=1, maxPending=2)
+        self.addCleanup(queue.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with patch.object(app, "jobQueue", queue):
+            queue.submit(release.wait, 5)
+            response = self.client.post("/api/jobs", json={"numSquads": 3})
+            jobId = response.get_json()["jobId"]
+
+            cancelled = self.client.delete("/api/jobs/%s" % jobId)
+            status = self.client.get("/api/jobs/%s" % jobId)
+
+        self.assertEqual(cancelled.get_json()["status"], "cancelled")
+        self.assertEqual(status.get_json()["status"], "cancelled")
+
+    def testUnknownJob(self):
+        """Test that an unknown job is not found."""
+        self.assertEqual(self.client.get("/api/jobs/missing").status_code,
+                         404)
+        self.assertEqual(self.client.delete("/api/jobs/missing").status_code,
+                         404)
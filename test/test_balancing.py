@@ -0,0 +1,367 @@
+"""Unittests for balancing module."""
+import balancing
+import random
+import squads
+import time
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from players import Player, PlayerList, Skill
+
+
+def makePlayers(numPlayers, seed=0, maxRating=100):
+    """Create a list of players with random skill ratings."""
+    rand = random.Random(seed)
+    players = []
+    for i in range(numPlayers):
+        skills = {skill: rand.randint(0, maxRating) for skill in Skill}
+        players.append(Player(str(i), "Player %d" % i, skills))
+    return players
+
+
+def referenceBalancedSquads(numSquads, playerList):
+    """
+    Balance squads with the original list-based greedy algorithm.
+
+    Used as a reference to check that the balancing engines produce the
+    same squads as the algorithm they replace.
+    """
+    squadList = []
+    squadSize = len(playerList.players)//numSquads
+    workingSquads = [squads.Squad(i+1, []) for i in range(numSquads)]
+    sortedPlayers = {skill: playerList.sortedPlayers(skill)
+                     for skill in Skill}
+
+    while(workingSquads):
+        curIndex, curSkill, _ = squads.getSquadWithLowestSkill(workingSquads)
+        pick = sortedPlayers[curSkill].pop()
+        for sortedList in sortedPlayers.values():
+            if pick in sortedList:
+                sortedList.remove(pick)
+
+        playerList.players.remove(pick)
+        workingSquads[curIndex].addPlayer(pick)
+        if(len(workingSquads[curIndex].players) == squadSize):
+            squadList.append(workingSquads.pop(curIndex))
+
+    return squadList
+
+
+class TestGetRatings(TestCase):
+    """Tests for getRatings function."""
+
+    def testGetRatings(self):
+        """Test that ratings are ordered the same as the Skill enum."""
+        skills = {Skill.Checking: 30, Skill.Skating: 10, Skill.Shooting: 20}
+        player = Player("123", "Ben Schreiber", skills)
+        self.assertEqual(balancing.getRatings([player]), [(10, 20, 30)])
+
+
+class TestGetSortOrders(TestCase):
+    """Tests for getSortOrders function."""
+
+    def testGetSortOrders(self):
+        """Test that each order sorts the indices by one skill."""
+        ratings = [(3, 1, 2), (1, 2, 3), (2, 3, 1)]
+        orders = balancing.getSortOrders(ratings)
+        self.assertEqual(orders, [[1, 2, 0], [0, 1, 2], [2, 0, 1]])
+
+    def testGetSortOrdersStable(self):
+        """Test that players with equal ratings keep their original order."""
+        ratings = [(5, 5, 5), (1, 1, 1), (5, 5, 5)]
+        orders = balancing.getSortOrders(ratings)
+        self.assertEqual(orders, [[1, 0, 2]] * 3)
+
+
+class TestGreedyAssign(TestCase):
+    """Tests for greedyAssign function."""
+
+    def testGreedyAssign(self):
+        """Test assigning players with clear differences in skill."""
+        ratings = [(99, 99, 99), (97, 97, 97), (50, 50, 50), (20, 20, 20)]
+        orders = balancing.getSortOrders(ratings)
+        assigned = balancing.greedyAssign(2, 2, ratings, orders)
+        self.assertEqual(assigned, [(1, [1, 2]), (0, [0, 3])])
+
+    def testGreedyAssignLeavesRemainder(self):
+        """Test that players beyond the full squads are not assigned."""
+        ratings = [(99, 99, 99), (97, 97, 97), (50, 50, 50)]
+        orders = balancing.getSortOrders(ratings)
+        assigned = balancing.greedyAssign(2, 1, ratings, orders)
+        self.assertEqual(assigned, [(0, [0]), (1, [1])])
+
+    def testGreedyAssignMatchesReference(self):
+        """Test that the engine matches the original greedy algorithm."""
+        for seed, numPlayers, numSquads in [(1, 40, 3), (2, 41, 6),
+                                            (3, 100, 7), (4, 57, 2)]:
+            players = makePlayers(numPlayers, seed)
+            expectedList = PlayerList(list(players))
+            expected = referenceBalancedSquads(numSquads, expectedList)
+            playerList = PlayerList(list(players))
+            balSquads = squads.getBalancedSquads(numSquads, playerList)
+
+            self.assertEqual(balSquads, expected)
+            self.assertEqual(playerList, expectedList)
+            self.assertEqual([s.squadNum for s in balSquads],
+                             [s.squadNum for s in expected])
+
+    def testGreedyAssignMatchesReference__ties(self):
+        """Test that ties are broken the same as the original algorithm."""
+        players = makePlayers(60, seed=5, maxRating=3)
+        expected = referenceBalancedSquads(8, PlayerList(list(players)))
+        balSquads = squads.getBalancedSquads(8, PlayerList(list(players)))
+
+        self.assertEqual(balSquads, expected)
+        self.assertEqual([s.squadNum for s in balSquads],
+                         [s.squadNum for s in expected])
+
+    def testGreedyAssignMatchesVectorized(self):
+        """Test that both ways of making the picks give the same squads."""
+        if balancing.numpy is None:
+            self.skipTest("NumPy is not installed")
+        for seed, numPlayers, numSquads, maxRating in [(1, 40, 3, 100),
+                                                       (2, 500, 12, 100),
+                                                       (3, 300, 25, 3),
+                                                       (4, 61, 20, 1)]:
+            ratings = balancing.getRatings(makePlayers(numPlayers, seed,
+                                                       maxRating))
+            orders = balancing.getSortOrders(ratings)
+            squadSize = numPlayers // numSquads
+
+            with patch.object(balancing, "VECTORIZEDSQUADS", numSquads + 1):
+                expected = balancing.greedyAssign(numSquads, squadSize,
+                                                  ratings, orders)
+            self.assertEqual(
+                balancing._greedyAssignVectorized(numSquads, squadSize,
+                                                  ratings, orders),
+                expected)
+
+    def testGreedyAssignMatchesReference__vectorized(self):
+        """Test that vectorized picks match the original algorithm."""
+        players = makePlayers(120, seed=6, maxRating=5)
+        numSquads = balancing.VECTORIZEDSQUADS + 2
+        expected = referenceBalancedSquads(numSquads,
+                                           PlayerList(list(players)))
+        balSquads = squads.getBalancedSquads(numSquads,
+                                             PlayerList(list(players)))
+
+        self.assertEqual(balSquads, expected)
+        self.assertEqual([s.squadNum for s in balSquads],
+                         [s.squadNum for s in expected])
+
+    def testGreedyAssignEndTime(self):
+        """Test that the greedy stops once its end time has passed."""
+        ratings = balancing.getRatings(makePlayers(3000, seed=7))
+        orders = balancing.getSortOrders(ratings)
+        endTime = time.monotonic() - 1
+
+        for numSquads in [2, balancing.VECTORIZEDSQUADS]:
+            with self.assertRaises(TimeoutError):
+                balancing.greedyAssign(numSquads, 3000 // numSquads, ratings,
+                                       orders, endTime)
+        self.assertEqual(
+            balancing.greedyAssign(2, 1500, ratings, orders,
+                                   time.monotonic() + 60),
+            balancing.greedyAssign(2, 1500, ratings, orders))
+
+
+class TestDifferencingAssign(TestCase):
+    """Tests for differencingAssign function."""
+
+    def testDifferencingAssign(self):
+        """Test that strong and weak players are paired into squads."""
+        ratings = [(99, 99, 99), (97, 97, 97), (50, 50, 50), (20, 20, 20),
+                   (10, 10, 10)]
+        assigned = balancing.differencingAssign(2, 2, ratings)
+
+        self.assertEqual(sorted(members for _, members in assigned),
+                         [[0, 3], [1, 2]])
+
+    def testDifferencingAssignSquadSizes(self):
+        """Test that squads are full and the weakest players are left out."""
+        players = makePlayers(53, seed=5)
+        ratings = balancing.getRatings(players)
+        assigned = balancing.differencingAssign(5, 10, ratings)
+        weakest = sorted(range(53), key=lambda i: sum(ratings[i]))[:3]
+
+        self.assertEqual([squad for squad, _ in assigned], list(range(5)))
+        self.assertTrue(all(len(m) == 10 for _, m in assigned))
+        used = [i for _, members in assigned for i in members]
+        self.assertEqual(len(set(used)), 50)
+        self.assertFalse(set(weakest) & set(used))
+
+    def testDifferencingAssignBalance(self):
+        """Test that differencing balances better than the greedy."""
+        ratings = balancing.getRatings(makePlayers(300, seed=11))
+        orders = balancing.getSortOrders(ratings)
+        greedy = balancing.greedyAssign(10, 30, ratings, orders)
+        assigned = balancing.differencingAssign(10, 30, ratings)
+
+        self.assertLess(balancing.getSpread(assigned, ratings),
+                        balancing.getSpread(greedy, ratings))
+
+    def testPairSquadsMatchesVectorized(self):
+        """Test that both ways of pairing squads give the same pairs."""
+        if balancing.numpy is None:
+            self.skipTest("NumPy is not installed")
+        rand = random.Random(4)
+        offsetsA = [[rand.randint(-50, 50) for _ in Skill] for _ in range(8)]
+        offsetsB = [[rand.randint(-50, 50) for _ in Skill] for _ in range(8)]
+
+        self.assertEqual(balancing._pairSquads(offsetsA, offsetsB),
+                         balancing._pairSquadsVectorized(offsetsA, offsetsB))
+
+
+class TestGetSpread(TestCase):
+    """Tests for getSpread function."""
+
+    def testGetSpread(self):
+        """Test the spread of squad totals summed over each skill."""
+        ratings = [(99, 99, 99), (97, 97, 97), (50, 50, 50), (20, 40, 20)]
+        assigned = [(0, [0, 3]), (1, [1, 2])]
+
+        self.assertEqual(balancing.getSpread(assigned, ratings), 28 + 8 + 28)
+
+
+class TestRefineAssign(TestCase):
+    """Tests for refineAssign function."""
+
+    def imbalance(self, assigned, ratings):
+        """Get the sum of squared skill totals of the squads."""
+        return sum(total ** 2 for _, members in assigned
+                   for total in balancing.getTotals(members, ratings))
+
+    def testRefineAssign(self):
+        """Test that an improving swap is made between two squads."""
+        ratings = [(99, 99, 99), (97, 97, 97), (50, 50, 50), (20, 20, 20)]
+        assigned = [(0, [0, 1]), (1, [2, 3])]
+        swaps = balancing.refineAssign(assigned, ratings)
+
+        self.assertEqual(swaps, 1)
+        self.assertEqual(assigned, [(0, [2, 1]), (1, [0, 3])])
+
+    def testRefineAssignNoImprovement(self):
+        """Test that balanced squads are left unchanged."""
+        ratings = [(99, 99, 99), (97, 97, 97), (50, 50, 50), (20, 20, 20)]
+        assigned = [(0, [0, 3]), (1, [1, 2])]
+        swaps = balancing.refineAssign(assigned, ratings)
+
+        self.assertEqual(swaps, 0)
+        self.assertEqual(assigned, [(0, [0, 3]), (1, [1, 2])])
+
+    def testRefineAssignMaxSwaps(self):
+        """Test that no more than the maximum number of swaps are made."""
+        ratings = [(99, 99, 99), (97, 97, 97), (50, 50, 50), (20, 20, 20)]
+        assigned = [(0, [0, 1]), (1, [2, 3])]
+        swaps = balancing.refineAssign(assigned, ratings, maxSwaps=0)
+
+        self.assertEqual(swaps, 0)
+        self.assertEqual(assigned, [(0, [0, 1]), (1, [2, 3])])
+
+    def testRefineAssignImproves(self):
+        """Test that refining greedy squads never makes them worse."""
+        ratings = balancing.getRatings(makePlayers(90, seed=7))
+        orders = balancing.getSortOrders(ratings)
+        assigned = balancing.greedyAssign(6, 15, ratings, orders)
+        before = self.imbalance(assigned, ratings)
+        players = sorted(i for _, members in assigned for i in members)
+
+        balancing.refineAssign(assigned, ratings)
+
+        self.assertLessEqual(self.imbalance(assigned, ratings), before)
+        self.assertEqual(sorted(i for _, members in assigned
+                                for i in members), players)
+        self.assertTrue(all(len(m) == 15 for _, m in assigned))
+
+    def testBestSwapMatchesVectorized(self):
+        """Test that both swap searches find the same swap."""
+        if balancing.numpy is None:
+            self.skipTest("NumPy is not installed")
+        ratings = balancing.getRatings(makePlayers(20, seed=3))
+        squadA, squadB = list(range(10)), list(range(10, 20))
+        totalsA = balancing.getTotals(squadA, ratings)
+        totalsB = balancing.getTotals(squadB, ratings)
+
+        self.assertEqual(
+            balancing._bestSwap(squadA, squadB, totalsA, totalsB, ratings),
+            balancing._bestSwapVectorized(squadA, squadB, totalsA, totalsB,
+                                          balancing.numpy.array(ratings)))
+
+    def testBestSwapMatchesVectorized__blocks(self):
+        """Test that searching swaps in blocks finds the same swap."""
+        if balancing.numpy is None:
+            self.skipTest("NumPy is not installed")
+        ratings = balancing.getRatings(makePlayers(60, seed=7, maxRating=4))
+        squadA, squadB = list(range(0, 60, 2)), list(range(1, 60, 2))
+        totalsA = balancing.getTotals(squadA, ratings)
+        totalsB = balancing.getTotals(squadB, ratings)
+        expected = balancing._bestSwap(squadA, squadB, totalsA, totalsB,
+                                       ratings)
+
+        for blockSize in [1, 29, 31, 100]:
+            with patch.object(balancing, "SWAPBLOCKSIZE", blockSize):
+                self.assertEqual(balancing._bestSwapVectorized(
+                    squadA, squadB, totalsA, totalsB,
+                    balancing.numpy.array(ratings, dtype=float)), expected)
+
+    def testBestSwapDeadline(self):
+        """Test that a passed deadline stops the search for a swap."""
+        ratings = balancing.getRatings(makePlayers(20, seed=3))
+        squadA, squadB = list(range(10)), list(range(10, 20))
+        totalsA = balancing.getTotals(squadA, ratings)
+        totalsB = balancing.getTotals(squadB, ratings)
+        deadline = time.monotonic() - 1
+
+        self.assertIsNone(balancing._bestSwap(squadA, squadB, totalsA,
+                                              totalsB, ratings, deadline))
+        if balancing.numpy is not None:
+            self.assertIsNone(balancing._bestSwapVectorized(
+                squadA, squadB, totalsA, totalsB,
+                balancing.numpy.array(ratings), deadline))
+
+    def testRefineAssignTimeLimit__largeSquads(self):
+        """Test that refining two large squads keeps to the time limit."""
+        ratings = balancing.getRatings(makePlayers(8000, seed=1))
+        orders = balancing.getSortOrders(ratings)
+        assigned = balancing.greedyAssign(2, 4000, ratings, orders)
+
+        start = time.monotonic()
+        balancing.refineAssign(assigned, ratings, timeLimit=0.2)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+
+class TestRepairAssign(TestCase):
+    """Tests for repairAssign function."""
+
+    ratings = [(10, 10, 10), (10, 10, 10), (30, 30, 30), (30, 30, 30),
+               (40, 40, 40), (40, 40, 40)]
+
+    def testRepairAssign(self):
+        """Test that the best swap with the involved squad is made."""
+        assigned = [(0, [0, 1]), (1, [2, 3]), (2, [4, 5])]
+        swaps = balancing.repairAssign(assigned, self.ratings, [0], 0)
+
+        self.assertEqual(swaps, 1)
+        self.assertEqual(assigned, [(0, [4, 1]), (1, [2, 3]), (2, [0, 5])])
+
+    def testRepairAssignTargetSpread(self):
+        """Test that no swap is made once the spread is within target."""
+        assigned = [(0, [0, 1]), (1, [2, 3]), (2, [4, 5])]
+        spread = balancing.getSpread(assigned, self.ratings)
+        swaps = balancing.repairAssign(assigned, self.ratings, [0], spread)
+
+        self.assertEqual(swaps, 0)
+        self.assertEqual(assigned, [(0, [0, 1]), (1, [2, 3]), (2, [4, 5])])
+
+    def testRepairAssignInvolving(self):
+        """Test that only swaps with the involved squads are made."""
+        ratings = balancing.getRatings(makePlayers(40, seed=5))
+        assigned = [(k, list(range(k * 10, k * 10 + 10))) for k in range(4)]
+        original = [set(members) for _, members in assigned]
+        swaps = balancing.repairAssign(assigned, ratings, [0], 0,
+                                       maxSwaps=1)
+
+        self.assertEqual(swaps, 1)
+        for k, members in assigned[1:]:
+            self.assertLessEqual(set(members), original[k] | original[0])
@@ -0,0 +1,43 @@
+"""Unittests for benchmark module."""
+import benchmark
+
+from unittest import TestCase
+
+from players import PlayerList
+
+
+class TestGeneratePlayerData(TestCase):
+    """Tests for generating synthetic rosters."""
+
+    def testGeneratePlayerData(self):
+        """Test that generated data can be read as players."""
+        data = benchmark.generatePlayerData(25)
+        playerList = PlayerList([benchmark.Player.fromJSON(p)
+                                 for p in data["players"]])
+
+        self.assertEqual(len(playerList.players), 25)
+        self.assertTrue(all(20 <= r <= 100 for p in playerList.players
+                            for r in p.ratings))
+
+    def testGeneratePlayerDataDeterministic(self):
+        """Test that the same seed generates the same roster."""
+        self.assertEqual(benchmark.generatePlayerData(10, seed=4),
+                         benchmark.generatePlayerData(10, seed=4))
+        self.assertNotEqual(benchmark.generatePlayerData(10, seed=4),
+                            benchmark.generatePlayerData(10, seed=5))
+
+
+class TestRunBenchmarks(TestCase):
+    """Tests for running the benchmarks."""
+
+    def testRunBenchmarks(self):
+        """Test that results are recorded for each benchmark."""
+        results = benchmark.runBenchmarks(sizes=[12], squadCounts=[2, 20],
+                                          repeat=1)
+        names = set(r["benchmark"] for r in results)
+
+        self.assertIn("PlayerList.fromJSON", names)
+        self.assertIn("POST /squads", names)
+        self.assertTrue(all(r["players"] == 12 for r in results))
+        self.assertFalse(any(r["squads"] == 20 for r in results))
+        self.assertTrue(all(r["seconds"] >= 0 for r in results))
@@ -0,0 +1,83 @@
+"""Unittests for binroster module."""
+import binroster
+import json
+import os
+import players
+import shutil
+import squads
+import tempfile
+
+from unittest import TestCase
+
+from test.test_players import TESTJSON
+
+EXAMPLEJSON = os.path.join(os.path.dirname(__file__), "..", "players.json")
+
+
+class TestBinaryRoster(TestCase):
+    """Tests for converting to and loading binary rosters."""
+
+    skills1 = {players.Skill.Skating: 50, players.Skill.Shooting: 90,
+               players.Skill.Checking: 99}
+    skills2 = {players.Skill.Skating: 99, players.Skill.Shooting: 85,
+               players.Skill.Checking: 80}
+    player1 = players.Player("123", "Ben Schreiber", skills1)
+    player2 = players.Player("99", "Wayne Gretzky", skills2)
+
+    def setUp(self):
+        """Create a temporary directory holding the test roster."""
+        self.dir = tempfile.mkdtemp()
+        self.jsonFn = os.path.join(self.dir, "players.json")
+        self.binFn = os.path.join(self.dir, "players.bin")
+        with open(self.jsonFn, "w") as f:
+            json.dump(TESTJSON, f)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.dir)
+
+    def testConvertJSON(self):
+        """Test that a converted roster contains the same players."""
+        binroster.convertJSON(self.jsonFn, self.binFn)
+        roster = binroster.BinaryRoster(self.binFn)
+
+        self.assertEqual(len(roster), 2)
+        self.assertEqual(list(roster), [self.player1, self.player2])
+        self.assertEqual(roster[-1], self.player2)
+        self.assertEqual(roster.ratings(0), (50, 90, 99))
+
+    def testUnicodeStrings(self):
+        """Test that non-ASCII ids and names are kept."""
+        player = players.Player("été", "Patrik Laïne",
+                                (70, 80, 90))
+        binroster.writeBinary([player, self.player1], self.binFn)
+        roster = binroster.BinaryRoster(self.binFn)
+
+        self.assertEqual(list(roster), [player, self.player1])
+        self.assertEqual(list(roster.names), ["Patrik Laïne",
+                                              "Ben Schreiber"])
+
+    def testIndexError(self):
+        """Test that indexing past the end of a roster raises an error."""
+        binroster.writeBinary([self.player1], self.binFn)
+        roster = binroster.BinaryRoster(self.binFn)
+
+        with self.assertRaises(IndexError):
+            roster[1]
+
+    def testInvalidFile(self):
+        """Test that a file which is not a binary roster is rejected."""
+        with self.assertRaises(ValueError):
+            binroster.BinaryRoster(self.jsonFn)
+
+    def testLoadPlayerList(self):
+        """Test that squads can be balanced from a binary roster."""
+        binroster.convertJSON(EXAMPLEJSON, self.binFn)
+        playerList = binroster.loadPlayerList(self.binFn)
+        expectedList = players.PlayerList.fromJSON(EXAMPLEJSON)
+
+        balSquads = squads.getBalancedSquads(3, playerList.copy())
+        expectedSquads = squads.getBalancedSquads(3, expectedList)
+
+        self.assertEqual(balSquads, expectedSquads)
+        self.assertEqual(len(playerList.players), 40)
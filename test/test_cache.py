@@ -0,0 +1,147 @@
+"""Unittests for cache module."""
+import cache
+import json
+import os
+import tempfile
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from players import Player
+from test.test_players import TESTJSON
+
+
+class TestRosterCache(TestCase):
+    """Tests for RosterCache class."""
+
+    def setUp(self):
+        """Write the test roster to a temporary file."""
+        fd, self.fn = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(TESTJSON, f)
+
+    def tearDown(self):
+        """Remove the temporary roster file."""
+        os.remove(self.fn)
+
+    def testGet(self):
+        """Test that the roster is loaded once and then cached."""
+        rosterCache = cache.RosterCache(self.fn)
+        first = rosterCache.get()
+        second = rosterCache.get()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(first.players), 2)
+        self.assertEqual(rosterCache.stats(), {"hits": 1, "misses": 1})
+
+    def testGetReturnsCopy(self):
+        """Test that changing one copy of the roster does not affect others."""
+        rosterCache = cache.RosterCache(self.fn)
+        first = rosterCache.get()
+        first.players.pop()
+
+        self.assertEqual(len(rosterCache.get().players), 2)
+
+    def testGetReloadsChangedFile(self):
+        """Test that the roster is reloaded when the file changes."""
+        rosterCache = cache.RosterCache(self.fn)
+        rosterCache.get()
+
+        with open(self.fn, "w") as f:
+            json.dump({"players": TESTJSON["players"][:1]}, f)
+        stat = os.stat(self.fn)
+        os.utime(self.fn, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertEqual(len(rosterCache.get().players), 1)
+        self.assertEqual(rosterCache.stats(), {"hits": 0, "misses": 2})
+
+    def testClear(self):
+        """Test that clearing the cache loads the roster again."""
+        rosterCache = cache.RosterCache(self.fn)
+        rosterCache.get()
+        rosterCache.clear()
+        rosterCache.get()
+
+        self.assertEqual(rosterCache.stats(), {"hits": 0, "misses": 2})
+
+    def testLoad(self):
+        """Test that the roster is loaded along with its fingerprint."""
+        rosterCache = cache.RosterCache(self.fn)
+        playerList, fingerprint = rosterCache.load()
+
+        self.assertEqual(fingerprint,
+                         cache.rosterFingerprint(playerList.players))
+        self.assertEqual(rosterCache.load()[1], fingerprint)
+
+
+class TestRosterFingerprint(TestCase):
+    """Tests for rosterFingerprint function."""
+
+    player1 = Player("123", "Ben Schreiber", (50, 90, 99))
+    player2 = Player("99", "Wayne Gretzky", (99, 85, 80))
+
+    def testSameRoster(self):
+        """Test that equal rosters have the same fingerprint."""
+        self.assertEqual(
+            cache.rosterFingerprint([self.player1, self.player2]),
+            cache.rosterFingerprint([Player("123", "Ben Schreiber",
+                                            (50, 90, 99)), self.player2]))
+
+    def testDifferentRatings(self):
+        """Test that changing a rating changes the fingerprint."""
+        changed = Player("123", "Ben Schreiber", (50, 90, 98))
+        self.assertNotEqual(
+            cache.rosterFingerprint([self.player1, self.player2]),
+            cache.rosterFingerprint([changed, self.player2]))
+
+    def testDifferentOrder(self):
+        """Test that reordering the players changes the fingerprint."""
+        self.assertNotEqual(
+            cache.rosterFingerprint([self.player1, self.player2]),
+            cache.rosterFingerprint([self.player2, self.player1]))
+
+
+class TestSquadCache(TestCase):
+    """Tests for SquadCache class."""
+
+    def testGetAndPut(self):
+        """Test storing and retrieving a value."""
+        squadCache = cache.SquadCache()
+        squadCache.put(("abc", 2), "squads")
+
+        self.assertEqual(squadCache.get(("abc", 2)), "squads")
+        self.assertIsNone(squadCache.get(("abc", 3)))
+        self.assertEqual(squadCache.stats(), {"hits": 1, "misses": 1,
+                                              "evictions": 0, "size": 1})
+
+    def testEvictsLeastRecentlyUsed(self):
+        """Test that the least recently used entry is evicted when full."""
+        squadCache = cache.SquadCache(maxSize=2)
+        squadCache.put(1, "one")
+        squadCache.put(2, "two")
+        squadCache.get(1)
+        squadCache.put(3, "three")
+
+        self.assertEqual(squadCache.get(1), "one")
+        self.assertIsNone(squadCache.get(2))
+        self.assertEqual(squadCache.get(3), "three")
+        self.assertEqual(squadCache.evictions, 1)
+
+    def testExpiredEntry(self):
+        """Test that entries are not returned after their lifetime."""
+        squadCache = cache.SquadCache(ttl=60)
+        with patch("time.monotonic", MagicMock(return_value=100)):
+            squadCache.put(1, "one")
+        with patch("time.monotonic", MagicMock(return_value=159)):
+            self.assertEqual(squadCache.get(1), "one")
+        with patch("time.monotonic", MagicMock(return_value=161)):
+            self.assertIsNone(squadCache.get(1))
+        self.assertEqual(len(squadCache), 0)
+
+    def testClear(self):
+        """Test removing every entry."""
+        squadCache = cache.SquadCache()
+        squadCache.put(1, "one")
+        squadCache.clear()
+
+        self.assertIsNone(squadCache.get(1))
@@ -0,0 +1,104 @@
+"""Unittests for jobs module."""
+import jobs
+import threading
+
+from unittest import TestCase
+
+
+class TestJobQueue(TestCase):
+    """Tests for JobQueue class."""
+
+    def setUp(self):
+        """Create a queue with a single worker and room for two jobs."""
+        self.queue = jobs.JobQueue(workers=1, maxPending=2)
+        self.release = threading.Event()
+        self.addCleanup(self.queue.shutdown)
+        self.addCleanup(self.release.set)
+
+    def blocked(self, value):
+        """Return a value once the test releases the job."""
+        self.release.wait(5)
+        return value
+
+    def testSubmit(self):
+        """Test that a submitted job runs and keeps its result."""
+        job = self.queue.submit(sum, [1, 2, 3])
+
+        self.assertIs(self.queue.wait(job.id, 5), job)
+        self.assertEqual(job.toDict(), {"jobId": job.id, "status": jobs.DONE,
+                                        "result": 6})
+        self.assertEqual(self.queue.stats(), {"pending": 0, "jobs": 1})
+
+    def testSubmitFailed(self):
+        """Test that a job raising an error fails with its message."""
+        def fail():
+            raise ValueError("Too many squads")
+        job = self.queue.submit(fail)
+        job.wait(5)
+
+        self.assertEqual(job.status, jobs.FAILED)
+        self.assertEqual(job.toDict()["error"], "Too many squads")
+
+    def testQueueFull(self):
+        """Test that jobs are refused once maxPending are pending."""
+        running = self.queue.submit(self.blocked, 1)
+        queued = self.queue.submit(self.blocked, 2)
+
+        with self.assertRaises(jobs.QueueFullError):
+            self.queue.submit(self.blocked, 3)
+
+        self.release.set()
+        running.wait(5)
+        queued.wait(5)
+        self.assertEqual(self.queue.submit(sum, []).wait(5), True)
+
+    def testWaitTimeout(self):
+        """Test that waiting on an unfinished job returns it unfinished."""
+        job = self.queue.submit(self.blocked, 1)
+
+        self.assertIs(self.queue.wait(job.id, 0.01), job)
+        self.assertFalse(job.finished)
+
+    def testCancelQueued(self):
+        """Test that a cancelled queued job never runs."""
+        ran = []
+        self.queue.submit(self.blocked, 1)
+        job = self.queue.submit(ran.append, 2)
+
+        self.assertIs(self.queue.cancel(job.id), job)
+        self.release.set()
+        self.queue.shutdown()
+
+        self.assertEqual(job.status, jobs.CANCELLED)
+        self.assertEqual(ran, [])
+        self.assertEqual(self.queue.stats()["pending"], 0)
+
+    def testCancelRunning(self):
+        """Test that a running job is still pending until it stops."""
+        job = self.queue.submit(self.blocked, 1)
+        while(job.status == jobs.QUEUED):
+            threading.Event().wait(0.001)
+        self.queue.cancel(job.id)
+
+        self.assertTrue(job.finished)
+        self.assertEqual(self.queue.stats()["pending"], 1)
+        self.release.set()
+        self.queue.shutdown()
+        self.assertEqual(job.toDict(), {"jobId": job.id,
+                                        "status": jobs.CANCELLED})
+        self.assertEqual(self.queue.stats()["pending"], 0)
+
+    def testUnknownJob(self):
+        """Test that unknown job ids give None."""
+        self.assertIsNone(self.queue.get("missing"))
+        self.assertIsNone(self.queue.wait("missing", 0.01))
+        self.assertIsNone(self.queue.cancel("missing"))
+
+    def testPrune(self):
+        """Test that finished jobs are forgotten after their ttl."""
+        queue = jobs.JobQueue(workers=1, ttl=0)
+        self.addCleanup(queue.shutdown)
+        job = queue.submit(sum, [])
+        job.wait(5)
+
+        self.assertIsNone(queue.get(job.id))
@@ -0,0 +1,93 @@
+"""Unittests for multistart module."""
+import balancing
+import multistart
+import time
+
+from unittest import TestCase
+
+from test.test_balancing import makePlayers
+
+
+class TestRandomizedAssign(TestCase):
+    """Tests for randomizedAssign function."""
+
+    ratings = balancing.getRatings(makePlayers(40, seed=11))
+
+    def testRandomizedAssign(self):
+        """Test that every squad is filled with distinct players."""
+        assigned = multistart.randomizedAssign(4, 10, self.ratings, seed=3)
+        members = [i for _, squad in assigned for i in squad]
+
+        self.assertEqual(sorted(squad for squad, _ in assigned),
+                         [0, 1, 2, 3])
+        self.assertEqual(len(set(members)), 40)
+
+    def testRandomizedAssignDeterministic(self):
+        """Test that the same seed gives the same assignment."""
+        self.assertEqual(
+            multistart.randomizedAssign(4, 10, self.ratings, seed=3),
+            multistart.randomizedAssign(4, 10, self.ratings, seed=3))
+
+    def testRandomizedAssignEndTime(self):
+        """Test that a start past its end time gives no assignment."""
+        with self.assertRaises(TimeoutError):
+            multistart.randomizedAssign(4, 10, self.ratings, seed=3,
+                                        endTime=time.monotonic() - 1)
+
+        multistart._initWorker(self.ratings)
+        self.addCleanup(multistart._initWorker, None)
+        self.assertIsNone(multistart._runStart(4, 10, 3, 5,
+                                               time.monotonic() - 1))
+
+
+class TestMultiStartAssign(TestCase):
+    """Tests for multiStartAssign function."""
+
+    ratings = balancing.getRatings(makePlayers(60, seed=12))
+    orders = balancing.getSortOrders(ratings)
+
+    def setUp(self):
+        """Stop the kept pool of workers after each test."""
+        self.addCleanup(multistart.closePool)
+
+    def testMultiStartAssignOneStart(self):
+        """Test that a single start is the plain greedy assignment."""
+        expected = balancing.greedyAssign(5, 12, self.ratings, self.orders)
+        assigned = multistart.multiStartAssign(5, 12, self.ratings,
+                                               self.orders, starts=1)
+
+        self.assertEqual(assigned, expected)
+
+    def testMultiStartAssign(self):
+        """Test that the best start is no worse than the greedy."""
+        greedy = balancing.greedyAssign(5, 12, self.ratings, self.orders)
+        assigned = multistart.multiStartAssign(5, 12, self.ratings,
+                                               self.orders, starts=6,
+                                               workers=2)
+
+        self.assertLessEqual(balancing.getSpread(assigned, self.ratings),
+                             balancing.getSpread(greedy, self.ratings))
+
+    def testMultiStartAssignDeadline(self):
+        """Test that an expired deadline falls back to the greedy."""
+        expected = balancing.greedyAssign(5, 12, self.ratings, self.orders)
+        assigned = multistart.multiStartAssign(5, 12, self.ratings,
+                                               self.orders, starts=4,
+                                               workers=1, deadline=0)
+
+        self.assertEqual(assigned, expected)
+
+    def testMultiStartAssignKeepsPool(self):
+        """Test that the pool is kept until the ratings change."""
+        multistart.multiStartAssign(5, 12, self.ratings, self.orders,
+                                    starts=3, workers=1)
+        pool = multistart._pool
+        multistart.multiStartAssign(5, 12, list(self.ratings), self.orders,
+                                    starts=3, workers=1)
+        self.assertIs(multistart._pool, pool)
+
+        ratings = balancing.getRatings(makePlayers(60, seed=13))
+        multistart.multiStartAssign(5, 12, ratings,
+                                    balancing.getSortOrders(ratings),
+                                    starts=3, workers=1)
+        self.assertIsNot(multistart._pool, pool)
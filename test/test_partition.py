@@ -0,0 +1,88 @@
+"""Unittests for partition module."""
+import itertools
+import random
+
+from unittest import TestCase
+
+from balancing import getSortOrders, getSpread, greedyAssign
+from partition import branchAndBound, optimalAssign
+
+
+def bruteForceSpread(numSquads, squadSize, ratings):
+    """Find the lowest spread by trying every assignment of the players."""
+    numPlayers = len(ratings)
+    best = None
+    for labels in itertools.product(range(numSquads + 1), repeat=numPlayers):
+        if any(labels.count(j) != squadSize for j in range(numSquads)):
+            continue
+        assigned = [(j, [i for i in range(numPlayers) if labels[i] == j])
+                    for j in range(numSquads)]
+        spread = getSpread(assigned, ratings)
+        best = spread if best is None else min(best, spread)
+    return best
+
+
+class TestBranchAndBound(TestCase):
+    """Tests for branchAndBound function."""
+
+    def testMatchesBruteForce(self):
+        """Test that the search finds the lowest spread of small rosters."""
+        rand = random.Random(1)
+        for numSquads, squadSize, numPlayers in [(2, 2, 4), (2, 3, 7),
+                                                 (3, 2, 6), (3, 2, 8),
+                                                 (2, 4, 8)]:
+            ratings = [tuple(rand.randint(20, 100) for _ in range(3))
+                       for _ in range(numPlayers)]
+            spread, assigned, finished = branchAndBound(
+                numSquads, squadSize, ratings, getSortOrders(ratings), None)
+
+            self.assertTrue(finished)
+            self.assertEqual(spread, getSpread(assigned, ratings))
+            self.assertEqual(spread, bruteForceSpread(numSquads, squadSize,
+                                                      ratings))
+
+    def testPerfectSquads(self):
+        """Test squads that can be balanced perfectly."""
+        ratings = [(5, 1, 3), (1, 5, 3), (2, 4, 3), (4, 2, 3), (2, 4, 3),
+                   (4, 2, 3)]
+        spread, assigned, finished = branchAndBound(
+            2, 3, ratings, getSortOrders(ratings), None)
+
+        self.assertEqual(spread, 0)
+        self.assertTrue(finished)
+        self.assertEqual([j for j, _ in assigned], [0, 1])
+        self.assertEqual(sorted(i for _, m in assigned for i in m),
+                         list(range(6)))
+
+    def testTimeLimit(self):
+        """Test that an expired time limit keeps the best squads so far."""
+        rand = random.Random(2)
+        ratings = [tuple(rand.randint(20, 100) for _ in range(3))
+                   for _ in range(60)]
+        orders = getSortOrders(ratings)
+        greedy = getSpread(greedyAssign(6, 10, ratings, orders), ratings)
+        spread, assigned, finished = branchAndBound(6, 10, ratings, orders,
+                                                    timeLimit=0)
+
+        self.assertFalse(finished)
+        self.assertLessEqual(spread, greedy)
+        self.assertEqual(spread, getSpread(assigned, ratings))
+        self.assertEqual([len(m) for _, m in assigned], [10] * 6)
+
+
+class TestOptimalAssign(TestCase):
+    """Tests for optimalAssign function."""
+
+    def testOptimalAssign(self):
+        """Test that the optimal squads are no worse than the greedy."""
+        rand = random.Random(3)
+        ratings = [tuple(rand.randint(20, 100) for _ in range(3))
+                   for _ in range(13)]
+        orders = getSortOrders(ratings)
+        assigned = optimalAssign(3, 4, ratings, orders, timeLimit=None)
+
+        self.assertEqual([j for j, _ in assigned], [0, 1, 2])
+        self.assertEqual([len(m) for _, m in assigned], [4, 4, 4])
+        self.assertLessEqual(getSpread(assigned, ratings),
+                             getSpread(greedyAssign(3, 4, ratings, orders),
+                                       ratings))
@@ -1,7 +1,9 @@
 """Unittests for players module."""
+import io
+import json
 import players
 
-from unittest import TestCase
+from unittest import TestCase, skipIf
 from unittest.mock import MagicMock, mock_open, patch
 
 
@@ -76,6 +78,39 @@ class TestPlayer(TestCase):
 
         self.assertEqual(player.checking, skills[players.Skill.Checking])
 
+    def testRating(self):
+        """Test getting a player's rating for a given skill."""
+        skills = {players.Skill.Skating: 50, players.Skill.Shooting: 40,
+                  players.Skill.Checking: 60}
+        player = players.Player("123", "Ben Schreiber", skills)
+
+        for skill in players.Skill:
+            self.assertEqual(player.rating(skill), skills[skill])
+
+    def testSkills(self):
+        """Test that the skills of a player are returned as a dict."""
+        skills = {players.Skill.Skating: 50, players.Skill.Shooting: 40,
+                  players.Skill.Checking: 60}
+        player = players.Player("123", "Ben Schreiber", skills)
+
+        self.assertEqual(player.skills, skills)
+        self.assertEqual(player.ratings, (50, 40, 60))
+
+    def testSkillsFromSequence(self):
+        """Test creating a player from ratings in the order of Skill."""
+        skills = {players.Skill.Skating: 50, players.Skill.Shooting: 40,
+                  players.Skill.Checking: 60}
+        player1 = players.Player("123", "Ben Schreiber", skills)
+        player2 = players.Player("123", "Ben Schreiber", [50, 40, 60])
+
+        self.assertEqual(player1, player2)
+
+    def testSlots(self):
+        """Test that players do not hold a dict of attributes."""
+        player = players.Player("123", "Ben Schreiber", (50, 40, 60))
+
+        self.assertFalse(hasattr(player, "__dict__"))
+
     def testEquality(self):
         """Test that a player is equal to itself."""
         skills = {players.Skill.Skating: 50, players.Skill.Shooting: 50,
@@ -84,6 +119,15 @@ class TestPlayer(TestCase):
         player2 = players.Player("123", "Ben Schreiber", skills)
         self.assertEqual(player1, player2)
 
+    def testEqualityIdentity(self):
+        """Test that a player is equal to itself without comparing fields."""
+        class Uncomparable:
+            def __eq__(self, other):
+                raise AssertionError("ids were compared")
+
+        player = players.Player(Uncomparable(), "Ben Schreiber", (50, 40, 60))
+        self.assertTrue(player == player)
+
     def testInequality(self):
         """Test that two different players are not equal."""
         skills1 = {players.Skill.Skating: 50, players.Skill.Shooting: 50,
@@ -140,6 +184,60 @@ class TestGetSkillRatings(TestCase):
         self.assertEqual(players.getSkillRatings(data), expectedSkills)
 
 
+class TestIterPlayerData(TestCase):
+    """Tests for streaming player data from JSON."""
+
+    def testIterPlayerData(self):
+        """Test that each player's data is read from the stream."""
+        stream = io.StringIO(json.dumps(TESTJSON, indent=4))
+        data = list(players.iterPlayerData(stream))
+
+        self.assertEqual(data, TESTJSON["players"])
+
+    def testIterPlayerDataSmallChunks(self):
+        """Test reading players split across many small chunks."""
+        stream = io.StringIO(json.dumps(TESTJSON, indent=4))
+        data = list(players.iterPlayerData(stream, chunkSize=3))
+
+        self.assertEqual(data, TESTJSON["players"])
+
+    def testIterPlayerDataEmpty(self):
+        """Test reading an empty list of players."""
+        stream = io.StringIO('{"players": []}')
+
+        self.assertEqual(list(players.iterPlayerData(stream, 4)), [])
+
+    def testIterPlayerDataOtherKeys(self):
+        """Test that keys before the list of players are skipped."""
+        stream = io.StringIO('{"season": 2018, "players": [{"_id": "1"}]}')
+
+        self.assertEqual(list(players.iterPlayerData(stream, 5)),
+                         [{"_id": "1"}])
+
+    def testIterPlayerDataNoPlayers(self):
+        """Test that data without a list of players raises an error."""
+        stream = io.StringIO('{"teams": []}')
+
+        with self.assertRaises(ValueError):
+            list(players.iterPlayerData(stream, 4))
+
+    def testIterPlayerDataTruncated(self):
+        """Test that a truncated list of players raises an error."""
+        stream = io.StringIO('{"players": [{"_id": "1"}, {"_id": ')
+
+        with self.assertRaises(ValueError):
+            list(players.iterPlayerData(stream, 4))
+
+    def testIterPlayersJSON(self):
+        """Test streaming Players from a JSON file."""
+        expected = [players.Player.fromJSON(p) for p in TESTJSON["players"]]
+
+        with patch("builtins.open",
+                   mock_open(read_data=json.dumps(TESTJSON))):
+            self.assertEqual(list(players.iterPlayersJSON("myJSONFile", 16)),
+                             expected)
+
+
 class TestPlayerList(TestCase):
     """Tests for PlayerList class."""
 
@@ -215,6 +313,16 @@ class TestPlayerList(TestCase):
 
         self.assertEqual(playerList, expectedPlayerList)
 
+    def testFromJSONStream(self):
+        """Test that a PlayerList can be streamed from a JSON file."""
+        expectedPlayerList = players.PlayerList([self.player1, self.player2])
+
+        with patch("builtins.open",
+                   mock_open(read_data=json.dumps(TESTJSON))):
+            playerList = players.PlayerList.fromJSONStream("myJSONFile")
+
+        self.assertEqual(playerList, expectedPlayerList)
+
     def testToHTML(self):
         """Test that toHTML outputs the expected HTML data."""
         playerList = players.PlayerList([self.player1, self.player2])
@@ -222,3 +330,206 @@ class TestPlayerList(TestCase):
         html = playerList.toHTML()
 
         self.assertEqual(html, expectedHTML)
+
+    def testCopy(self):
+        """Test that a copy of a PlayerList has its own list of players."""
+        playerList = players.PlayerList([self.player1, self.player2])
+        playerCopy = playerList.copy()
+        playerCopy.players.pop()
+
+        self.assertEqual(playerList.players, [self.player1, self.player2])
+        self.assertEqual(playerCopy.players, [self.player1])
+
+    def testKeepPlayers(self):
+        """Test keeping only some of the players in the list."""
+        playerList = players.PlayerList([self.player1, self.player2,
+                                         self.player3])
+        playerList.keepPlayers([2, 0])
+
+        self.assertEqual(playerList.players, [self.player3, self.player1])
+
+    def testSortOrder(self):
+        """Test that sort orders are kept until the players change."""
+        playerList = players.PlayerList([self.player1, self.player2,
+                                         self.player3])
+        order = playerList.sortOrder(players.Skill.Skating)
+
+        self.assertEqual(order, [0, 2, 1])
+        self.assertEqual(playerList.sortOrder(), [0, 2, 1])
+        self.assertIs(playerList.sortOrder(players.Skill.Skating), order)
+
+        playerList.players = [self.player3, self.player2]
+        self.assertEqual(playerList.sortOrder(players.Skill.Skating), [0, 1])
+
+    def testSortOrderChangedInPlace(self):
+        """Test that sort orders are discarded when the list changes."""
+        playerList = players.PlayerList([self.player1, self.player2,
+                                         self.player3])
+        playerList.sortOrder(players.Skill.Checking)
+        playerList.players.pop(0)
+        self.assertEqual(playerList.sortOrder(players.Skill.Checking),
+                         [0, 1])
+
+        playerList.players.reverse()
+        playerList.invalidate()
+        self.assertEqual(playerList.sortOrder(players.Skill.Checking),
+                         [1, 0])
+
+    def testCopySharesSortOrders(self):
+        """Test that sort orders found for a copy are kept for the original."""
+        playerList = players.PlayerList([self.player1, self.player2,
+                                         self.player3])
+        playerCopy = playerList.copy()
+        order = playerCopy.sortOrder(players.Skill.Shooting)
+        playerCopy.keepPlayers([1, 2])
+
+        self.assertIs(playerList.sortOrder(players.Skill.Shooting), order)
+        self.assertEqual(playerCopy.sortOrder(players.Skill.Shooting),
+                         [0, 1])
+        self.assertEqual(order, [1, 0, 2])
+
+    def testKeepPlayersReducesSortOrders(self):
+        """Test that kept players keep their sort orders without sorting."""
+        playerList = players.PlayerList([self.player1, self.player2,
+                                         self.player3])
+        playerList.sortOrder(players.Skill.Skating)
+        playerList.keepPlayers([1, 2])
+
+        with patch.object(players.Player, "rating") as rating:
+            order = playerList.sortOrder(players.Skill.Skating)
+        rating.assert_not_called()
+        self.assertEqual(order, [1, 0])
+
+    def testRemovePlayer(self):
+        """Test that removed players are dropped and the rest kept in order."""
+        playerList = players.PlayerList([self.player1, self.player2,
+                                         self.player3])
+        playerList.removePlayer(self.player2)
+
+        self.assertNotIn(self.player2, playerList)
+        self.assertIn(self.player3, playerList)
+        self.assertEqual(playerList.players, [self.player1, self.player3])
+
+    def testRemovePlayerById(self):
+        """Test that a player is removed by id alone."""
+        playerList = players.PlayerList([self.player1, self.player2])
+        sameId = players.Player(self.player1._id, "Someone Else",
+                                self.skills2)
+        playerList.removePlayer(sameId)
+
+        self.assertEqual(playerList.players, [self.player2])
+
+    def testRemovePlayerMissing(self):
+        """Test that removing a player not in the list errors."""
+        playerList = players.PlayerList([self.player1, self.player2])
+        playerList.removePlayer(self.player1)
+
+        with self.assertRaises(ValueError):
+            playerList.removePlayer(self.player1)
+        with self.assertRaises(ValueError):
+            playerList.removePlayer(self.player3)
+
+    def testRemovePlayerKeepsSortOrders(self):
+        """Test that removing players reduces the kept sort orders."""
+        playerList = players.PlayerList([self.player1, self.player2,
+                                         self.player3])
+        playerList.sortOrder(players.Skill.Skating)
+        playerList.removePlayer(self.player3)
+        playerList.removePlayer(self.player1)
+
+        with patch.object(players.Player, "rating") as rating:
+            sortedPlayers = playerList.sortedPlayers(players.Skill.Skating)
+        rating.assert_not_called()
+        self.assertEqual(sortedPlayers, [self.player2])
+        self.assertIn(self.player2, playerList)
+
+
+@skipIf(players.numpy is None, "NumPy is not installed")
+class TestPlayerArray(TestCase):
+    """Tests for PlayerArray class."""
+
+    skills1 = {players.Skill.Skating: 50, players.Skill.Shooting: 90,
+               players.Skill.Checking: 99}
+    skills2 = {players.Skill.Skating: 99, players.Skill.Shooting: 85,
+               players.Skill.Checking: 80}
+    skills3 = {players.Skill.Skating: 90, players.Skill.Shooting: 85,
+               players.Skill.Checking: 90}
+    player1 = players.Player("123", "Ben Schreiber", skills1)
+    player2 = players.Player("99", "Wayne Gretzky", skills2)
+    player3 = players.Player("97", "Connor McDavid", skills3)
+
+    def testFromPlayers(self):
+        """Test that a PlayerArray stores ids, names and ratings."""
+        array = players.PlayerArray.fromPlayers([self.player1, self.player2])
+
+        self.assertEqual(len(array), 2)
+        self.assertEqual(list(array.ids), ["123", "99"])
+        self.assertEqual(list(array.names), ["Ben Schreiber",
+                                             "Wayne Gretzky"])
+        self.assertEqual(array.ratings.tolist(), [[50, 90, 99],
+                                                  [99, 85, 80]])
+
+    def testFromJSON(self):
+        """Test that a PlayerArray can be created from JSON data."""
+        array = players.PlayerArray.fromJSON(TESTJSON)
+
+        self.assertEqual(array.toPlayers(), [self.player1, self.player2])
+
+    def testColumn(self):
+        """Test getting the ratings for one skill."""
+        array = players.PlayerArray.fromPlayers([self.player1, self.player2])
+
+        self.assertEqual(array.column(players.Skill.Shooting).tolist(),
+                         [90, 85])
+
+    def testSortOrder(self):
+        """Test that sort orders are stable and ascending."""
+        array = players.PlayerArray.fromPlayers([self.player1, self.player2,
+                                                 self.player3])
+
+        self.assertEqual(array.sortOrder(players.Skill.Shooting).tolist(),
+                         [1, 2, 0])
+        self.assertEqual(array.sortOrder(players.Skill.Skating).tolist(),
+                         [0, 2, 1])
+
+    def testSquadTotals(self):
+        """Test summing skills for groups of players."""
+        array = players.PlayerArray.fromPlayers([self.player1, self.player2,
+                                                 self.player3])
+        totals = array.squadTotals([[0, 2], [1]])
+
+        self.assertEqual(totals.tolist(), [[140, 175, 189], [99, 85, 80]])
+
+    def testTake(self):
+        """Test getting a PlayerArray with a subset of players."""
+        array = players.PlayerArray.fromPlayers([self.player1, self.player2,
+                                                 self.player3])
+
+        self.assertEqual(array.take([2, 0]).toPlayers(),
+                         [self.player3, self.player1])
+        self.assertEqual(array.player(1), self.player2)
+
+    @patch("json.load", MagicMock(return_value=TESTJSON))
+    def testPlayerListFromJSONColumnar(self):
+        """Test that a columnar PlayerList sorts using its PlayerArray."""
+        with patch("builtins.open", mock_open()):
+            playerList = players.PlayerList.fromJSON("myJSONFile",
+                                                     columnar=True)
+
+        self.assertEqual(playerList.players, [self.player1, self.player2])
+        self.assertEqual(playerList.sortedPlayers(players.Skill.Skating),
+                         [self.player1, self.player2])
+        self.assertEqual(playerList.sortedPlayers(players.Skill.Checking),
+                         [self.player2, self.player1])
+
+    @patch("json.load", MagicMock(return_value=TESTJSON))
+    def testPlayerListColumnarReplaced(self):
+        """Test that replacing the players drops the old PlayerArray."""
+        with patch("builtins.open", mock_open()):
+            playerList = players.PlayerList.fromJSON("myJSONFile",
+                                                     columnar=True)
+        playerList.players = [self.player2]
+
+        self.assertIsNone(playerList.array)
+        self.assertEqual(playerList.sortedPlayers(players.Skill.Skating),
+                         [self.player2])
@@ -0,0 +1,165 @@
+"""Unittests for prefork module."""
+import gc
+import json
+import os
+import players
+import prefork
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from unittest import TestCase
+
+from cache import RosterCache
+
+EXAMPLEJSON = os.path.join(os.path.dirname(__file__), "..", "players.json")
+PREFORK = os.path.join(os.path.dirname(__file__), "..", "prefork.py")
+
+
+class TestPreload(TestCase):
+    """Tests for loading the roster in the parent process."""
+
+    def setUp(self):
+        """Copy the example roster to a temporary directory."""
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.fn = os.path.join(self.dir, "players.json")
+        shutil.copy(EXAMPLEJSON, self.fn)
+        self.roster = RosterCache(self.fn)
+        self.server = prefork.PreforkServer(None, self.roster)
+        self.addCleanup(gc.unfreeze)
+
+    def testPreloadSortOrders(self):
+        """Test preloading works out the sort orders shared by copies."""
+        fingerprint = self.server.preload()
+        playerList, cachedFingerprint = self.roster.load()
+
+        self.assertEqual(fingerprint, cachedFingerprint)
+        self.assertEqual(set(playerList._orders),
+                         set(players.Skill) | {None})
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    def testRosterChanged(self):
+        """Test a changed roster file is noticed."""
+        self.server.preload()
+        self.assertFalse(self.server.rosterChanged())
+
+        with open(self.fn) as f:
+            data = json.load(f)
+        data["players"] = data["players"][:5]
+        with open(self.fn, "w") as f:
+            json.dump(data, f)
+
+        self.assertTrue(self.server.rosterChanged())
+
+
+class TestPreforkServer(TestCase):
+    """Tests for running the pre-fork server in its own process."""
+
+    def setUp(self):
+        """Start a server with two workers on a free local port."""
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.fn = os.path.join(self.dir, "players.json")
+        shutil.copy(EXAMPLEJSON, self.fn)
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.path.dirname(os.path.abspath(PREFORK))
+        env.pop("SQUADROSTERDB", None)
+        env.pop("SQUADROSTERURL", None)
+        self.process = subprocess.Popen(
+            [sys.executable, PREFORK, "--host", "127.0.0.1", "--port", "0",
+             "--workers", "2", "--check-interval", "0.1"],
+            cwd=self.dir, env=env, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        self.addCleanup(self.stopServer)
+
+        self.lines = queue.Queue()
+        thread = threading.Thread(target=self.readLines)
+        thread.daemon = True
+        thread.start()
+        line = self.waitForLine("Listening on ")
+        self.url = line.split()[2]
+
+    def readLines(self):
+        """Pass each line the server writes to stderr to the test."""
+        with self.process.stderr:
+            for line in self.process.stderr:
+                self.lines.put(line)
+
+    def waitForLine(self, text, timeout=10):
+        """Wait for the server to write a line starting with some text."""
+        deadline = time.monotonic() + timeout
+        while(True):
+            line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+            if line.startswith(text):
+                return line
+
+    def stopServer(self):
+        """Stop the server and its workers if a test left them running."""
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def numPlayers(self):
+        """Get the number of players in the roster served by a worker."""
+        request = urllib.request.Request(
+            self.url + "/api/squads", data=b'{"numSquads": 2}',
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.load(response)["numPlayers"]
+
+    def testServe(self):
+        """Test the workers serve the webpage and the JSON API."""
+        with urllib.request.urlopen(self.url + "/", timeout=10) as response:
+            self.assertEqual(response.status, 200)
+        for _ in range(4):
+            self.assertEqual(self.numPlayers(), 40)
+
+    def testJobsRefused(self):
+        """Test background jobs are refused, as workers do not share them."""
+        request = urllib.request.Request(
+            self.url + "/api/jobs", data=b'{"numSquads": 2}',
+            headers={"Content-Type": "application/json"})
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(request, timeout=10)
+        self.assertEqual(context.exception.code, 503)
+        context.exception.close()
+
+    def testReloadOnRosterChange(self):
+        """Test the workers are replaced when the roster file changes."""
+        with open(self.fn) as f:
+            data = json.load(f)
+        data["players"] = data["players"][:5]
+        with open(self.fn, "w") as f:
+            json.dump(data, f)
+        self.waitForLine("Roster changed")
+
+        for _ in range(4):
+            self.assertEqual(self.numPlayers(), 5)
+
+    def testReloadOnHangup(self):
+        """Test SIGHUP replaces the workers without interrupting service."""
+        self.process.send_signal(signal.SIGHUP)
+        self.waitForLine("Reloading workers")
+
+        for _ in range(4):
+            self.assertEqual(self.numPlayers(), 40)
+
+    def testTerminate(self):
+        """Test SIGTERM stops the workers and the server cleanly."""
+        self.assertEqual(self.numPlayers(), 40)
+        self.process.send_signal(signal.SIGTERM)
+
+        self.assertEqual(self.process.wait(timeout=10), 0)
@@ -0,0 +1,58 @@
+"""Unittests for render module."""
+import render
+
+from unittest import TestCase
+
+from players import COLUMNS, EMPTYMESSAGE, Player, PlayerList
+from squads import Squad
+from test.test_balancing import makePlayers
+
+
+class TestRenderTable(TestCase):
+    """Tests for rendering tables of players."""
+
+    def testRenderTable(self):
+        """Test rendering a table of players."""
+        players = [Player("123", "Ben Schreiber", (50, 90, 99))]
+        expectedHTML = ('<table align="center" class="playerList">\n'
+                        '<thead><tr><th>Name</th><th>Skating</th>'
+                        '<th>Shooting</th><th>Checking</th></tr>'
+                        '</thead>\n<tbody>\n<tr class="playerRow">'
+                        '<td>Ben Schreiber</td><td>50</td><td>90</td>'
+                        '<td>99</td></tr>\n</tbody>\n</table>')
+
+        self.assertEqual(render.renderTable(players, COLUMNS, EMPTYMESSAGE),
+                         expectedHTML)
+
+    def testRenderTableEmpty(self):
+        """Test that an empty table is shown as the empty message."""
+        self.assertEqual(render.renderTable([], COLUMNS, "None <here>"),
+                         "<p>None &lt;here&gt;</p>")
+
+    def testRenderTableEscapesNames(self):
+        """Test that player names are escaped."""
+        players = [Player("1", "A & \"B\" 'c' <d>", (1, 2, 3))]
+        html = render.renderTable(players, COLUMNS, EMPTYMESSAGE)
+
+        self.assertIn("<td>A &amp; &#34;B&#34; &#39;c&#39; &lt;d&gt;</td>",
+                      html)
+
+    def testIterTable(self):
+        """Test that the streamed fragments join to the rendered table."""
+        players = makePlayers(5)
+
+        self.assertEqual(''.join(render.iterTable(players, COLUMNS, "")),
+                         render.renderTable(players, COLUMNS, ""))
+
+    def testMatchesFlaskTable(self):
+        """Test that player lists render the same as with Flask-Table."""
+        players = makePlayers(30) + [Player("x", "<b>Bold & Co</b>",
+                                            (1, 2, 3))]
+        for playerList in [PlayerList(players), PlayerList([])]:
+            self.assertEqual(playerList.toHTML(),
+                             playerList.table.__html__())
+
+    def testMatchesFlaskTableSquad(self):
+        """Test that squads render the same as with Flask-Table."""
+        for squad in [Squad(1, makePlayers(7)), Squad(2, [])]:
+            self.assertEqual(squad.toHTML(), squad.table.__html__())
@@ -0,0 +1,290 @@
+"""Unittests for rosterclient module."""
+import hashlib
+import json
+import os
+import players
+import rosterclient
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from urllib.parse import parse_qs, urlsplit
+
+from cache import rosterFingerprint
+
+EXAMPLEJSON = os.path.join(os.path.dirname(__file__), "..", "players.json")
+
+
+class RosterHandler(BaseHTTPRequestHandler):
+    """Stand-in for the registration team's paginated roster endpoint."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """Serve a page of the roster, or 304 if it is unchanged."""
+        server = self.server
+        if server.failWith is not None:
+            self.send_error(server.failWith)
+            return
+        query = parse_qs(urlsplit(self.path).query)
+        page = int(query["page"][0])
+        with server.lock:
+            failing = page in server.failPages
+            server.failPages.discard(page)
+        if failing:
+            self.send_error(500)
+            return
+        pageSize = int(query["pageSize"][0])
+        roster = server.roster
+        numPages = max(1, -(-len(roster) // pageSize))
+        body = json.dumps({"players": roster[(page - 1) * pageSize:
+                                             page * pageSize],
+                           "page": page}).encode("utf-8")
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        with server.lock:
+            server.requests.append((page, self.headers.get("If-None-Match")))
+            server.connections.add(id(self.connection))
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header(rosterclient.PAGESHEADER, str(numPages))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header(rosterclient.PAGESHEADER, str(numPages))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep the test output quiet."""
+
+
+class TestRosterClient(TestCase):
+    """Tests for fetching rosters from a REST endpoint."""
+
+    def setUp(self):
+        """Start a roster server on a free local port."""
+        with open(EXAMPLEJSON) as f:
+            self.data = json.load(f)["players"]
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RosterHandler)
+        self.server.daemon_threads = True
+        self.server.roster = self.data
+        self.server.requests = []
+        self.server.connections = set()
+        self.server.failWith = None
+        self.server.failPages = set()
+        self.server.lock = threading.Lock()
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = "http://127.0.0.1:%d/api/players" % (
+            self.server.server_address[1])
+
+    def makeClient(self, **kwargs):
+        """Create a client for the test server, closed after the test."""
+        client = rosterclient.RosterClient(self.url, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def testFetchAllPages(self):
+        """Test the players of every page are fetched in order."""
+        client = self.makeClient(pageSize=7, workers=3)
+        fetched, changed = client.fetchPlayers()
+        expected = [players.Player.fromJSON(data) for data in self.data]
+
+        self.assertTrue(changed)
+        self.assertEqual(fetched, expected)
+        self.assertEqual([p.name for p in fetched],
+                         [p.name for p in expected])
+        self.assertEqual(sorted(page for page, _ in self.server.requests),
+                         list(range(1, -(-len(self.data) // 7) + 1)))
+
+    def testSinglePage(self):
+        """Test a roster fitting in one page is fetched with one request."""
+        client = self.makeClient(pageSize=1000)
+        fetched, _ = client.fetchPlayers()
+
+        self.assertEqual(len(fetched), len(self.data))
+        self.assertEqual(self.server.requests, [(1, None)])
+
+    def testEmptyRoster(self):
+        """Test an empty roster gives no players."""
+        self.server.roster = []
+        client = self.makeClient(pageSize=10)
+
+        self.assertEqual(client.fetchPlayers(), ([], True))
+
+    def testConnectionsReused(self):
+        """Test pages are fetched over no more connections than workers."""
+        client = self.makeClient(pageSize=2, workers=2)
+        client.fetchPlayers()
+        client.fetchPlayers()
+
+        self.assertGreater(len(self.server.requests), 20)
+        self.assertLessEqual(client.pool.created, 2)
+        self.assertLessEqual(len(self.server.connections), 2)
+
+    def testRevalidateUnchanged(self):
+        """Test an unchanged roster is revalidated, not downloaded."""
+        client = self.makeClient(pageSize=10)
+        first, _ = client.fetchPlayers()
+        numPages = len(self.server.requests)
+        del self.server.requests[:]
+        second, changed = client.fetchPlayers()
+
+        self.assertFalse(changed)
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.server.requests), numPages)
+        self.assertTrue(all(etag is not None
+                            for _, etag in self.server.requests))
+
+    def testRevalidateChangedPage(self):
+        """Test only a changed page is downloaded again."""
+        client = self.makeClient(pageSize=10)
+        client.fetchPlayers()
+        self.server.roster = [dict(data) for data in self.data]
+        self.server.roster[15]["firstName"] = "Changed"
+        fetched, changed = client.fetchPlayers()
+
+        self.assertTrue(changed)
+        self.assertEqual(fetched[15].name.split()[0], "Changed")
+        self.assertEqual(fetched[:15], [players.Player.fromJSON(data)
+                                        for data in self.data[:15]])
+
+    def testRosterShrinks(self):
+        """Test pages past the end of a shrunken roster are forgotten."""
+        client = self.makeClient(pageSize=10)
+        client.fetchPlayers()
+        self.server.roster = self.data[:10]
+        fetched, changed = client.fetchPlayers()
+
+        self.assertTrue(changed)
+        self.assertEqual(len(fetched), 10)
+        self.assertEqual(sorted(client._pages), [1])
+
+    def testFailedPageRefetched(self):
+        """Test pages fetched before a failed page are not kept."""
+        client = self.makeClient(pageSize=10, workers=1)
+        client.fetchPlayers()
+        self.server.roster = [dict(data) for data in self.data]
+        self.server.roster[15]["firstName"] = "Changed"
+        self.server.failPages.add(3)
+
+        with self.assertRaises(rosterclient.RosterFetchError):
+            client.fetchPlayers()
+        fetched, changed = client.fetchPlayers()
+
+        self.assertTrue(changed)
+        self.assertEqual(fetched[15].name.split()[0], "Changed")
+
+    def testErrorStatus(self):
+        """Test an error response raises a RosterFetchError."""
+        client = self.makeClient(pageSize=10)
+        self.server.failWith = 500
+
+        with self.assertRaises(rosterclient.RosterFetchError):
+            client.fetchPlayers()
+
+    def testUnsupportedScheme(self):
+        """Test a URL other than http or https is refused."""
+        with self.assertRaises(ValueError):
+            rosterclient.RosterClient("ftp://localhost/players")
+
+    def testLoadCachesRoster(self):
+        """Test load uses the roster until it is older than maxAge."""
+        client = self.makeClient(pageSize=10, maxAge=60)
+        roster, fingerprint = client.load()
+        numRequests = len(self.server.requests)
+        again, againFingerprint = client.load()
+
+        self.assertEqual(again.players, roster.players)
+        self.assertIsNot(again.players, roster.players)
+        self.assertEqual(againFingerprint, fingerprint)
+        self.assertEqual(fingerprint, rosterFingerprint(roster.players))
+        self.assertEqual(len(self.server.requests), numRequests)
+        self.assertEqual(client.stats(),
+                         {"hits": 1, "misses": 1, "revalidations": 0,
+                          "errors": 0})
+
+    def testLoadRevalidates(self):
+        """Test load revalidates an expired roster and keeps it if same."""
+        client = self.makeClient(pageSize=10, maxAge=0)
+        _, fingerprint = client.load()
+        _, againFingerprint = client.load()
+
+        self.assertEqual(againFingerprint, fingerprint)
+        self.assertEqual(client.stats(),
+                         {"hits": 0, "misses": 1, "revalidations": 1,
+                          "errors": 0})
+
+    def testLoadServesStaleOnError(self):
+        """Test load keeps the last roster if revalidating it fails."""
+        client = self.makeClient(pageSize=10, maxAge=0)
+        roster, fingerprint = client.load()
+        self.server.failWith = 500
+        stale, staleFingerprint = client.load()
+
+        self.assertEqual(stale.players, roster.players)
+        self.assertEqual(staleFingerprint, fingerprint)
+        self.assertEqual(client.stats()["errors"], 1)
+
+        self.server.failWith = None
+        self.server.failPages = set()
+        self.server.roster = self.data[:10]
+        fresh, _ = client.load()
+        self.assertEqual(len(fresh.players), 10)
+
+    def testLoadAfterFailedPage(self):
+        """Test a change missed by a failed revalidation is still loaded."""
+        client = self.makeClient(pageSize=10, maxAge=0)
+        client.load()
+        self.server.roster = [dict(data) for data in self.data]
+        self.server.roster[15]["firstName"] = "Changed"
+        self.server.failPages.add(3)
+        client.load()
+        roster, _ = client.load()
+
+        self.assertEqual(roster.players[15].name.split()[0], "Changed")
+        self.assertEqual(client.stats()["errors"], 1)
+
+    def testLoadErrorWithoutRoster(self):
+        """Test load raises if the roster has never been fetched."""
+        client = self.makeClient(pageSize=10)
+        self.server.failWith = 500
+
+        with self.assertRaises(rosterclient.RosterFetchError):
+            client.load()
+        self.assertEqual(client.stats()["errors"], 1)
+
+    def testLoadDuringRevalidation(self):
+        """Test load serves the last roster while another revalidates."""
+        client = self.makeClient(pageSize=10, maxAge=0)
+        roster, _ = client.load()
+        client._refreshLock.acquire()
+        self.addCleanup(client._refreshLock.release)
+        del self.server.requests[:]
+        again, _ = client.load()
+
+        self.assertEqual(again.players, roster.players)
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(client.stats()["hits"], 1)
+
+    def testClear(self):
+        """Test a cleared client downloads the roster again."""
+        client = self.makeClient(pageSize=10, maxAge=60)
+        client.get()
+        client.clear()
+        del self.server.requests[:]
+        client.get()
+
+        self.assertTrue(all(etag is None
+                            for _, etag in self.server.requests))
+        self.assertEqual(client.stats()["misses"], 2)
@@ -0,0 +1,106 @@
+"""Unittests for rosterstore module."""
+import json
+import os
+import players
+import rosterstore
+import shutil
+import squads
+import tempfile
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from cache import RosterCache
+from test.test_players import TESTJSON
+
+EXAMPLEJSON = os.path.join(os.path.dirname(__file__), "..", "players.json")
+
+
+class TestRosterStore(TestCase):
+    """Tests for storing and loading rosters in SQLite."""
+
+    skills1 = {players.Skill.Skating: 50, players.Skill.Shooting: 90,
+               players.Skill.Checking: 99}
+    skills2 = {players.Skill.Skating: 99, players.Skill.Shooting: 85,
+               players.Skill.Checking: 80}
+    player1 = players.Player("123", "Ben Schreiber", skills1)
+    player2 = players.Player("99", "Wayne Gretzky", skills2)
+
+    def setUp(self):
+        """Create a roster store in a temporary directory."""
+        self.dir = tempfile.mkdtemp()
+        self.jsonFn = os.path.join(self.dir, "players.json")
+        self.dbFn = os.path.join(self.dir, "roster.db")
+        with open(self.jsonFn, "w") as f:
+            json.dump(TESTJSON, f)
+        self.store = rosterstore.RosterStore(self.dbFn)
+
+    def tearDown(self):
+        """Close the store and remove the temporary directory."""
+        self.store.close()
+        shutil.rmtree(self.dir)
+
+    def testImportJSON(self):
+        """Test that imported players are loaded in the same order."""
+        count = self.store.importJSON(self.jsonFn)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(self.store.players(), [self.player1, self.player2])
+
+    def testSeasons(self):
+        """Test that each season keeps its own roster."""
+        self.store.importJSON(self.jsonFn, "2023")
+        self.store.importPlayers([self.player2], "2024")
+
+        self.assertEqual(self.store.seasons(), ["2023", "2024"])
+        self.assertEqual(self.store.players("2024"), [self.player2])
+        self.assertEqual(self.store.players(), [])
+
+        self.store.deleteSeason("2023")
+        self.assertEqual(self.store.seasons(), ["2024"])
+
+    def testImportReplacesSeason(self):
+        """Test that importing a season again replaces its roster."""
+        self.store.importJSON(self.jsonFn)
+        self.store.importPlayers([self.player2])
+
+        self.assertEqual(self.store.players(), [self.player2])
+
+    def testSortedPlayers(self):
+        """Test that the database sorts players the same as a PlayerList."""
+        self.store.importJSON(EXAMPLEJSON)
+        playerList = players.PlayerList.fromJSON(EXAMPLEJSON)
+
+        for sortSkill in list(players.Skill) + [None]:
+            self.assertEqual(self.store.sortedPlayers(sortSkill),
+                             playerList.sortedPlayers(sortSkill))
+            self.assertEqual(self.store.sortOrder(sortSkill),
+                             playerList.sortOrder(sortSkill))
+
+    def testLoadPlayerList(self):
+        """Test that a loaded PlayerList does not sort its players."""
+        self.store.importJSON(EXAMPLEJSON)
+        playerList = rosterstore.loadPlayerList(self.dbFn)
+        expected = players.PlayerList.fromJSON(EXAMPLEJSON)
+        expectedSorted = expected.sortedPlayers(players.Skill.Skating)
+        expectedSquads = squads.getBalancedSquads(3, expected)
+
+        with patch.object(players.Player, "rating") as rating:
+            sortedPlayers = playerList.sortedPlayers(players.Skill.Skating)
+        rating.assert_not_called()
+        self.assertEqual(sortedPlayers, expectedSorted)
+        self.assertEqual(squads.getBalancedSquads(3, playerList),
+                         expectedSquads)
+
+    def testRosterCacheLoader(self):
+        """Test that a roster cache reloads the store when it changes."""
+        self.store.importJSON(self.jsonFn)
+        rosterCache = RosterCache(self.dbFn,
+                                  loader=rosterstore.loadPlayerList)
+
+        self.assertEqual(rosterCache.get().players,
+                         [self.player1, self.player2])
+        self.store.importPlayers([self.player2])
+        stat = os.stat(self.dbFn)
+        os.utime(self.dbFn, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(rosterCache.get().players, [self.player2])
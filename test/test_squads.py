@@ -3,7 +3,8 @@ import squads
 
 from unittest import TestCase
 
-from players import Player, PlayerList, Skill
+from players import Player, PlayerArray, PlayerList, Skill
+from test.test_balancing import makePlayers
 
 
 class TestSquad(TestCase):
@@ -204,6 +205,55 @@ class TestSquad(TestCase):
         squad = squads.Squad(1, players)
         self.assertEqual(squad.averagePlayer, expectedAvgPlayer)
 
+    def testAddPlayer(self):
+        """Test that adding a player updates the squad totals."""
+        skills1 = {Skill.Skating: 50, Skill.Shooting: 40,
+                   Skill.Checking: 60}
+        skills2 = {Skill.Skating: 99, Skill.Shooting: 98,
+                   Skill.Checking: 97}
+        player1 = Player("123", "Ben Schreiber", skills1)
+        player2 = Player("99", "Wayne Gretzky", skills2)
+
+        squad = squads.Squad(1, [player1])
+        squad.addPlayer(player2)
+        self.assertEqual(squad.players, [player1, player2])
+        self.assertEqual(squad.skating, 149)
+        self.assertEqual(squad.shooting, 138)
+        self.assertEqual(squad.checking, 157)
+        self.assertEqual(squad.averageSkating, 74)
+
+    def testRemovePlayer(self):
+        """Test that removing a player updates the squad totals."""
+        skills1 = {Skill.Skating: 50, Skill.Shooting: 40,
+                   Skill.Checking: 60}
+        skills2 = {Skill.Skating: 99, Skill.Shooting: 98,
+                   Skill.Checking: 97}
+        player1 = Player("123", "Ben Schreiber", skills1)
+        player2 = Player("99", "Wayne Gretzky", skills2)
+
+        squad = squads.Squad(1, [player1, player2])
+        squad.removePlayer(player1)
+        self.assertEqual(squad.players, [player2])
+        self.assertEqual(squad.skating, 99)
+        self.assertEqual(squad.shooting, 98)
+        self.assertEqual(squad.checking, 97)
+
+    def testSetPlayers(self):
+        """Test that reassigning the players recalculates the totals."""
+        skills1 = {Skill.Skating: 50, Skill.Shooting: 40,
+                   Skill.Checking: 60}
+        skills2 = {Skill.Skating: 99, Skill.Shooting: 98,
+                   Skill.Checking: 97}
+        player1 = Player("123", "Ben Schreiber", skills1)
+        player2 = Player("99", "Wayne Gretzky", skills2)
+
+        squad = squads.Squad(1, [player1])
+        squad.players = [player2]
+        self.assertEqual(squad.skating, 99)
+        squad.players = []
+        self.assertEqual(squad.skating, 0)
+        self.assertEqual(squad.averageSkating, 0)
+
     def testToHTML(self):
         """
         Test outputting a squad to an HTML table.
@@ -374,6 +424,269 @@ class TestGetBalancedSquads(TestCase):
         with self.assertRaises(ValueError):
             squads.getBalancedSquads(numSquads, playerList)
 
+    def testGetBalancedSquads__Refine(self):
+        """Test that refining squads swaps players to improve balance."""
+        skills5 = {Skill.Skating: 60, Skill.Shooting: 60,
+                   Skill.Checking: 60}
+        skills6 = {Skill.Skating: 10, Skill.Shooting: 90,
+                   Skill.Checking: 10}
+        player5 = Player("5", "Fifth Player", skills5)
+        player6 = Player("6", "Sixth Player", skills6)
+        myPlayers = [self.player1, self.player2, self.player3,
+                     self.player4, player5, player6]
+
+        greedySquads = squads.getBalancedSquads(2, PlayerList(
+            list(myPlayers)))
+        balSquads = squads.getBalancedSquads(2, PlayerList(list(myPlayers)),
+                                             refine=True)
+
+        greedyTotals = [(s.skating, s.shooting, s.checking)
+                        for s in greedySquads]
+        refinedTotals = [(s.skating, s.shooting, s.checking)
+                         for s in balSquads]
+        self.assertLessEqual(
+            sum(t ** 2 for totals in refinedTotals for t in totals),
+            sum(t ** 2 for totals in greedyTotals for t in totals))
+        self.assertEqual(sorted(p._id for s in balSquads for p in s.players),
+                         sorted(p._id for p in myPlayers))
+
+    def testGetBalancedSquads__MultiStart(self):
+        """Test that multi-start balancing assigns every player."""
+        myPlayers = [self.player1, self.player2, self.player3, self.player4]
+        playerList = PlayerList(list(myPlayers))
+
+        balSquads = squads.getBalancedSquads(2, playerList,
+                                             method=squads.MULTISTART,
+                                             starts=3, workers=1)
+
+        self.assertEqual(sorted(p._id for s in balSquads for p in s.players),
+                         sorted(p._id for p in myPlayers))
+        self.assertEqual(playerList.players, [])
+
+    def testGetBalancedSquads__Optimal(self):
+        """Test that optimal balancing is no worse than the greedy."""
+        myPlayers = [self.player1, self.player2, self.player3, self.player4]
+
+        greedySquads = squads.getBalancedSquads(2, PlayerList(list(myPlayers)))
+        playerList = PlayerList(list(myPlayers))
+        balSquads = squads.getBalancedSquads(2, playerList,
+                                             method=squads.OPTIMAL)
+
+        def spread(squadList):
+            return sum(max(totals) - min(totals) for totals in
+                       zip(*[(s.skating, s.shooting, s.checking)
+                             for s in squadList]))
+        self.assertLessEqual(spread(balSquads), spread(greedySquads))
+        self.assertEqual([s.squadNum for s in balSquads], [1, 2])
+        self.assertEqual(sorted(p._id for s in balSquads for p in s.players),
+                         sorted(p._id for p in myPlayers))
+        self.assertEqual(playerList.players, [])
+
+    def testGetBalancedSquads__Differencing(self):
+        """Test that differencing balancing assigns the strongest players."""
+        myPlayers = [self.player1, self.player2, self.player3, self.player4]
+        playerList = PlayerList(list(myPlayers))
+
+        balSquads = squads.getBalancedSquads(2, playerList,
+                                             method=squads.DIFFERENCING)
+
+        self.assertEqual([s.squadNum for s in balSquads], [1, 2])
+        self.assertEqual(sorted(p._id for s in balSquads for p in s.players),
+                         sorted(p._id for p in myPlayers))
+        self.assertEqual(playerList.players, [])
+
+    def testGetBalancedSquadsRaisesValueError__UnknownMethod(self):
+        """Test balancing errors when given an unknown method."""
+        playerList = PlayerList([self.player1,
+                                 self.player2,
+                                 self.player3,
+                                 self.player4])
+
+        with self.assertRaises(ValueError):
+            squads.getBalancedSquads(2, playerList, method="unknown")
+
+    def testGetBalancedSquads__Columnar(self):
+        """Test that a columnar player list balances to the same squads."""
+        myPlayers = [self.player1, self.player2, self.player3, self.player4]
+        try:
+            array = PlayerArray.fromPlayers(myPlayers)
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+        playerList = PlayerList(list(myPlayers), array=array)
+
+        expectedSquads = [squads.Squad(2, [self.player2, self.player3]),
+                          squads.Squad(1, [self.player1, self.player4])]
+
+        balSquads = squads.getBalancedSquads(2, playerList)
+
+        self.assertEqual(balSquads, expectedSquads)
+        self.assertEqual(len(playerList.array), 0)
+
+    def testGetBalancedSquads__ColumnarRemoved(self):
+        """Test that removed players are left out of a columnar list."""
+        myPlayers = makePlayers(41, seed=8)
+        try:
+            array = PlayerArray.fromPlayers(myPlayers)
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+        playerList = PlayerList(list(myPlayers), array=array)
+        removed = myPlayers[0]
+        playerList.removePlayer(removed)
+
+        expected = squads.getBalancedSquads(4, PlayerList(myPlayers[1:]))
+        balSquads = squads.getBalancedSquads(4, playerList)
+
+        self.assertEqual(balSquads, expected)
+        self.assertFalse(any(removed in s.players for s in balSquads))
+        self.assertNotIn(removed, playerList)
+        self.assertEqual(len(playerList.array), len(playerList.players))
+
+
+class TestRebalanceSquads(TestCase):
+    """Tests for repairing squads after players join or leave."""
+
+    def setUp(self):
+        """Balance 40 players into 6 squads, leaving 4 waiting."""
+        self.players = makePlayers(40, seed=2)
+        self.waitingList = PlayerList(list(self.players))
+        self.squads = squads.getBalancedSquads(6, self.waitingList)
+
+    def assertSizes(self, squadSize, numWaiting):
+        """Check the size of every squad and of the waiting list."""
+        self.assertEqual([len(s.players) for s in self.squads],
+                         [squadSize] * 6)
+        self.assertEqual(len(self.waitingList.players), numWaiting)
+
+    def testRemovedFromSquad(self):
+        """Test that a player leaving a squad is replaced from the list."""
+        leaving = self.squads[2].players[0]
+        before = [list(s.players) for s in self.squads]
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList,
+                                       removed=[leaving], maxSwaps=0)
+
+        self.assertEqual(len(moves), 1)
+        player, source, target = moves[0]
+        self.assertEqual((source, target), (None, self.squads[2].squadNum))
+        self.assertIn(player, self.squads[2].players)
+        self.assertNotIn(leaving, self.squads[2].players)
+        self.assertEqual([list(s.players) for i, s in enumerate(self.squads)
+                          if i != 2], before[:2] + before[3:])
+        self.assertSizes(6, 3)
+
+    def testRemovedFromWaitingList(self):
+        """Test that a player leaving the waiting list moves nobody."""
+        leaving = self.waitingList.players[0]
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList,
+                                       removed=[leaving])
+
+        self.assertEqual(moves, [])
+        self.assertNotIn(leaving, self.waitingList.players)
+        self.assertSizes(6, 3)
+
+    def testAddedFillsNewPlaces(self):
+        """Test that enough new players give every squad another place."""
+        added = makePlayers(2, seed=9)
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList,
+                                       added=added)
+
+        self.assertEqual(len(moves), 6)
+        self.assertEqual(sorted(m[2] for m in moves), list(range(1, 7)))
+        self.assertSizes(7, 0)
+
+    def testAddedWaits(self):
+        """Test that too few new players for another place just wait."""
+        added = makePlayers(1, seed=9)
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList,
+                                       added=added)
+
+        self.assertEqual(moves, [])
+        self.assertIn(added[0], self.waitingList.players)
+        self.assertSizes(6, 5)
+
+    def testRemovedFromFullSquads(self):
+        """Test that a squad one player short is left as it is."""
+        self.waitingList = PlayerList(list(self.players))
+        self.squads = squads.getBalancedSquads(4, self.waitingList)
+        leaving = self.squads[0].players[0]
+        before = [list(s.players) for s in self.squads[1:]]
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList,
+                                       removed=[leaving], maxSwaps=0)
+
+        self.assertEqual(moves, [])
+        self.assertEqual([len(s.players) for s in self.squads],
+                         [9, 10, 10, 10])
+        self.assertEqual([list(s.players) for s in self.squads[1:]], before)
+        self.assertEqual(self.waitingList.players, [])
+
+    def testRemovedShrinksSquads(self):
+        """Test that a squad two players short takes one from another."""
+        removed = self.waitingList.players + self.squads[0].players[:2]
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList,
+                                       removed=removed, maxSwaps=0)
+
+        self.assertEqual(len(moves), 1)
+        player, source, target = moves[0]
+        self.assertIn(source, [s.squadNum for s in self.squads[1:]])
+        self.assertEqual(target, self.squads[0].squadNum)
+        self.assertIn(player, self.squads[0].players)
+        self.assertEqual(sorted(len(s.players) for s in self.squads),
+                         [5, 5, 6, 6, 6, 6])
+        self.assertEqual(self.waitingList.players, [])
+
+    def testOversizedSquadShrinks(self):
+        """Test that a squad two players over gives one up."""
+        extra = self.waitingList.players[:2]
+        for player in extra:
+            self.squads[1].addPlayer(player)
+        waiting = self.waitingList.players[2:]
+        self.waitingList.players = waiting
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList)
+
+        self.assertEqual([(source, target) for _, source, target in moves],
+                         [(self.squads[1].squadNum, None)])
+        self.assertEqual([len(s.players) for s in self.squads],
+                         [6, 7, 6, 6, 6, 6])
+        self.assertEqual(len(self.waitingList.players), 3)
+
+    def testRestoresBalance(self):
+        """Test that losing a strong player is made up for with swaps."""
+        self.waitingList = PlayerList(list(self.players))
+        self.squads = squads.getBalancedSquads(4, self.waitingList)
+        spread = squads._squadSpread(self.squads)
+        leaving = max(self.squads[0].players, key=lambda p: sum(p.ratings))
+        squadNum = self.squads[0].squadNum
+
+        moves = squads.rebalanceSquads(self.squads, self.waitingList,
+                                       removed=[leaving])
+
+        self.assertLessEqual(squads._squadSpread(self.squads), spread)
+        self.assertLessEqual(len(moves), 2 * squads.REBALANCESWAPS)
+        self.assertTrue(all(squadNum in (source, target)
+                            for _, source, target in moves))
+        self.assertEqual([len(s.players) for s in self.squads],
+                         [9, 10, 10, 10])
+        for player, _, target in moves:
+            squad = next(s for s in self.squads if s.squadNum == target)
+            self.assertIn(player, squad.players)
+
+    def testNoSquads(self):
+        """Test that rebalancing errors without any squads."""
+        with self.assertRaises(ValueError):
+            squads.rebalanceSquads([], self.waitingList)
+
+    def testRemovedTooMany(self):
+        """Test that rebalancing errors with fewer players than squads."""
+        with self.assertRaises(ValueError):
+            squads.rebalanceSquads(self.squads, self.waitingList,
+                                   removed=self.players[:36])
+
 
 class TestGetSquadWithLowestSkill(TestCase):
     """Tests for getting the squad with the lowest average skill."""
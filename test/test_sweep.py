@@ -0,0 +1,67 @@
+"""Unittests for sweep module."""
+import balancing
+import squads
+import sweep
+
+from unittest import TestCase
+
+from players import PlayerList
+from test.test_balancing import makePlayers
+
+
+class TestSweepAssign(TestCase):
+    """Tests for sweepAssign function."""
+
+    ratings = balancing.getRatings(makePlayers(30, seed=21))
+    orders = balancing.getSortOrders(ratings)
+
+    def testSweepAssign(self):
+        """Test that each count matches assigning it on its own."""
+        results = sweep.sweepAssign(self.ratings, self.orders, [2, 3, 4],
+                                    workers=1)
+
+        self.assertEqual(sorted(results), [2, 3, 4])
+        for numSquads, (assignment, spread) in results.items():
+            self.assertEqual(assignment,
+                             squads.assignSquads(numSquads, self.ratings))
+            self.assertEqual(spread,
+                             balancing.getSpread(assignment, self.ratings))
+
+    def testSweepAssignParallel(self):
+        """Test that worker processes give the same results."""
+        expected = sweep.sweepAssign(self.ratings, self.orders, [2, 5, 7],
+                                     workers=1)
+        results = sweep.sweepAssign(self.ratings, self.orders, [2, 5, 7],
+                                    workers=2)
+
+        self.assertEqual(results, expected)
+
+
+class TestSweepSquads(TestCase):
+    """Tests for sweepSquads function."""
+
+    players = makePlayers(20, seed=22)
+
+    def testSweepSquads(self):
+        """Test that the sweep matches getBalancedSquads for each count."""
+        playerList = PlayerList(list(self.players))
+        results = sweep.sweepSquads(playerList, 6, workers=1)
+
+        self.assertEqual([r["numSquads"] for r in results],
+                         [2, 3, 4, 5, 6])
+        for result in results:
+            expectedList = PlayerList(list(self.players))
+            expected = squads.getBalancedSquads(result["numSquads"],
+                                                expectedList)
+            self.assertEqual(result["squads"], expected)
+            self.assertEqual(result["waitingList"], expectedList.players)
+        self.assertEqual(playerList.players, self.players)
+
+    def testSweepSquadsInvalidRange(self):
+        """Test that sweeping past the number of players raises an error."""
+        playerList = PlayerList(list(self.players))
+
+        with self.assertRaises(ValueError):
+            sweep.sweepSquads(playerList, 21)
+        with self.assertRaises(ValueError):
+            sweep.sweepSquads(playerList, 3, minSquads=0)
@@ -0,0 +1,91 @@
+"""Unittests for timing module."""
+import timing
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from players import PlayerList
+from squads import getBalancedSquads
+from test.test_app import EXAMPLEJSON
+
+
+class TestTiming(TestCase):
+    """Tests for timing spans and the metrics registry."""
+
+    def setUp(self):
+        """Enable timing with a fresh registry for each test."""
+        patcher = patch.object(timing, "metrics", timing.Metrics())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        timing.enable()
+        self.addCleanup(timing.disable)
+
+    def testSpanDisabled(self):
+        """Test that nothing is recorded while timing is disabled."""
+        timing.disable()
+        with timing.span("test"):
+            pass
+
+        self.assertIs(timing.span("test"), timing.NULLSPAN)
+        self.assertEqual(timing.metrics.snapshot(), {})
+
+    def testSpanRecorded(self):
+        """Test that each span is counted and timed."""
+        for _ in range(3):
+            with timing.span("test"):
+                pass
+
+        snapshot = timing.metrics.snapshot()["test"]
+        self.assertEqual(snapshot["count"], 3)
+        self.assertGreaterEqual(snapshot["total"], 0)
+        self.assertEqual(sum(n for _, n in snapshot["histogram"]), 3)
+
+    def testSpanRecordedOnError(self):
+        """Test that a span is recorded when its block raises an error."""
+        with self.assertRaises(ValueError):
+            with timing.span("test"):
+                raise ValueError
+
+        self.assertEqual(timing.metrics.snapshot()["test"]["count"], 1)
+
+    def testHistogram(self):
+        """Test that times are counted in the bucket bounding them."""
+        metrics = timing.Metrics(buckets=(0.1, 1.0, float("inf")))
+        for seconds in [0.05, 0.1, 0.5, 2.0, 3.0]:
+            metrics.record("test", seconds)
+
+        self.assertEqual(metrics.snapshot()["test"]["histogram"],
+                         [["0.1", 2], ["1.0", 1], ["inf", 2]])
+        self.assertAlmostEqual(metrics.snapshot()["test"]["total"], 5.65)
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {})
+
+    def testRequestSpans(self):
+        """Test that spans are collected only while a request is active."""
+        with timing.span("before"):
+            pass
+        token = timing.startRequest()
+        with timing.span("during"):
+            pass
+        spans = timing.requestSpans()
+        timing.finishRequest(token)
+
+        self.assertEqual([name for name, _ in spans], ["during"])
+        self.assertEqual(timing.requestSpans(), [])
+
+    def testServerTiming(self):
+        """Test that spans with the same name are combined in the header."""
+        spans = [("sort", 0.001), ("toHTML", 0.0005), ("toHTML", 0.0015)]
+
+        self.assertEqual(timing.serverTiming(spans),
+                         "sort;dur=1.000, toHTML;dur=2.000")
+
+    def testBalancingPhases(self):
+        """Test that each phase of loading and balancing squads is timed."""
+        playerList = PlayerList.fromJSON(EXAMPLEJSON)
+        squads = getBalancedSquads(3, playerList, refine=True)
+        squads[0].toHTML()
+
+        self.assertEqual(set(timing.metrics.snapshot()),
+                         {"fromJSON", "sort", "pick", "refine", "toHTML"})
@@ -0,0 +1,149 @@
+"""Lightweight timing instrumentation for Hockey Squad Builder.
+
+Named spans time the phases of loading, balancing and rendering squads.
+Each finished span is recorded in a process-wide metrics registry, and in
+the list of spans for the current request when one is being collected, so
+they can be sent back in a Server-Timing header.
+
+Timing is disabled by default, in which case span returns a shared context
+manager that does nothing, so instrumented code costs almost nothing.
+"""
+import threading
+import time
+
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+# Upper bounds in seconds of the buckets of each span's histogram
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+NULLSPAN = nullcontext()
+
+_enabled = False
+_requestSpans = ContextVar("requestSpans", default=None)
+
+
+class Metrics:
+    """
+    Registry of the number, total time and histogram of each named span.
+
+    Each histogram counts the spans that took at most the time of each
+    bucket, but longer than the time of the bucket before it.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """Create an empty registry with the given histogram buckets."""
+        self.buckets = buckets
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """Record that a span took the given number of seconds."""
+        bucket = 0
+        while(seconds > self.buckets[bucket]):
+            bucket += 1
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                entry = self._spans[name] = [0, 0.0, [0] * len(self.buckets)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2][bucket] += 1
+
+    def snapshot(self):
+        """Get the count, total and histogram of every span as a dict."""
+        with self._lock:
+            return {name: {"count": count, "total": total,
+                           "histogram": [[str(bound), n] for bound, n
+                                         in zip(self.buckets, histogram)]}
+                    for name, (count, total, histogram)
+                    in self._spans.items()}
+
+    def reset(self):
+        """Forget every recorded span."""
+        with self._lock:
+            self._spans.clear()
+
+
+metrics = Metrics()
+
+
+class Span:
+    """Context manager timing a named phase while it is entered."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        """Create a span with the given name."""
+        self.name = name
+
+    def __enter__(self):
+        """Start timing the span."""
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        """Stop timing the span, and record it."""
+        elapsed = time.perf_counter() - self.start
+        metrics.record(self.name, elapsed)
+        spans = _requestSpans.get()
+        if spans is not None:
+            spans.append((self.name, elapsed))
+        return False
+
+
+def span(name):
+    """Get a context manager timing a named span, if timing is enabled."""
+    if not _enabled:
+        return NULLSPAN
+    return Span(name)
+
+
+def enable():
+    """Enable timing of spans."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Disable timing of spans."""
+    global _enabled
+    _enabled = False
+
+
+def isEnabled():
+    """Check whether timing of spans is enabled."""
+    return _enabled
+
+
+def startRequest():
+    """
+    Start collecting the spans of the current request.
+
+    Returns a token to pass to finishRequest once the request is done.
+    """
+    return _requestSpans.set([])
+
+
+def requestSpans():
+    """Get the spans collected for the current request so far."""
+    return _requestSpans.get() or []
+
+
+def finishRequest(token):
+    """Stop collecting spans for the current request."""
+    _requestSpans.reset(token)
+
+
+def serverTiming(spans):
+    """
+    Format a list of spans as the value of a Server-Timing header.
+
+    Spans with the same name are combined, and durations are given in
+    milliseconds, in the order each name first appeared.
+    """
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(["%s;dur=%.3f" % (name, seconds * 1000)
+                      for name, seconds in totals.items()])